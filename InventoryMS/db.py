@@ -0,0 +1,229 @@
+"""
+Database helpers shared by the apps.
+
+``retry_on_db_lock`` runs a function inside ``transaction.atomic()`` and
+retries the whole block when the database reports a lock conflict, with
+jittered exponential backoff so competing workers do not retry in step.
+
+``on_commit_once`` runs a follow-up once per transaction however many
+rows asked for it.
+
+``ReplicaRouter`` sends reads made inside ``replica_reads()`` (or a view
+decorated with ``read_from_replica``) to the ``replica`` database when
+one is configured. Everything else, and every write, uses the primary.
+"""
+
+import functools
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+from .metrics import DB_LOCK_RETRIES
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERROR_MESSAGES = (
+    'database is locked',
+    'database table is locked',
+    'deadlock detected',
+    'could not serialize access',
+)
+
+
+def is_lock_error(exc):
+    """
+    Returns True if ``exc`` is a lock conflict worth retrying.
+    """
+    return isinstance(exc, OperationalError) and any(
+        message in str(exc) for message in LOCK_ERROR_MESSAGES
+    )
+
+
+def backoff_delay(attempt, base_delay=0.05, max_delay=1.0):
+    """
+    Returns a random delay ("full jitter") for retry number ``attempt``.
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_on_db_lock(func=None, *, attempts=5, base_delay=0.05,
+                     max_delay=1.0, using=None):
+    """
+    Decorator: runs ``func`` in an atomic block and retries it on lock
+    errors.
+
+    When called inside an outer atomic block the function runs once, in a
+    savepoint: the lock belongs to the outer transaction, so only the
+    outer block can be retried.
+    """
+    if func is None:
+        return functools.partial(
+            retry_on_db_lock, attempts=attempts, base_delay=base_delay,
+            max_delay=max_delay, using=using
+        )
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        alias = using or DEFAULT_DB_ALIAS
+        if connections[alias].in_atomic_block:
+            with transaction.atomic(using=alias):
+                return func(*args, **kwargs)
+
+        for attempt in range(attempts):
+            try:
+                with transaction.atomic(using=alias):
+                    return func(*args, **kwargs)
+            except OperationalError as e:
+                if not is_lock_error(e) or attempt == attempts - 1:
+                    raise
+                delay = backoff_delay(attempt, base_delay, max_delay)
+                DB_LOCK_RETRIES.labels(func.__qualname__).inc()
+                logger.warning(
+                    f"{func.__qualname__}: {e}; retry {attempt + 1} "
+                    f"in {delay:.3f}s"
+                )
+                time.sleep(delay)
+
+    return wrapper
+
+
+class _Callback:
+    """
+    ``func(*args)``, equal to any other _Callback of the same call.
+    """
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, _Callback)
+            and (self.func, self.args) == (other.func, other.args)
+        )
+
+    def __call__(self):
+        self.func(*self.args)
+
+
+def on_commit_once(func, *args, using=None):
+    """
+    ``transaction.on_commit(lambda: func(*args))``, unless the same call
+    is already waiting for the commit of the current transaction: a
+    signal sent once per row then runs its follow-up once per
+    transaction.
+    """
+    callback = _Callback(func, args)
+    connection = transaction.get_connection(using)
+    # Callbacks of rolled back savepoints are already dropped from the list.
+    if any(pending == callback for _, pending, _ in connection.run_on_commit):
+        return
+    transaction.on_commit(callback, using=using)
+
+
+REPLICA_ALIAS = 'replica'
+
+# Always read from the primary: sessions and users must see a login at
+# once, and the export bookkeeping is updated with conditional writes.
+PRIMARY_APPS = {'admin', 'auth', 'contenttypes', 'sessions'}
+PRIMARY_MODELS = {'store.exportcache', 'store.exportjob'}
+
+# Set on responses to writes so the same browser reads its own writes
+# from the primary while the replica catches up.
+REPLICA_PIN_COOKIE = 'use_primary'
+REPLICA_PIN_SECONDS = 10
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def replica_reads():
+    """
+    Routes the reads made inside the block to the replica.
+    """
+    token = _use_replica.set(replica_configured())
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_from_replica(view):
+    """
+    View decorator: runs GET and HEAD requests against the replica.
+
+    Template responses are rendered inside the block so the querysets
+    they evaluate are routed too. Browsers that wrote recently (see
+    ReplicaPinMiddleware) stay on the primary.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') \
+                or request.COOKIES.get(REPLICA_PIN_COOKIE):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Database router for a primary with one read replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        opts = model._meta
+        if not _use_replica.get() or opts.app_label in PRIMARY_APPS \
+                or opts.label_lower in PRIMARY_MODELS:
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Also covers instances that were read from the replica.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, REPLICA_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its schema from the primary.
+        if db == REPLICA_ALIAS:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """
+    Pins a browser to the primary for REPLICA_PIN_SECONDS after each
+    successful write request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if replica_configured() \
+                and request.method not in ('GET', 'HEAD', 'OPTIONS') \
+                and response.status_code < 400:
+            response.set_cookie(
+                REPLICA_PIN_COOKIE, '1',
+                max_age=REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,149 @@
+"""
+Prometheus metrics.
+
+``MetricsMiddleware`` records the latency of each request per URL name
+and the number and time of its SQL statements; the apps record their
+own events through the metrics below (lock retries, export jobs, sales,
+stock-out rejections, cache hits). ``metrics_view`` serves them at
+/metrics in the Prometheus text format.
+
+With several worker processes (gunicorn, plus the export worker) each
+process writes its values to files in the directory named by the
+``PROMETHEUS_MULTIPROC_DIR`` environment variable, and /metrics adds up
+the files of every process, so any worker can answer the scrape. The
+directory must be emptied before the workers start. Without the
+variable the values of the current process are served.
+
+Recording a value only takes prometheus_client's short per-value lock;
+nothing is held across a request. The statements are counted by the
+request's shared counter (``querycount.count_queries``), which only
+parses them when QUERY_COUNT_ENABLED.
+
+Useful queries:
+- sales per minute: ``60 * rate(inventory_sales_total[5m])``
+- cache hit ratio: ``rate(inventory_cache_requests_total{result="hit"}[5m])
+  / ignoring(result) sum without(result)
+  (rate(inventory_cache_requests_total[5m]))``
+
+Settings:
+- METRICS_ENABLED: defaults to True.
+- METRICS_ALLOWED_IPS: addresses allowed to read /metrics; defaults to
+  localhost.
+"""
+
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess,
+)
+
+from .querycount import count_queries, render_response
+
+# Requests that resolved to no URL (404s) share one label value.
+UNRESOLVED = '<unresolved>'
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+REQUEST_SECONDS = Histogram(
+    'inventory_http_request_duration_seconds',
+    'Time to answer a request, by URL name',
+    ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+REQUESTS = Counter(
+    'inventory_http_requests_total',
+    'Requests answered, by URL name and status code',
+    ['view', 'method', 'status'],
+)
+DB_QUERIES = Counter(
+    'inventory_db_queries_total',
+    'SQL statements run by requests, by URL name',
+    ['view'],
+)
+DB_QUERY_SECONDS = Counter(
+    'inventory_db_query_seconds_total',
+    'Time spent in SQL statements by requests, by URL name',
+    ['view'],
+)
+DB_LOCK_RETRIES = Counter(
+    'inventory_db_lock_retries_total',
+    'Transactions retried by retry_on_db_lock after a lock error',
+    ['function'],
+)
+EXPORT_JOB_SECONDS = Histogram(
+    'inventory_export_job_duration_seconds',
+    'Time to build a background export, by export and outcome',
+    ['export', 'status'],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800),
+)
+SALES = Counter(
+    'inventory_sales_total',
+    'Sales committed',
+)
+STOCK_OUT_REJECTIONS = Counter(
+    'inventory_sale_stock_out_rejections_total',
+    'Sales refused because an item did not have enough stock',
+)
+CACHE_REQUESTS = Counter(
+    'inventory_cache_requests_total',
+    'Cache lookups, by cache and result (hit or miss)',
+    ['cache', 'result'],
+)
+
+
+def cache_lookup(name, hit):
+    CACHE_REQUESTS.labels(name, 'hit' if hit else 'miss').inc()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    """
+    Records request latency and SQL per URL name; see the module
+    docstring.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'METRICS_ENABLED', True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with count_queries() as counter:
+            response = self.get_response(request)
+            render_response(response)
+        elapsed = time.perf_counter() - started
+
+        view = _view_name(request)
+        method = request.method if request.method in METHODS else 'other'
+        REQUEST_SECONDS.labels(view, method).observe(elapsed)
+        REQUESTS.labels(view, method, response.status_code).inc()
+        DB_QUERIES.labels(view).inc(counter.count)
+        DB_QUERY_SECONDS.labels(view).inc(counter.seconds)
+        return response
+
+
+def metrics_view(request):
+    """
+    The metrics of every worker in the Prometheus text format.
+    """
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
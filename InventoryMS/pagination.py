@@ -0,0 +1,372 @@
+"""
+Keyset (cursor) pagination for the list pages.
+
+OFFSET pagination reads and throws away every row before the page, and
+its page bar needs a COUNT(*) of the whole table, so deep pages of big
+tables get slower and slower. ``KeysetPaginator`` orders on a unique key
+(``('-date_added', '-id')``, ``('id',)``...) and fetches the rows after
+the key of the previous page's last row, which an index on those columns
+answers directly whatever the depth.
+
+A cursor is that key plus the page number, in URL-safe base64 JSON. The
+page bar shows ``window`` pages on each side of the current one, found
+with two more index-only queries on the key columns. The total is
+optional: an estimate from the PostgreSQL statistics, or an exact count
+kept in the cache for ``COUNT_CACHE_TIMEOUT`` seconds.
+
+``KeysetPaginationMixin`` plugs the paginator into a ListView; the list
+templates render ``store/pagination.html``.
+"""
+
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+import math
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+from .metrics import cache_lookup
+
+COUNT_CACHE_TIMEOUT = 60
+
+# Pages linked on each side of the current page.
+PAGE_WINDOW = 2
+
+
+def estimated_count(queryset):
+    """
+    Row count of an unfiltered queryset from the PostgreSQL planner
+    statistics, or None when there is no estimate.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [connection.ops.quote_name(queryset.model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+    # -1 until the table has been analyzed.
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def cached_count(queryset):
+    """
+    COUNT(*) of ``queryset``, cached for COUNT_CACHE_TIMEOUT seconds.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha1(f'{queryset.db}:{sql}:{params}'.encode()).hexdigest()
+    key = f'rowcount:{digest}'
+    count = cache.get(key)
+    cache_lookup('rowcount', count is not None)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Keeps the microseconds DjangoJSONEncoder drops: a cursor must match
+    its row's key exactly.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    """
+    One page of a KeysetPaginator.
+
+    ``window`` lists ``(number, cursor)`` pairs around the current page
+    (the first page's cursor is None).
+    """
+
+    def __init__(self, paginator, object_list, number, window):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.number = number
+        self.window = window
+        self.previous_cursor = self._cursor_of(number - 1)
+        self.next_cursor = self._cursor_of(number + 1)
+        self.has_previous_page = number > 1
+        self.has_next_page = any(n > number for n, _ in window)
+
+    def _cursor_of(self, number):
+        for n, cursor in self.window:
+            if n == number:
+                return cursor
+        return None
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_other_pages(self):
+        return self.has_previous_page or self.has_next_page
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return f'<Page {self.number}>'
+
+
+class KeysetPaginator:
+    """
+    Paginates ``queryset`` by ``ordering``, which must end with a unique
+    non-null field (the primary key).
+
+    ``count`` is None (no total), 'estimate' (planner estimate, falling
+    back to the cached count) or 'cached'.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('id',),
+                 window=PAGE_WINDOW, count=None):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.window = window
+        self.count_mode = count
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+        self._count = None
+
+    # Cursors
+
+    def encode_cursor(self, key, number):
+        payload = json.dumps({'after': list(key), 'page': number},
+                             cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Returns ``(key, page number)``; ``(None, 1)`` for the first page or
+        an invalid cursor.
+        """
+        if not cursor:
+            return None, 1
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded))
+            values, number = payload['after'], int(payload['page'])
+            if len(values) != len(self.fields) or number < 2:
+                return None, 1
+            opts = self.queryset.model._meta
+            key = tuple(
+                opts.get_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            )
+        except (ValueError, TypeError, KeyError, binascii.Error):
+            return None, 1
+        return key, number
+
+    # Queries
+
+    def _beyond(self, key, reverse=False, inclusive=False):
+        """
+        Q for the rows after ``key`` in the ordering (before it when
+        ``reverse``): past it on the first field, or equal on it and
+        past it on the next one, and so on.
+        """
+        query = None
+        for position in reversed(range(len(self.fields))):
+            name, value = self.fields[position], key[position]
+            lookup = 'gt' if self.descending[position] == reverse else 'lt'
+            if query is None:
+                suffix = 'e' if inclusive else ''
+                query = Q(**{f'{name}__{lookup}{suffix}': value})
+            else:
+                query = Q(**{f'{name}__{lookup}': value}) | (
+                    Q(**{name: value}) & query
+                )
+        return query
+
+    def _key(self, obj):
+        return tuple(getattr(obj, name) for name in self.fields)
+
+    def _reversed(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+    def rows_after(self, key=None):
+        """
+        Queryset of the page starting after ``key`` (None: first page).
+        """
+        rows = self.queryset
+        if key is not None:
+            rows = rows.filter(self._beyond(key))
+        return rows[:self.per_page]
+
+    def keys_before(self, key):
+        """
+        Queryset of the keys of the ``window`` pages ending with ``key``,
+        nearest first.
+        """
+        return (
+            self.queryset.filter(self._beyond(key, reverse=True, inclusive=True))
+            .order_by(*self._reversed())
+            .values_list(*self.fields)[:self.per_page * self.window + 1]
+        )
+
+    def page(self, cursor=None):
+        after, number = self.decode_cursor(cursor)
+        earlier = []
+        if after is not None:
+            earlier, number = self._previous_pages(after, number)
+        object_list = list(self.rows_after(after))
+
+        current = self.encode_cursor(after, number) if number > 1 else None
+        window = earlier + [(number, current)]
+        if len(object_list) == self.per_page:
+            window += self._next_pages(self._key(object_list[-1]), number)
+        return KeysetPage(self, object_list, number, window)
+
+    def _next_pages(self, last_key, number):
+        """
+        ``(number, cursor)`` of up to ``window`` pages after the one
+        ending with ``last_key``.
+        """
+        keys = list(
+            self.queryset.filter(self._beyond(last_key))
+            .values_list(*self.fields)[:self.per_page * (self.window - 1) + 1]
+        )
+        pages = []
+        if keys:
+            pages.append((number + 1, self.encode_cursor(last_key, number + 1)))
+        for i in range(1, self.window):
+            if len(keys) <= i * self.per_page:
+                break
+            pages.append((
+                number + 1 + i,
+                self.encode_cursor(keys[i * self.per_page - 1], number + 1 + i),
+            ))
+        return pages
+
+    def _previous_pages(self, after, number):
+        """
+        ``(number, cursor)`` of up to ``window`` pages before the page
+        starting after ``after``, oldest first, and the corrected number
+        of the current page (rows may have been added or removed since
+        the cursor was made).
+        """
+        keys = list(self.keys_before(after))
+        if len(keys) <= self.per_page * self.window:
+            # Reached the first page.
+            number = math.ceil(len(keys) / self.per_page) + 1
+        pages = []
+        for i in range(1, self.window + 1):
+            if len(keys) <= (i - 1) * self.per_page or number - i < 1:
+                break
+            if len(keys) > i * self.per_page and number - i > 1:
+                cursor = self.encode_cursor(keys[i * self.per_page], number - i)
+            else:
+                cursor = None
+            pages.append((number - i, cursor))
+        pages.reverse()
+        return pages, number
+
+    # Totals
+
+    @property
+    def count(self):
+        if self.count_mode is None:
+            return None
+        if self._count is None:
+            if self.count_mode == 'estimate':
+                self._count = estimated_count(self.queryset)
+            if self._count is None:
+                self._count = cached_count(self.queryset)
+        return self._count
+
+    @property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return max(math.ceil(self.count / self.per_page), 1)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin paginating with KeysetPaginator on ``keyset_ordering``.
+
+    Adds ``page_links`` to the context for ``store/pagination.html``.
+    Views whose ordering cannot be keyed (e.g. ranked search results) set
+    ``keyset_ordering = None`` to keep OFFSET pagination with the same
+    windowed page bar.
+    """
+
+    keyset_ordering = ('id',)
+    keyset_count = 'cached'
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.keyset_ordering is None:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(
+            queryset, page_size, self.keyset_ordering, count=self.keyset_count
+        )
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def _page_query(self, **params):
+        query = self.request.GET.copy()
+        for name in (self.cursor_kwarg, self.page_kwarg):
+            query.pop(name, None)
+        for name, value in params.items():
+            if value is not None:
+                query[name] = value
+        return query.urlencode()
+
+    def _page_links(self, page):
+        if isinstance(page, KeysetPage):
+            pages = [
+                (n, self._page_query(**{self.cursor_kwarg: cursor}))
+                for n, cursor in page.window
+            ]
+            count, num_pages = page.paginator.count, page.paginator.num_pages
+            first = page.window[0][0] > 1
+        else:
+            pages = [
+                (n, self._page_query(**{self.page_kwarg: n}))
+                for n in page.paginator.get_elided_page_range(
+                    page.number, on_each_side=PAGE_WINDOW, on_ends=0
+                )
+                if n != page.paginator.ELLIPSIS
+            ]
+            count, num_pages = page.paginator.count, page.paginator.num_pages
+            first = pages[0][0] > 1
+        queries = dict(pages)
+        return {
+            'pages': [(n, query, n == page.number) for n, query in pages],
+            'previous': queries.get(page.number - 1),
+            'next': queries.get(page.number + 1),
+            'first': self._page_query() if first else None,
+            'count': count,
+            'num_pages': num_pages,
+        }
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get('page_obj')
+        if page is not None and context.get('is_paginated'):
+            context['page_links'] = self._page_links(page)
+        return context
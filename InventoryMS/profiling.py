@@ -0,0 +1,298 @@
+"""
+Server-Timing header and slow-request profiling.
+
+``ServerTimingMiddleware`` splits the time of each request into:
+- db: SQL statements on every connection (the request's counter of
+  ``querycount.count_queries``);
+- tpl: template rendering, without the queries run while rendering
+  (lazy querysets in ``store/base.html``, ``sidebar.html``...), timed
+  by the ``TimedDjangoTemplates`` template backend;
+- view: everything else (view code, middleware, serialization);
+and sends it as ``Server-Timing: db;dur=..., tpl;dur=..., view;dur=...,
+total;dur=...``, which the browser's network panel shows per request.
+
+Profiling with cProfile doubles the cost of a request, so it is
+sampled: ``PROFILE_SAMPLE_RATE`` of the requests run under the profiler
+and the capture is kept when the request took ``PROFILE_SLOW_REQUEST_MS``
+or more. A request carrying a valid ``X-Profile-Token`` header (signed,
+from the profiles page) is always profiled and kept.
+
+Captures are a ``.prof`` file (pstats format, for snakeviz or
+``python -m pstats``) and a ``.json`` summary in ``PROFILE_DIR``; only
+the newest ``PROFILE_KEEP`` are kept. Staff browse them at /profiles/.
+
+Settings:
+- SERVER_TIMING_ENABLED: defaults to True.
+- PROFILE_SAMPLE_RATE: defaults to 0 (only token requests).
+- PROFILE_SLOW_REQUEST_MS: defaults to 1000.
+- PROFILE_DIR: defaults to BASE_DIR/profiles.
+- PROFILE_KEEP: defaults to 200.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from django.template.backends.django import DjangoTemplates, Template
+
+from .querycount import count_queries, render_response
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_TOKEN_MAX_AGE = 3600
+_TOKEN_SALT = 'InventoryMS.profiling'
+
+# "20250101-120000-1a2b3c4d"
+CAPTURE_NAME = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+
+PSTATS_SORTS = ('cumulative', 'tottime', 'calls')
+
+_timing = ContextVar('server_timing', default=None)
+
+# One profiler at a time per process: from Python 3.12 cProfile refuses
+# to start while another is active, and captures of overlapping requests
+# would mix their threads anyway.
+_profiling = threading.Lock()
+
+
+class RequestTiming:
+    """
+    Time spent by one request in SQL and in templates.
+    """
+
+    def __init__(self, db):
+        # The QueryCounter of the request (querycount.count_queries).
+        self.db = db
+        self.template_seconds = 0.0
+        # SQL run while rendering, counted in db and not in tpl.
+        self.template_db_seconds = 0.0
+        self.rendering = False
+
+    def header(self, total_seconds):
+        template = self.template_seconds - self.template_db_seconds
+        view = max(total_seconds - self.db.seconds - template, 0.0)
+        return ', '.join([
+            f'db;dur={1000 * self.db.seconds:.1f};desc="{self.db.count} queries"',
+            f'tpl;dur={1000 * template:.1f}',
+            f'view;dur={1000 * view:.1f}',
+            f'total;dur={1000 * total_seconds:.1f}',
+        ])
+
+
+class TimedTemplate(Template):
+    """
+    A template that adds its render time to the RequestTiming of the
+    current request, if any.
+    """
+
+    def render(self, context=None, request=None):
+        timing = _timing.get()
+        # Included templates are part of the outermost render.
+        if timing is None or timing.rendering:
+            return super().render(context, request)
+        timing.rendering = True
+        db_seconds = timing.db.seconds
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.rendering = False
+            timing.template_seconds += time.perf_counter() - started
+            timing.template_db_seconds += timing.db.seconds - db_seconds
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, with TimedTemplate templates (the
+    TEMPLATES backend, so the tpl timing needs no patching of Django).
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+# Profile tokens
+
+def profile_token():
+    """
+    A token for the PROFILE_HEADER header, valid PROFILE_TOKEN_MAX_AGE
+    seconds.
+    """
+    return signing.TimestampSigner(salt=_TOKEN_SALT).sign(uuid.uuid4().hex)
+
+
+def valid_token(token):
+    try:
+        signing.TimestampSigner(salt=_TOKEN_SALT).unsign(
+            token, max_age=PROFILE_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+# Captures
+
+def profile_dir():
+    return getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def capture_path(name, extension):
+    """
+    Path of a capture file; None when ``name`` is not a capture name.
+    """
+    if not CAPTURE_NAME.match(name):
+        return None
+    return os.path.join(profile_dir(), f'{name}.{extension}')
+
+
+def save_capture(profiler, summary):
+    """
+    Writes ``profiler``'s stats and ``summary``, then removes the oldest
+    captures past PROFILE_KEEP. Returns the capture name.
+    """
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(os.path.join(directory, f'{name}.prof'))
+    with open(os.path.join(directory, f'{name}.json'), 'w') as f:
+        json.dump({'name': name, **summary}, f)
+
+    keep = getattr(settings, 'PROFILE_KEEP', 200)
+    for old in capture_names()[keep:]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(capture_path(old, extension))
+            except FileNotFoundError:
+                pass
+    return name
+
+
+def capture_names():
+    """
+    Names of the captures, newest first.
+    """
+    try:
+        files = os.listdir(profile_dir())
+    except FileNotFoundError:
+        return []
+    names = {
+        name for name, extension in (os.path.splitext(f) for f in files)
+        if extension == '.json' and CAPTURE_NAME.match(name)
+    }
+    return sorted(names, reverse=True)
+
+
+def read_capture(name):
+    """
+    The summary of a capture, or None.
+    """
+    path = capture_path(name, 'json')
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def list_captures(limit=None):
+    summaries = (read_capture(name) for name in capture_names()[:limit])
+    return [summary for summary in summaries if summary is not None]
+
+
+def stats_text(name, sort='cumulative', limit=60):
+    """
+    The pstats report of a capture, ``limit`` lines sorted by ``sort``.
+    """
+    path = capture_path(name, 'prof')
+    if path is None or not os.path.exists(path):
+        return None
+    stream = io.StringIO()
+    stats = pstats.Stats(path, stream=stream)
+    stats.sort_stats(sort if sort in PSTATS_SORTS else 'cumulative')
+    stats.print_stats(limit)
+    return stream.getvalue()
+
+
+class ServerTimingMiddleware:
+    """
+    Adds the Server-Timing header and profiles sampled requests; see the
+    module docstring.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header_enabled = getattr(settings, 'SERVER_TIMING_ENABLED', True)
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+        self.slow_seconds = getattr(settings, 'PROFILE_SLOW_REQUEST_MS', 1000) / 1000
+
+    def profile_trigger(self, request):
+        token = request.headers.get(PROFILE_HEADER)
+        if token and valid_token(token):
+            return 'token'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        trigger = self.profile_trigger(request)
+        # Another request is being profiled: only time this one.
+        if trigger and not _profiling.acquire(blocking=False):
+            trigger = None
+        if not self.header_enabled and trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile() if trigger else None
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            if profiler is not None:
+                stack.callback(_profiling.release)
+            timing = RequestTiming(stack.enter_context(count_queries()))
+            stack.callback(_timing.reset, _timing.set(timing))
+            if profiler is not None:
+                profiler.enable()
+                stack.callback(profiler.disable)
+            response = self.get_response(request)
+            # Template responses render after the view returns.
+            render_response(response)
+        total = time.perf_counter() - started
+
+        if self.header_enabled:
+            response['Server-Timing'] = timing.header(total)
+        if profiler is not None and (trigger == 'token' or total >= self.slow_seconds):
+            self.save(request, response, profiler, timing, total, trigger)
+        return response
+
+    def save(self, request, response, profiler, timing, total, trigger):
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        save_capture(profiler, {
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'user': user.get_username() if user and user.is_authenticated else None,
+            'trigger': trigger,
+            'total_ms': round(1000 * total, 1),
+            'db_ms': round(1000 * timing.db.seconds, 1),
+            'queries': timing.db.count,
+            'template_ms': round(
+                1000 * (timing.template_seconds - timing.template_db_seconds), 1
+            ),
+        })
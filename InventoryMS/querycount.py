@@ -0,0 +1,259 @@
+"""
+Per-request SQL instrumentation.
+
+``QueryCountMiddleware`` counts the statements each request runs on
+every database, and their time, through ``connection.execute_wrapper``.
+``count_queries()`` installs the wrapper; the Server-Timing and metrics
+middlewares use it too and share the counter of the request.
+Statements repeated ``QUERY_COUNT_REPEAT_THRESHOLD`` times or more with
+only their parameters changing (the N+1 pattern: one query per row of a
+list) are logged with the view name. Totals are kept per view; the
+summary is logged every ``QUERY_COUNT_SUMMARY_EVERY`` requests and
+``summary()`` returns it.
+
+Views declare the most queries they should need with ``query_budget``.
+Going over it is logged, or raised as ``QueryBudgetExceeded`` when
+``QUERY_BUDGET_RAISE`` is set (for tests).
+
+Settings:
+- QUERY_COUNT_ENABLED: defaults to DEBUG.
+- QUERY_COUNT_REPEAT_THRESHOLD: defaults to 5.
+- QUERY_COUNT_SUMMARY_EVERY: defaults to 500 requests (0: never).
+- QUERY_BUDGET_RAISE: defaults to False.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# "IN (%s, %s, %s)" of any length, and literals in raw SQL.
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """
+    Declares that a view should run at most ``limit`` queries. Works on
+    function views and view classes.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def statement_shape(sql):
+    """
+    ``sql`` with its parameters and literals replaced by placeholders, so
+    statements that differ only in parameters compare equal.
+    """
+    sql = _LITERALS.sub('%s', sql)
+    return _IN_LIST.sub('(%s...)', sql)
+
+
+class QueryCounter:
+    """
+    execute_wrapper recording the statements run while installed.
+    With ``shapes=False`` it only counts and times them.
+    """
+
+    def __init__(self, shapes=True):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter() if shapes else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            if self.shapes is not None:
+                self.shapes[statement_shape(sql)] += 1
+
+    def repeated(self, threshold):
+        """
+        ``(statement, times)`` of the statements run ``threshold`` times
+        or more, most repeated first.
+        """
+        if self.shapes is None:
+            return []
+        return [
+            (shape, times) for shape, times in self.shapes.most_common()
+            if times >= threshold
+        ]
+
+
+_counter = ContextVar('query_counter', default=None)
+
+
+@contextmanager
+def count_queries():
+    """
+    Counts the SQL run inside the block on every connection and yields the
+    ``QueryCounter``. A block inside another one yields the outer counter,
+    so one wrapper counts each statement once. Statement shapes are only
+    recorded when QUERY_COUNT_ENABLED.
+    """
+    counter = _counter.get()
+    if counter is not None:
+        yield counter
+        return
+    counter = QueryCounter(
+        shapes=getattr(settings, 'QUERY_COUNT_ENABLED', settings.DEBUG)
+    )
+    reset = _counter.set(counter)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            yield counter
+    finally:
+        _counter.reset(reset)
+
+
+def render_response(response):
+    """
+    Renders a template response, which runs its queries while rendering.
+    """
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+
+
+class ViewStats:
+    __slots__ = ('requests', 'queries', 'max_queries', 'seconds',
+                 'repeated', 'over_budget')
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.seconds = 0.0
+        self.repeated = 0
+        self.over_budget = 0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'queries': self.queries,
+            'avg_queries': self.queries / self.requests if self.requests else 0,
+            'max_queries': self.max_queries,
+            'avg_ms': 1000 * self.seconds / self.requests if self.requests else 0,
+            'repeated': self.repeated,
+            'over_budget': self.over_budget,
+        }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+_requests = 0
+
+
+def summary():
+    """
+    Returns the per-view totals of this process, busiest view first.
+    """
+    with _stats_lock:
+        rows = {name: stats.as_dict() for name, stats in _stats.items()}
+    return dict(sorted(rows.items(), key=lambda row: -row[1]['queries']))
+
+
+def reset():
+    global _requests
+    with _stats_lock:
+        _stats.clear()
+        _requests = 0
+
+
+def log_summary():
+    for name, row in summary().items():
+        logger.info(
+            "%s: %d requests, %.1f queries avg (max %d), %.1f ms SQL avg, "
+            "%d with repeated statements, %d over budget",
+            name, row['requests'], row['avg_queries'], row['max_queries'],
+            row['avg_ms'], row['repeated'], row['over_budget'],
+        )
+
+
+def _view_of(request):
+    """
+    Returns ``(name, budget)`` of the view that served ``request``.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return request.path, None
+    func = match.func
+    budget = getattr(func, 'query_budget', None)
+    view_class = getattr(func, 'view_class', None)
+    if budget is None and view_class is not None:
+        budget = getattr(view_class, 'query_budget', None)
+    return match.view_name or match._func_path, budget
+
+
+class QueryCountMiddleware:
+    """
+    Counts the SQL of each request; see the module docstring.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_COUNT_ENABLED', settings.DEBUG)
+        self.threshold = getattr(settings, 'QUERY_COUNT_REPEAT_THRESHOLD', 5)
+        self.summary_every = getattr(settings, 'QUERY_COUNT_SUMMARY_EVERY', 500)
+        self.raise_over_budget = getattr(settings, 'QUERY_BUDGET_RAISE', False)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        with count_queries() as counter:
+            response = self.get_response(request)
+            render_response(response)
+
+        name, budget = _view_of(request)
+        repeated = counter.repeated(self.threshold)
+        over_budget = budget is not None and counter.count > budget
+        self.record(name, counter, repeated, over_budget)
+
+        for statement, times in repeated:
+            logger.warning("%s: %d x %s", name, times, statement)
+        if over_budget:
+            message = (
+                f"{name} ran {counter.count} queries, "
+                f"over its budget of {budget}"
+            )
+            if self.raise_over_budget:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        logger.debug("%s: %d queries in %.1f ms", name, counter.count,
+                     1000 * counter.seconds)
+        return response
+
+    def record(self, name, counter, repeated, over_budget):
+        global _requests
+        with _stats_lock:
+            stats = _stats.setdefault(name, ViewStats())
+            stats.requests += 1
+            stats.queries += counter.count
+            stats.max_queries = max(stats.max_queries, counter.count)
+            stats.seconds += counter.seconds
+            stats.repeated += bool(repeated)
+            stats.over_budget += over_budget
+            _requests += 1
+            due = self.summary_every and _requests % self.summary_every == 0
+        if due:
+            log_summary()
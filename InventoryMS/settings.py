@@ -1,3 +1,4 @@
+import copy
 import os
 from pathlib import Path
 
@@ -9,12 +10,19 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-g_n2+2bznu6e@1wel!i(&-4tp86_7lop5395ww+i4x%9*7^old'
+SECRET_KEY = os.environ.get(
+    'INVENTORY_SECRET_KEY',
+    'django-insecure-g_n2+2bznu6e@1wel!i(&-4tp86_7lop5395ww+i4x%9*7^old'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# The Docker image sets INVENTORY_DEBUG=0.
+DEBUG = os.environ.get('INVENTORY_DEBUG', '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('INVENTORY_ALLOWED_HOSTS', '').split(',')
+    if host
+]
 
 
 # Application definition
@@ -40,9 +48,14 @@ INSTALLED_APPS = [
     'transactions.apps.TransactionsConfig',
     'invoice.apps.InvoiceConfig',
     'bills.apps.BillsConfig',
+    'benchmarks.apps.BenchmarksConfig',
 ]
 
 MIDDLEWARE = [
+    # Outermost, so it sees the session and auth queries too
+    'InventoryMS.profiling.ServerTimingMiddleware',
+    'InventoryMS.metrics.MetricsMiddleware',
+    'InventoryMS.querycount.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,13 +63,49 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'InventoryMS.db.ReplicaPinMiddleware',
 ]
 
+# Without DEBUG, static files are served from STATIC_ROOT by WhiteNoise,
+# before the session and auth middlewares. With DEBUG, runserver serves
+# them from the app directories.
+if not DEBUG:
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+        'whitenoise.middleware.WhiteNoiseMiddleware',
+    )
+
 ROOT_URLCONF = 'InventoryMS.urls'
 
+# SQL per request (InventoryMS.querycount): counted when DEBUG, or when
+# INVENTORY_QUERY_COUNT=1; views over their query_budget() raise instead
+# of logging when INVENTORY_QUERY_BUDGET_RAISE=1 (tests).
+QUERY_COUNT_ENABLED = DEBUG or os.environ.get('INVENTORY_QUERY_COUNT') == '1'
+QUERY_COUNT_REPEAT_THRESHOLD = 5
+QUERY_BUDGET_RAISE = os.environ.get('INVENTORY_QUERY_BUDGET_RAISE') == '1'
+
+# Server-Timing header (db / tpl / view) on every response. Requests with
+# the X-Profile-Token header from /profiles/ run under cProfile and are
+# kept in PROFILE_DIR. INVENTORY_PROFILE_SAMPLE_RATE=0.01 also profiles 1%
+# of all requests, keeping those that took PROFILE_SLOW_REQUEST_MS or more.
+SERVER_TIMING_ENABLED = True
+PROFILE_SLOW_REQUEST_MS = 1000
+PROFILE_SAMPLE_RATE = float(os.environ.get('INVENTORY_PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.environ.get('INVENTORY_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_KEEP = 200
+
+# Prometheus metrics at /metrics (InventoryMS.metrics). Set the
+# PROMETHEUS_MULTIPROC_DIR environment variable to add up the metrics of
+# several worker processes.
+METRICS_ENABLED = True
+METRICS_ALLOWED_IPS = os.environ.get(
+    'INVENTORY_METRICS_ALLOWED_IPS', '127.0.0.1,::1'
+).split(',')
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates timing its renders for the Server-Timing header
+        'BACKEND': 'InventoryMS.profiling.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -80,10 +129,116 @@ WSGI_APPLICATION = 'InventoryMS.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get(
+            'INVENTORY_SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
     }
 }
 
+# Production SQLite profile (INVENTORY_DB_PROFILE=production): WAL lets
+# exports read while sales are written, writers wait on busy_timeout
+# instead of failing at once, and BEGIN IMMEDIATE takes the write lock
+# up front so lock errors surface where InventoryMS.db.retry_on_db_lock
+# can retry the whole block.
+DB_PROFILE = os.environ.get('INVENTORY_DB_PROFILE', 'development')
+
+SQLITE_PRODUCTION_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-64000',       # 64 MB page cache
+    'PRAGMA mmap_size=268435456',     # 256 MB memory-mapped I/O
+    'PRAGMA temp_store=MEMORY',
+]
+
+if DB_PROFILE == 'production':
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ';'.join(SQLITE_PRODUCTION_PRAGMAS),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 5,
+    }
+
+# PostgreSQL (INVENTORY_DB_ENGINE=postgresql, needs psycopg 3). Connections
+# are kept open for CONN_MAX_AGE seconds and health-checked before reuse.
+# INVENTORY_DB_POOL=psycopg uses psycopg's in-process pool instead (Django
+# requires CONN_MAX_AGE=0 then); INVENTORY_DB_POOL=pgbouncer is for a
+# PgBouncer in transaction mode, which cannot keep server-side cursors.
+# The old SQLite file stays reachable as the 'sqlite' alias so
+# copy_sqlite_to_postgres can read it.
+DB_ENGINE = os.environ.get('INVENTORY_DB_ENGINE', 'sqlite')
+DB_POOL = os.environ.get('INVENTORY_DB_POOL', '')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES['sqlite'] = DATABASES['default']
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'inventory'),
+        'USER': os.environ.get('POSTGRES_USER', 'inventory'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': 5,
+        },
+    }
+    if DB_POOL == 'psycopg':
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('POSTGRES_POOL_MAX_SIZE', '10')),
+            'timeout': 10,
+        }
+    elif DB_POOL == 'pgbouncer':
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Read replica for the dashboard, list views and exports (see
+# InventoryMS.db.ReplicaRouter). POSTGRES_REPLICA_HOST points at a
+# streaming replica; with SQLite, INVENTORY_SQLITE_REPLICA names a copy
+# of the database file (useful for trying the routing locally).
+if DB_ENGINE == 'postgresql' and os.environ.get('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = copy.deepcopy(DATABASES['default'])
+    DATABASES['replica'].update({
+        'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+        'PORT': os.environ.get('POSTGRES_REPLICA_PORT',
+                               DATABASES['default']['PORT']),
+    })
+elif DB_ENGINE == 'sqlite' and os.environ.get('INVENTORY_SQLITE_REPLICA'):
+    DATABASES['replica'] = copy.deepcopy(DATABASES['default'])
+    DATABASES['replica']['NAME'] = os.environ['INVENTORY_SQLITE_REPLICA']
+
+if 'replica' in DATABASES:
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['InventoryMS.db.ReplicaRouter']
+
+# Cache (dashboard metrics, POS catalog version). Several processes need a
+# shared cache for the invalidations to reach all of them: Redis with
+# REDIS_URL, else files in INVENTORY_CACHE_DIR (the Docker image). Without
+# either every process keeps its own memory cache.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif os.environ.get('INVENTORY_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['INVENTORY_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'inventoryms',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -111,6 +266,9 @@ LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
 
+# Region used for phone numbers entered without a country code
+PHONENUMBER_DEFAULT_REGION = 'VN'
+
 USE_I18N = True
 
 USE_TZ = True
@@ -125,9 +283,38 @@ LOGOUT_URL = 'logout'
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR,'static')
 ]
+STATIC_ROOT = os.environ.get(
+    'INVENTORY_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles')
+)
 MEDIA_ROOT = os.path.join(BASE_DIR, 'static/images')
 MEDIA_URL = '/images/'
 
+# Generated exports (store.export_jobs, store.exports): outside the static
+# and media directories, so they are only downloaded through the export
+# views, which check the user.
+EXPORT_ROOT = os.environ.get(
+    'INVENTORY_EXPORT_ROOT', os.path.join(BASE_DIR, 'exports')
+)
+
+# Without DEBUG, collectstatic writes a copy of each static file with a
+# content hash in its name plus gzip and brotli versions, and WhiteNoise
+# serves them from STATIC_ROOT with a one-year cache lifetime.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
+# Uploaded profile pictures are served by Django (without DEBUG too when
+# INVENTORY_SERVE_MEDIA=1, as in the Docker image).
+SERVE_MEDIA = DEBUG or os.environ.get('INVENTORY_SERVE_MEDIA') == '1'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,29 @@
+"""
+Test helpers shared by the apps' test suites.
+"""
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from store.synthetic import SCALES, generate
+
+
+@override_settings(QUERY_COUNT_ENABLED=True, QUERY_BUDGET_RAISE=True)
+class QueryBudgetTestCase(TestCase):
+    """
+    A logged-in superuser and the 'tiny' synthetic dataset; a view going
+    over its query_budget raises QueryBudgetExceeded.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generate(SCALES['tiny'])
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertPagesLoad(self, *urls):
+        for url in urls:
+            with self.subTest(url):
+                self.assertEqual(self.client.get(url).status_code, 200)
@@ -0,0 +1,353 @@
+import re
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.template.base import Template as DjangoTemplate
+from django.template.loader import get_template
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY
+
+from . import metrics, profiling, querycount
+from store.models import Category, ExportJob, Item
+from .db import (
+    REPLICA_PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter, read_from_replica,
+    replica_reads, retry_on_db_lock,
+)
+from .pagination import KeysetPaginator
+from .querycount import count_queries
+
+DJANGO_TEMPLATE_RENDER = DjangoTemplate.render
+
+
+class CountQueriesTests(TestCase):
+
+    def test_nested_blocks_share_one_counter(self):
+        wrappers = len(connection.execute_wrappers)
+        with count_queries() as outer:
+            with count_queries() as inner:
+                self.assertIs(inner, outer)
+                self.assertEqual(len(connection.execute_wrappers), wrappers + 1)
+                User.objects.count()
+            User.objects.count()
+        self.assertEqual(outer.count, 2)
+        self.assertEqual(len(connection.execute_wrappers), wrappers)
+
+
+@override_settings(
+    QUERY_COUNT_ENABLED=True, SERVER_TIMING_ENABLED=True, METRICS_ENABLED=True,
+)
+class RequestCountersTests(TestCase):
+
+    def test_middlewares_report_the_same_count(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(user)
+        querycount.reset()
+        before = self.metric_queries()
+
+        response = self.client.get(reverse('dashboard'))
+
+        timed = int(re.search(r'"(\d+) queries"', response['Server-Timing']).group(1))
+        self.assertGreater(timed, 0)
+        self.assertEqual(querycount.summary()['dashboard']['queries'], timed)
+        self.assertEqual(self.metric_queries() - before, timed)
+
+    def metric_queries(self):
+        return REGISTRY.get_sample_value(
+            'inventory_db_queries_total', {'view': 'dashboard'}
+        ) or 0
+
+
+@override_settings(SERVER_TIMING_ENABLED=True, PROFILE_SAMPLE_RATE=0)
+class ServerTimingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.clerk = User.objects.create_user('clerk', password='pw')
+
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        self.enterContext(override_settings(PROFILE_DIR=profile_dir.name))
+        self.client.force_login(self.staff)
+
+    def timings(self, response):
+        return {
+            name: float(duration) for name, duration
+            in re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing'])
+        }
+
+    def test_header_splits_the_request(self):
+        timings = self.timings(self.client.get(reverse('dashboard')))
+        self.assertEqual(list(timings), ['db', 'tpl', 'view', 'total'])
+        self.assertGreater(timings['tpl'], 0)
+        self.assertLessEqual(timings['db'] + timings['tpl'], timings['total'])
+
+    def test_templates_are_timed_by_the_backend(self):
+        # Nothing is patched into Django's own Template class.
+        self.assertIs(DjangoTemplate.render, DJANGO_TEMPLATE_RENDER)
+        self.assertIsInstance(get_template('store/base.html'), profiling.TimedTemplate)
+
+    def test_valid_token_is_profiled(self):
+        self.client.get(reverse('dashboard'), headers={profiling.PROFILE_HEADER: profiling.profile_token()})
+        [capture] = profiling.list_captures()
+        self.assertEqual((capture['view'], capture['trigger']), ('dashboard', 'token'))
+
+    def test_invalid_or_expired_token_is_not_profiled(self):
+        token = profiling.profile_token()
+        self.client.get(reverse('dashboard'), headers={profiling.PROFILE_HEADER: token + 'x'})
+        with mock.patch.object(profiling, 'PROFILE_TOKEN_MAX_AGE', -1):
+            self.client.get(reverse('dashboard'), headers={profiling.PROFILE_HEADER: token})
+        self.assertEqual(profiling.list_captures(), [])
+
+    def test_profile_pages_are_staff_only(self):
+        self.client.get(reverse('dashboard'), headers={profiling.PROFILE_HEADER: profiling.profile_token()})
+        [name] = profiling.capture_names()
+        urls = [
+            reverse('request-profiles'),
+            reverse('request-profile', args=[name]),
+            reverse('request-profile', args=[name]) + '?download=1',
+        ]
+        for url in urls:
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                response.close()
+        self.assertEqual(self.client.get(reverse('request-profile', args=['..x'])).status_code, 404)
+
+        self.client.force_login(self.clerk)
+        for url in urls:
+            with self.subTest(url, user='clerk'):
+                self.assertEqual(self.client.get(url).status_code, 302)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_ALLOWED_IPS=['10.0.0.5'])
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_allowed_address_reads_metrics(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], CONTENT_TYPE_LATEST)
+        self.assertIn(b'inventory_http_requests_total', response.content)
+
+    def test_other_addresses_are_forbidden(self):
+        for address in ['127.0.0.1', '10.0.0.6']:
+            with self.subTest(address):
+                response = self.client.get(reverse('metrics'), REMOTE_ADDR=address)
+                self.assertEqual(response.status_code, 403)
+
+    def test_middleware_records_requests_by_url_name(self):
+        self.client.force_login(self.user)
+        labels = {'view': 'dashboard', 'method': 'GET'}
+        requests = self.sample('inventory_http_requests_total', status='200', **labels)
+        timed = self.sample('inventory_http_request_duration_seconds_count', **labels)
+        queries = self.sample('inventory_db_queries_total', view='dashboard')
+
+        self.client.get(reverse('dashboard'))
+
+        self.assertEqual(self.sample('inventory_http_requests_total', status='200', **labels), requests + 1)
+        self.assertEqual(self.sample('inventory_http_request_duration_seconds_count', **labels), timed + 1)
+        self.assertGreater(self.sample('inventory_db_queries_total', view='dashboard'), queries)
+
+    def test_unresolved_urls_share_one_label(self):
+        labels = {'view': metrics.UNRESOLVED, 'method': 'GET', 'status': '404'}
+        before = self.sample('inventory_http_requests_total', **labels)
+        self.client.get('/no-such-page/a')
+        self.client.get('/no-such-page/b')
+        self.assertEqual(self.sample('inventory_http_requests_total', **labels), before + 2)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_middleware_records_nothing(self):
+        labels = {'view': 'metrics', 'method': 'GET', 'status': '403'}
+        before = self.sample('inventory_http_requests_total', **labels)
+        self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.6')
+        self.assertEqual(self.sample('inventory_http_requests_total', **labels), before)
+
+
+class RetryOnDbLockTests(TransactionTestCase):
+
+    def setUp(self):
+        self.sleep = self.enterContext(mock.patch('InventoryMS.db.time.sleep'))
+
+    def locked_then_ok(self, failures, error='database is locked'):
+        """
+        A function creating a user that fails ``failures`` times first.
+        """
+        calls = []
+
+        def create_user():
+            calls.append(1)
+            User.objects.create(username=f'user{len(calls)}')
+            if len(calls) <= failures:
+                raise OperationalError(error)
+            return len(calls)
+        create_user.calls = calls
+        return create_user
+
+    def retries(self, func):
+        return REGISTRY.get_sample_value(
+            'inventory_db_lock_retries_total', {'function': func.__qualname__}
+        ) or 0
+
+    def test_retries_until_it_succeeds(self):
+        func = self.locked_then_ok(2)
+        before = self.retries(func)
+        with self.assertLogs('InventoryMS.db', 'WARNING') as logs:
+            self.assertEqual(retry_on_db_lock(func)(), 3)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual(self.retries(func) - before, 2)
+        # The failed attempts were rolled back.
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['user3'])
+
+    def test_gives_up_after_the_last_attempt(self):
+        func = self.locked_then_ok(5)
+        with self.assertRaises(OperationalError), self.assertLogs('InventoryMS.db'):
+            retry_on_db_lock(attempts=3)(func)()
+        self.assertEqual(len(func.calls), 3)
+        self.assertFalse(User.objects.exists())
+
+    def test_other_errors_are_not_retried(self):
+        func = self.locked_then_ok(1, error='no such table: x')
+        with self.assertRaises(OperationalError):
+            retry_on_db_lock(func)()
+        self.assertEqual(len(func.calls), 1)
+        self.sleep.assert_not_called()
+
+    def test_runs_once_inside_an_outer_transaction(self):
+        func = self.locked_then_ok(1)
+        with self.assertRaises(OperationalError), transaction.atomic():
+            retry_on_db_lock(func)()
+        self.assertEqual(len(func.calls), 1)
+
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        # As with POSTGRES_REPLICA_HOST or INVENTORY_SQLITE_REPLICA set.
+        self.enterContext(mock.patch('InventoryMS.db.replica_configured', return_value=True))
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_reads_use_the_primary_by_default(self):
+        self.assertIsNone(self.router.db_for_read(Item))
+
+    def test_reads_in_replica_reads_use_the_replica(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Item), 'replica')
+            # Logins and export bookkeeping must see the latest writes.
+            self.assertIsNone(self.router.db_for_read(User))
+            self.assertIsNone(self.router.db_for_read(ExportJob))
+            self.assertEqual(self.router.db_for_write(Item), 'default')
+        self.assertIsNone(self.router.db_for_read(Item))
+
+    def test_no_replica_configured(self):
+        with mock.patch('InventoryMS.db.replica_configured', return_value=False), \
+                replica_reads():
+            self.assertIsNone(self.router.db_for_read(Item))
+
+    def test_read_from_replica_view(self):
+        @read_from_replica
+        def view(request):
+            return HttpResponse(str(self.router.db_for_read(Item)))
+
+        self.assertEqual(view(self.factory.get('/')).content, b'replica')
+        self.assertEqual(view(self.factory.post('/')).content, b'None')
+        pinned = self.factory.get('/')
+        pinned.COOKIES[REPLICA_PIN_COOKIE] = '1'
+        self.assertEqual(view(pinned).content, b'None')
+
+    def test_writes_pin_the_browser_to_the_primary(self):
+        def middleware(status):
+            return ReplicaPinMiddleware(lambda request: HttpResponse(status=status))
+
+        response = middleware(200)(self.factory.post('/'))
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+        self.assertNotIn(REPLICA_PIN_COOKIE, middleware(200)(self.factory.get('/')).cookies)
+        self.assertNotIn(REPLICA_PIN_COOKIE, middleware(400)(self.factory.post('/')).cookies)
+
+
+
+class KeysetPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Drinks')
+        # Repeated names: pages must break ties on the id.
+        for i in range(23):
+            Item.objects.create(
+                name='ABCDE'[i % 5], description='-', category=category,
+                quantity=1, price=1,
+            )
+        cls.ordered = list(Item.objects.order_by('-name', 'id').values_list('pk', flat=True))
+
+    def paginator(self):
+        return KeysetPaginator(Item.objects.all(), 5, ('-name', 'id'))
+
+    def ids(self, page):
+        return [item.pk for item in page]
+
+    def test_forward_then_back(self):
+        pages = [self.paginator().page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator().page(pages[-1].next_cursor))
+        self.assertEqual([page.number for page in pages], [1, 2, 3, 4, 5])
+        self.assertEqual(sum((self.ids(page) for page in pages), []), self.ordered)
+
+        page = pages[-1]
+        while page.has_previous():
+            page = self.paginator().page(page.previous_cursor)
+            self.assertEqual(self.ids(page), self.ids(pages[page.number - 1]))
+        self.assertEqual(page.number, 1)
+
+    def test_window_around_the_page(self):
+        page = self.paginator().page()
+        for _ in range(2):
+            page = self.paginator().page(page.next_cursor)
+        self.assertEqual(page.number, 3)
+        self.assertEqual([number for number, _ in page.window], [1, 2, 3, 4, 5])
+        # Any cursor of the window opens that page.
+        for number, cursor in page.window:
+            self.assertEqual(
+                self.ids(self.paginator().page(cursor)),
+                self.ordered[(number - 1) * 5:number * 5],
+            )
+
+    def test_page_number_is_corrected_when_rows_were_removed(self):
+        third = self.paginator().page(self.paginator().page().next_cursor).next_cursor
+        Item.objects.filter(pk__in=self.ordered[:5]).delete()
+        page = self.paginator().page(third)
+        self.assertEqual(page.number, 2)
+        self.assertEqual(self.ids(page), self.ordered[10:15])
+
+    def test_invalid_cursor_is_the_first_page(self):
+        for cursor in ['garbage', self.paginator().encode_cursor(('A',), 2)]:
+            with self.subTest(cursor=cursor):
+                page = self.paginator().page(cursor)
+                self.assertEqual(page.number, 1)
+                self.assertEqual(self.ids(page), self.ordered[:5])
+
+    def test_list_view_follows_the_cursor(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(user)
+        # ProductListView: ('id',), 10 per page.
+        cursor = KeysetPaginator(Item.objects.all(), 10).page().next_cursor
+        response = self.client.get(reverse('productslist'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page_obj']
+        self.assertEqual(page.number, 2)
+        self.assertEqual(self.ids(page), sorted(self.ordered)[10:20])
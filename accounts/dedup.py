@@ -0,0 +1,199 @@
+"""
+Customer phone backfill and duplicate merging.
+
+``backfill`` recomputes the normalized search columns (E.164 phone,
+diacritic-free name and its tokens) chunk by chunk, writing only the
+stale rows.
+
+``find_duplicates`` blocks customers on hashes of their normalized phone
+and email: customers sharing either key end up in the same group, and
+keys chain (A and B share a phone, B and C an email: one group). Only
+the 8-byte hashes and ids are kept in memory.
+
+``merge_groups`` folds each group into its oldest customer (lowest id),
+``MERGE_BATCH_SIZE`` groups per transaction: sales and invoices are
+repointed with one UPDATE per table, loyalty points are added up, blank
+contact fields are filled in from the duplicates, and the duplicates
+are deleted.
+"""
+
+import hashlib
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+
+from invoice.models import Invoice
+from transactions.models import Sale
+from .models import Customer, write_name_tokens
+from .normalization import normalize_email, normalize_phone
+
+# Customers read per query while scanning.
+SCAN_CHUNK_SIZE = 2000
+
+# Duplicate groups merged per transaction.
+MERGE_BATCH_SIZE = 200
+
+# Survivor fields filled in from a duplicate when blank.
+CONTACT_FIELDS = ('last_name', 'email', 'phone', 'address')
+
+
+def _scan(fields, chunk_size):
+    """
+    Yields chunks of customers in primary key order (keyset pagination).
+    """
+    last_pk = 0
+    while True:
+        chunk = list(
+            Customer.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only(*fields)[:chunk_size]
+        )
+        if not chunk:
+            return
+        last_pk = chunk[-1].pk
+        yield chunk
+
+
+def backfill(chunk_size=SCAN_CHUNK_SIZE, dry_run=False):
+    """
+    Brings ``phone_normalized`` and ``search_name`` up to date. Returns
+    the number of stale rows (written unless ``dry_run``).
+    """
+    fields = ('first_name', 'last_name', 'phone',
+              'phone_normalized', 'search_name')
+    stale = 0
+    for chunk in _scan(fields, chunk_size):
+        changed = []
+        for customer in chunk:
+            before = (customer.phone_normalized, customer.search_name)
+            customer.refresh_search_fields()
+            if (customer.phone_normalized, customer.search_name) != before:
+                changed.append(customer)
+        stale += len(changed)
+        if changed and not dry_run:
+            Customer.objects.bulk_update(
+                changed, ['phone_normalized', 'search_name']
+            )
+            write_name_tokens(changed)
+    return stale
+
+
+def _block_key(kind, value):
+    return hashlib.blake2b(f'{kind}:{value}'.encode(), digest_size=8).digest()
+
+
+def find_duplicates(chunk_size=SCAN_CHUNK_SIZE):
+    """
+    Returns the groups of duplicate customers as sorted lists of ids,
+    oldest first. Phones are normalized from the raw column, so the
+    result does not depend on the backfill having run.
+    """
+    owners = {}
+    parent = {}
+
+    def find(pk):
+        root = pk
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while pk != root:
+            parent[pk], pk = root, parent[pk]
+        return root
+
+    for chunk in _scan(('phone', 'email'), chunk_size):
+        for customer in chunk:
+            keys = []
+            phone = normalize_phone(customer.phone)
+            if phone:
+                keys.append(_block_key('phone', phone))
+            email = normalize_email(customer.email)
+            if email:
+                keys.append(_block_key('email', email))
+            for key in keys:
+                owner = owners.setdefault(key, customer.pk)
+                if owner == customer.pk:
+                    continue
+                a, b = find(owner), find(customer.pk)
+                if a != b:
+                    # The oldest customer stays the root of its group.
+                    parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for pk in list(parent):
+        root = find(pk)
+        groups.setdefault(root, {root}).add(pk)
+    return sorted(sorted(group) for group in groups.values())
+
+
+def _batches(groups, size):
+    iterator = iter(groups)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _repoint(model, survivor_of):
+    """
+    Moves ``model`` rows from the duplicates to their survivors in one
+    UPDATE. Returns the number of rows moved.
+    """
+    survivor = Case(
+        *[When(customer_id=dup, then=Value(keep))
+          for dup, keep in survivor_of.items()],
+        output_field=IntegerField(),
+    )
+    return model.objects.filter(customer_id__in=list(survivor_of)).update(
+        customer=survivor
+    )
+
+
+@transaction.atomic
+def _merge_batch(batch):
+    survivor_of = {dup: group[0] for group in batch for dup in group[1:]}
+    customers = Customer.objects.select_for_update().in_bulk(
+        [pk for group in batch for pk in group]
+    )
+    stats = {
+        'sales': _repoint(Sale, survivor_of),
+        'invoices': _repoint(Invoice, survivor_of),
+        'points': 0,
+    }
+
+    survivors = []
+    for group in batch:
+        members = [customers[pk] for pk in group if pk in customers]
+        if len(members) < 2:
+            continue
+        keep, duplicates = members[0], members[1:]
+        for duplicate in duplicates:
+            keep.loyalty_points += duplicate.loyalty_points
+            stats['points'] += duplicate.loyalty_points
+            for field in CONTACT_FIELDS:
+                if not getattr(keep, field) and getattr(duplicate, field):
+                    setattr(keep, field, getattr(duplicate, field))
+        keep.refresh_search_fields()
+        survivors.append(keep)
+
+    Customer.objects.bulk_update(
+        survivors,
+        ['loyalty_points', *CONTACT_FIELDS, 'phone_normalized', 'search_name'],
+    )
+    write_name_tokens(survivors)
+    stats['customers'] = Customer.objects.filter(
+        pk__in=list(survivor_of)
+    ).delete()[1].get(Customer._meta.label, 0)
+    return stats
+
+
+def merge_groups(groups, batch_size=MERGE_BATCH_SIZE):
+    """
+    Merges each group of duplicates into its first (oldest) customer.
+    Returns the number of customers removed and of sales, invoices and
+    loyalty points moved.
+    """
+    totals = {'customers': 0, 'sales': 0, 'invoices': 0, 'points': 0}
+    for batch in _batches(groups, batch_size):
+        for key, value in _merge_batch(batch).items():
+            totals[key] += value
+    return totals
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+
+from accounts.dedup import (
+    MERGE_BATCH_SIZE, SCAN_CHUNK_SIZE, backfill, find_duplicates, merge_groups
+)
+from accounts.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill the normalized customer phone (E.164) and name columns, "
+        "then merge customers sharing a phone number or email address."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report stale rows and duplicate groups without changing the database",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=SCAN_CHUNK_SIZE,
+            help="Customers read per query",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=MERGE_BATCH_SIZE,
+            help="Duplicate groups merged per transaction",
+        )
+        parser.add_argument(
+            "--show",
+            type=int,
+            default=20,
+            help="Duplicate groups listed in the report (default: 20)",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        if dry_run:
+            self.stdout.write(self.style.WARNING("DRY-RUN MODE ENABLED"))
+
+        stale = backfill(options["chunk_size"], dry_run=dry_run)
+        self.stdout.write(
+            f"Normalized columns: {stale} stale rows"
+            + (" (not written)" if dry_run else " updated")
+        )
+
+        groups = find_duplicates(options["chunk_size"])
+        duplicates = sum(len(group) - 1 for group in groups)
+        self.stdout.write(
+            f"Duplicate groups: {len(groups)} ({duplicates} customers to merge)"
+        )
+        self.report(groups[:options["show"]])
+
+        if dry_run:
+            self.stdout.write(
+                self.style.SUCCESS("Dry-run completed. No database changes were made.")
+            )
+            return
+
+        totals = merge_groups(groups, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Merged {totals['customers']} customers: moved "
+            f"{totals['sales']} sales, {totals['invoices']} invoices and "
+            f"{totals['points']} loyalty points."
+        ))
+
+    def report(self, groups):
+        customers = Customer.objects.only(
+            "first_name", "last_name", "phone", "email", "loyalty_points"
+        ).in_bulk([pk for group in groups for pk in group])
+        for group in groups:
+            members = [customers[pk] for pk in group if pk in customers]
+            self.stdout.write(f"  keep #{group[0]}:")
+            for customer in members:
+                self.stdout.write(
+                    f"    #{customer.pk} {customer.first_name} "
+                    f"{customer.last_name or ''} | {customer.phone or '-'} | "
+                    f"{customer.email or '-'} | {customer.loyalty_points} pts"
+                )
@@ -0,0 +1,79 @@
+# Generated by Django 5.1 on 2026-10-17 22:30
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Frozen copies of the accounts.normalization helpers of this migration:
+# later changes to them must not change what it writes.
+_COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_name(text):
+    text = unicodedata.normalize("NFKD", (text or "").lower().replace("đ", "d"))
+    return " ".join(_COMBINING_MARKS.sub("", text).split())
+
+
+def normalize_phone(text):
+    digits = _NON_DIGITS.sub("", text or "")
+    return digits or None
+
+
+def fill_search_fields(apps, schema_editor):
+    Customer = apps.get_model("accounts", "Customer")
+    db_alias = schema_editor.connection.alias
+    customers = Customer.objects.using(db_alias).order_by("pk")
+    batch = []
+    for customer in customers.iterator(chunk_size=2000):
+        customer.phone_normalized = normalize_phone(customer.phone)
+        customer.search_name = normalize_name(
+            f"{customer.first_name} {customer.last_name or ''}"
+        )
+        batch.append(customer)
+        if len(batch) == 2000:
+            Customer.objects.using(db_alias).bulk_update(
+                batch, ["phone_normalized", "search_name"]
+            )
+            batch = []
+    Customer.objects.using(db_alias).bulk_update(
+        batch, ["phone_normalized", "search_name"]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_alter_profile_role"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="phone_normalized",
+            field=models.CharField(
+                blank=True, editable=False, max_length=32, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="search_name",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=513
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["search_name", "id"], name="customer_search_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["phone_normalized"], name="customer_phone_idx"
+            ),
+        ),
+        migrations.RunPython(fill_search_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1 on 2026-10-17 17:58
+
+import re
+import unicodedata
+
+import phonenumbers
+from django.conf import settings
+from django.db import migrations
+
+# Frozen copies of the accounts.normalization helpers of this migration:
+# later changes to them must not change what it writes.
+_COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+
+
+def search_name(first_name, last_name):
+    text = f"{first_name or ''} {last_name or ''}"
+    text = unicodedata.normalize("NFKD", text.lower().replace("đ", "d"))
+    return " ".join(_COMBINING_MARKS.sub("", text).split())
+
+
+def normalize_phone(text):
+    if not text or not text.strip():
+        return None
+    region = getattr(settings, "PHONENUMBER_DEFAULT_REGION", None)
+    try:
+        number = phonenumbers.parse(text, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_possible_number(number):
+        return None
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def renormalize(apps, schema_editor):
+    # phone_normalized held the digits of the phone; it is now the E.164
+    # form.
+    Customer = apps.get_model("accounts", "Customer")
+    db_alias = schema_editor.connection.alias
+    customers = Customer.objects.using(db_alias).order_by("pk")
+    batch = []
+    for customer in customers.iterator(chunk_size=2000):
+        customer.phone_normalized = normalize_phone(customer.phone)
+        customer.search_name = search_name(
+            customer.first_name, customer.last_name
+        )
+        batch.append(customer)
+        if len(batch) == 2000:
+            Customer.objects.using(db_alias).bulk_update(
+                batch, ["phone_normalized", "search_name"]
+            )
+            batch = []
+    Customer.objects.using(db_alias).bulk_update(
+        batch, ["phone_normalized", "search_name"]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_customer_search_fields"),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalize, migrations.RunPython.noop),
+    ]
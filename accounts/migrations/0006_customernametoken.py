@@ -0,0 +1,66 @@
+# Generated by Django 5.1 on 2026-10-17 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_tokens(apps, schema_editor):
+    # One row per distinct word of the (already normalized) search_name.
+    Customer = apps.get_model("accounts", "Customer")
+    CustomerNameToken = apps.get_model("accounts", "CustomerNameToken")
+    db_alias = schema_editor.connection.alias
+    customers = Customer.objects.using(db_alias).order_by("pk").values_list(
+        "pk", "search_name"
+    )
+    batch = []
+    for pk, name in customers.iterator(chunk_size=2000):
+        batch.extend(
+            CustomerNameToken(customer_id=pk, token=token)
+            for token in sorted(set(name.split()))
+        )
+        if len(batch) >= 2000:
+            CustomerNameToken.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    CustomerNameToken.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_renormalize_customer_phones"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CustomerNameToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=256)),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="name_tokens",
+                        to="accounts.customer",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "CustomerNameTokens",
+                "indexes": [
+                    models.Index(
+                        fields=["token", "customer"], name="customer_token_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_tokens, migrations.RunPython.noop),
+    ]
@@ -6,6 +6,8 @@ from imagekit.models import ProcessedImageField
 from imagekit.processors import ResizeToFill
 from phonenumber_field.modelfields import PhoneNumberField
 
+from .normalization import normalize_phone, search_name
+
 
 # Define choices for profile status and roles
 STATUS_CHOICES = [
@@ -127,9 +129,48 @@ class Customer(models.Model):
     email = models.EmailField(max_length=256, blank=True, null=True)
     phone = models.CharField(max_length=30, blank=True, null=True)
     loyalty_points = models.IntegerField(default=0)
+    # Tìm kiếm nhanh: giá trị chuẩn hóa, cập nhật trong save()
+    phone_normalized = models.CharField(
+        max_length=32, blank=True, null=True, editable=False
+    )
+    search_name = models.CharField(
+        max_length=513, blank=True, default='', editable=False
+    )
 
     class Meta:
         db_table = 'Customers'
+        indexes = [
+            models.Index(
+                fields=['search_name', 'id'], name='customer_search_name_idx'
+            ),
+            models.Index(
+                fields=['phone_normalized'], name='customer_phone_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.refresh_search_fields()
+        super().save(*args, **kwargs)
+        write_name_tokens([self])
+
+    def refresh_search_fields(self):
+        """
+        Recomputes ``phone_normalized`` and ``search_name`` (done by save();
+        call it before ``bulk_update``, and ``write_name_tokens`` after).
+        """
+        self.phone_normalized = normalize_phone(self.phone)
+        self.search_name = search_name(self.first_name, self.last_name)
+
+    @classmethod
+    def with_phone(cls, phone):
+        """
+        Customers whose phone is ``phone`` in any notation ("0912 345 678",
+        "+84912345678"...), through the phone_normalized index.
+        """
+        normalized = normalize_phone(phone)
+        if normalized is None:
+            return cls.objects.none()
+        return cls.objects.filter(phone_normalized=normalized)
 
     def __str__(self):
         # Hiển thị dạng: "Nguyễn Văn A - 0912345678"
@@ -144,3 +185,41 @@ class Customer(models.Model):
             "value": self.id
         }
         return item
+
+
+class CustomerNameToken(models.Model):
+    """
+    One word of a customer's ``search_name``: customers are looked up by
+    the start of any part of their name with a range scan of the token
+    index.
+    """
+    customer = models.ForeignKey(
+        Customer, on_delete=models.CASCADE, related_name='name_tokens'
+    )
+    token = models.CharField(max_length=256)
+
+    class Meta:
+        db_table = 'CustomerNameTokens'
+        indexes = [
+            models.Index(
+                fields=['token', 'customer'], name='customer_token_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return self.token
+
+
+def write_name_tokens(customers):
+    """
+    Replaces the name tokens of ``customers`` with the words of their
+    ``search_name``.
+    """
+    CustomerNameToken.objects.filter(
+        customer__in=[customer.pk for customer in customers]
+    ).delete()
+    CustomerNameToken.objects.bulk_create(
+        CustomerNameToken(customer_id=customer.pk, token=token)
+        for customer in customers
+        for token in sorted(set(customer.search_name.split()))
+    )
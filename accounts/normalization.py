@@ -0,0 +1,84 @@
+"""
+Normalized forms of customer names, phone numbers and emails.
+
+They are stored next to the original values (see ``Customer.save``) so
+customer lookups can use plain index lookups and range scans instead of
+``icontains``. Phone numbers are kept in E.164 form ("+84912345678"),
+read in ``PHONENUMBER_DEFAULT_REGION`` when they have no country code.
+"""
+
+import re
+import unicodedata
+
+import phonenumbers
+from django.conf import settings
+
+_COMBINING_MARKS = re.compile(r'[\u0300-\u036f]')
+_NON_DIGITS = re.compile(r'\D')
+
+# Upper bound for "starts with" range scans: ``value >= prefix`` and
+# ``value < prefix + PREFIX_END``.
+PREFIX_END = '\U0010ffff'
+
+
+def normalize_name(text):
+    """
+    Lowercases ``text``, strips diacritics (đ -> d) and collapses spaces.
+    """
+    text = unicodedata.normalize('NFKD', (text or '').lower().replace('đ', 'd'))
+    return ' '.join(_COMBINING_MARKS.sub('', text).split())
+
+
+def search_name(first_name, last_name):
+    return normalize_name(f"{first_name or ''} {last_name or ''}")
+
+
+def normalize_phone(text, region=None):
+    """
+    Returns a phone number in E.164 form, or None when ``text`` is not a
+    possible phone number.
+    """
+    if not text or not text.strip():
+        return None
+    region = region or getattr(settings, 'PHONENUMBER_DEFAULT_REGION', None)
+    try:
+        number = phonenumbers.parse(text, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_possible_number(number):
+        return None
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def phone_prefix(text, region=None):
+    """
+    Returns the start of the E.164 form of a phone number being typed
+    ("0912" -> "+84912", "+84 91" -> "+8491"), or None without digits.
+    """
+    text = (text or '').strip()
+    digits = _NON_DIGITS.sub('', text)
+    if text.startswith('+'):
+        return f'+{digits}' if digits else None
+    # Without the national trunk prefix: "0912" is "+84912...".
+    digits = digits.lstrip('0')
+    if not digits:
+        return None
+    region = region or getattr(settings, 'PHONENUMBER_DEFAULT_REGION', None)
+    country_code = phonenumbers.country_code_for_region(region) if region else 0
+    return f'+{country_code or ""}{digits}'
+
+
+def normalize_email(text):
+    """
+    Returns a trimmed, lowercased email address, or None when empty.
+    """
+    text = (text or '').strip().lower()
+    return text or None
+
+
+def prefix_range(field, prefix):
+    """
+    Lookup kwargs matching values of ``field`` that start with ``prefix``
+    through an index range scan.
+    """
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix + PREFIX_END}
@@ -1 +1,162 @@
-# tests
\ No newline at end of file
+import io
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from InventoryMS.testing import QueryBudgetTestCase
+from invoice.models import Invoice
+from store.models import Category, Item
+from transactions.models import Sale
+from . import dedup
+from .models import Customer
+
+search_fields_migration = import_module('accounts.migrations.0004_customer_search_fields')
+renormalize_migration = import_module(
+    'accounts.migrations.0005_renormalize_customer_phones'
+)
+
+
+class SearchFieldsMigrationTests(TestCase):
+
+    def run_migration(self, migration):
+        migration(apps, SimpleNamespace(connection=connection))
+
+    def test_0004_stores_the_digits(self):
+        customer = Customer.objects.create(first_name='Đức', last_name='Trần', phone='0912 345 678')
+        Customer.objects.filter(pk=customer.pk).update(phone_normalized=None, search_name='')
+        self.run_migration(search_fields_migration.fill_search_fields)
+        customer.refresh_from_db()
+        self.assertEqual(customer.phone_normalized, '0912345678')
+        self.assertEqual(customer.search_name, 'duc tran')
+
+    def test_0005_digits_become_e164(self):
+        customer = Customer.objects.create(first_name='Đức', last_name='Trần', phone='0912 345 678')
+        # As stored before phones were kept in E.164.
+        Customer.objects.filter(pk=customer.pk).update(
+            phone_normalized='0912345678', search_name=''
+        )
+        self.run_migration(renormalize_migration.renormalize)
+        customer.refresh_from_db()
+        self.assertEqual(customer.phone_normalized, '+84912345678')
+        self.assertEqual(customer.search_name, 'duc tran')
+
+
+class DedupeCustomersTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.an = Customer.objects.create(first_name='An', phone='0912 345 678', loyalty_points=10)
+        # Same phone in another notation, with the email the first lacks.
+        cls.an_again = Customer.objects.create(
+            first_name='An', last_name='Nguyễn', phone='+84912345678',
+            email='An@Example.com', loyalty_points=5,
+        )
+        # Same email as the second: chained into the same group.
+        cls.an_email = Customer.objects.create(
+            first_name='An', email='an@example.com ', loyalty_points=1,
+        )
+        cls.binh = Customer.objects.create(first_name='Bình', phone='0987654321')
+        cls.sale = Sale.objects.create(customer=cls.an_again, sub_total=10, grand_total=10, amount_paid=10)
+        category = Category.objects.create(name='Drinks')
+        item = Item.objects.create(name='Coffee', description='-', category=category, quantity=5, price=2)
+        cls.invoice = Invoice.objects.create(
+            customer=cls.an_email, item=item, price_per_item=2, quantity=1, shipping=0,
+        )
+
+    def dedupe(self, *args):
+        out = io.StringIO()
+        call_command('dedupe_customers', *args, stdout=out)
+        return out.getvalue()
+
+    def test_finds_chained_duplicates(self):
+        self.assertEqual(
+            dedup.find_duplicates(chunk_size=2),
+            [[self.an.pk, self.an_again.pk, self.an_email.pk]],
+        )
+
+    def test_merges_into_the_oldest_customer(self):
+        output = self.dedupe()
+        self.assertIn('Merged 2 customers: moved 1 sales, 1 invoices and 6 loyalty points.', output)
+        self.assertEqual(set(Customer.objects.values_list('pk', flat=True)), {self.an.pk, self.binh.pk})
+
+        an = Customer.objects.get(pk=self.an.pk)
+        self.assertEqual(an.loyalty_points, 16)
+        self.assertEqual((an.last_name, an.email), ('Nguyễn', 'An@Example.com'))
+        self.assertEqual(an.search_name, 'an nguyen')
+        self.assertEqual(
+            set(an.name_tokens.values_list('token', flat=True)), {'an', 'nguyen'}
+        )
+        self.sale.refresh_from_db()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.sale.customer_id, self.an.pk)
+        self.assertEqual(self.invoice.customer_id, self.an.pk)
+
+    def test_dry_run_changes_nothing(self):
+        Customer.objects.filter(pk=self.binh.pk).update(phone_normalized=None)
+        output = self.dedupe('--dry-run')
+        self.assertIn('Normalized columns: 1 stale rows (not written)', output)
+        self.assertIn('Duplicate groups: 1 (2 customers to merge)', output)
+        self.assertEqual(Customer.objects.count(), 4)
+        self.assertIsNone(Customer.objects.get(pk=self.binh.pk).phone_normalized)
+        self.sale.refresh_from_db()
+        self.assertEqual(self.sale.customer_id, self.an_again.pk)
+
+
+class GetCustomersTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cashier', password='pw')
+        cls.an = Customer.objects.create(
+            first_name='Văn An', last_name='Nguyễn', phone='0912 345 678'
+        )
+        cls.binh = Customer.objects.create(
+            first_name='Thị Bình', last_name='Trần', phone='0987654321'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, term):
+        response = self.client.get(reverse('get_customers'), {'term': term})
+        self.assertEqual(response.status_code, 200)
+        return {result['id'] for result in response.json()['results']}
+
+    def test_matches_start_of_any_name_part(self):
+        self.assertEqual(self.search('an'), {self.an.pk})
+        self.assertEqual(self.search('Tran'), {self.binh.pk})
+        self.assertEqual(self.search('bình'), {self.binh.pk})
+        self.assertEqual(self.search('inh'), set())
+
+    def test_matches_every_word(self):
+        self.assertEqual(self.search('nguyen an'), {self.an.pk})
+        self.assertEqual(self.search('an tran'), set())
+
+    def test_renamed_customer_is_found_by_new_name(self):
+        self.an.first_name = 'Minh'
+        self.an.save()
+        self.assertEqual(self.search('minh'), {self.an.pk})
+        self.assertEqual(self.search('an'), set())
+
+    def test_matches_start_of_phone(self):
+        self.assertEqual(self.search('0912'), {self.an.pk})
+        self.assertEqual(self.search('912 345'), {self.an.pk})
+        self.assertEqual(self.search('+84 98765'), {self.binh.pk})
+        self.assertEqual(self.search('345678'), set())
+        self.assertEqual(self.search('09'), set())
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    def test_pages(self):
+        self.assertPagesLoad(reverse('customer_list'), reverse('vendor-list'))
+
+    def test_customer_search(self):
+        response = self.client.get(reverse('get_customers'), {'term': 'a'})
+        self.assertEqual(response.status_code, 200)
@@ -1,10 +1,13 @@
+import re
+
 # Django core imports
 from django.shortcuts import render, redirect
 from django.http import JsonResponse
 from django.urls import reverse_lazy, reverse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_http_methods
 from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.utils.decorators import method_decorator
 # Authentication and permissions
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
@@ -24,13 +27,16 @@ from django_tables2.export.views import ExportMixin
 from django.db.models import Q
 
 # Local app imports
-from .models import Profile, Customer, Vendor
+from .models import Profile, Customer, CustomerNameToken, Vendor
 from .forms import (
     CreateUserForm, UserUpdateForm,
     ProfileUpdateForm, CustomerForm,
     VendorForm
 )
 from .tables import ProfileTable
+from .normalization import normalize_name, phone_prefix, prefix_range
+from InventoryMS.db import read_from_replica
+from InventoryMS.querycount import query_budget
 
 from .forms import ProfileUpdateForm 
 from django.contrib import messages
@@ -93,6 +99,7 @@ def profile_update(request):
     )
 
 
+@method_decorator(read_from_replica, name='dispatch')
 class ProfileListView(LoginRequiredMixin, ExportMixin, SingleTableView):
     """
     Display a list of profiles in a table format.
@@ -211,6 +218,8 @@ class ProfileDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView)
         return reverse('profile_list')
 
 
+@query_budget(10)
+@method_decorator(read_from_replica, name='dispatch')
 class CustomerListView(LoginRequiredMixin, ListView):
     """
     View for listing all customers.
@@ -268,39 +277,74 @@ def is_ajax(request):
     return request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
 
 
+# Customer search (Select2)
+CUSTOMER_PAGE_SIZE = 20
+# Shorter numbers would match most phones.
+MIN_PHONE_DIGITS = 3
+_NON_DIGITS = re.compile(r'\D')
+
+
+@query_budget(6)
 @csrf_exempt
-@require_POST
+@require_http_methods(["GET", "POST"])
 @login_required
 def get_customers(request):
     """
-    Hàm xử lý AJAX request từ Select2 để tìm khách hàng
-    """
-    if request.method == 'POST':
-        # Lấy từ khóa người dùng gõ vào (tên hoặc sđt)
-        key = request.POST.get('term', '')
-        
-        # Tìm kiếm theo: Tên (first_name) HOẶC Họ (last_name) HOẶC SĐT (phone)
-        customers = Customer.objects.filter(
-            Q(first_name__icontains=key) |
-            Q(last_name__icontains=key) |
-            Q(phone__icontains=key)  # <--- Đây là dòng giúp tìm bằng SĐT
-        )
-
-        data = []
-        for c in customers:
-            # Tạo chuỗi hiển thị: "Nguyễn Văn A - 0912345678"
-            # Xử lý trường hợp phone bị None
-            phone_display = c.phone if c.phone else "No Phone"
-            label_display = f"{c.first_name} {c.last_name} - {phone_display}"
-            
-            data.append({
-                'id': c.id,
-                'text': label_display # Select2 dùng key 'text' để hiển thị
-            })
-            
-        return JsonResponse(data, safe=False)
-
+    Hàm xử lý AJAX request từ Select2 để tìm khách hàng.
 
+    Tìm theo đầu của từng phần tên (không dấu) hoặc đầu số điện thoại,
+    và trả về từng trang theo giao thức Select2:
+    {"results": [{"id", "text"}], "pagination": {"more": bool}}
+    """
+    params = request.POST if request.method == 'POST' else request.GET
+    term = params.get('term', '')
+    try:
+        page = max(int(params.get('page') or 1), 1)
+    except ValueError:
+        page = 1
+
+    customers = _customer_matches(term).order_by('search_name', 'id')
+    offset = (page - 1) * CUSTOMER_PAGE_SIZE
+    rows = list(customers.values_list(
+        'id', 'first_name', 'last_name', 'phone'
+    )[offset:offset + CUSTOMER_PAGE_SIZE + 1])
+
+    results = []
+    for pk, first_name, last_name, phone in rows[:CUSTOMER_PAGE_SIZE]:
+        # Tạo chuỗi hiển thị: "Nguyễn Văn A - 0912345678"
+        name = " ".join(part for part in (first_name, last_name) if part)
+        results.append({
+            'id': pk,
+            'text': f"{name} - {phone or 'No Phone'}",
+        })
+
+    return JsonResponse({
+        'results': results,
+        'pagination': {'more': len(rows) > CUSTOMER_PAGE_SIZE},
+    })
+
+
+def _customer_matches(term):
+    """
+    Customers with a name part (first or last name, normalized) starting
+    with each word of ``term``, or whose phone number starts with it.
+    Both are index range scans: of the name tokens and of
+    ``phone_normalized``.
+    """
+    name = normalize_name(term)
+    if not name:
+        return Customer.objects.all()
+    query = Q()
+    for word in name.split():
+        tokens = CustomerNameToken.objects.filter(**prefix_range('token', word))
+        query &= Q(pk__in=tokens.values('customer_id'))
+    if len(_NON_DIGITS.sub('', term)) >= MIN_PHONE_DIGITS:
+        query |= Q(**prefix_range('phone_normalized', phone_prefix(term)))
+    return Customer.objects.filter(query)
+
+
+@query_budget(10)
+@method_decorator(read_from_replica, name='dispatch')
 class VendorListView(LoginRequiredMixin, ListView):
     model = Vendor
     template_name = 'accounts/vendor_list.html'
@@ -0,0 +1,10 @@
+"""
+Benchmarks of the hot views and model operations.
+
+``manage.py run_benchmarks`` builds a throwaway database for each dataset
+size (``store.synthetic``), times the cases of ``benchmarks.cases``
+against it and writes the results as JSON. It fails when a case got
+slower, used more memory or ran more queries than in the baseline file
+(see ``benchmarks.runner``), and when there is no baseline: the first
+run needs ``--update-baseline``, which writes one.
+"""
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class BenchmarksConfig(AppConfig):
+    """Benchmark suite (``manage.py run_benchmarks``); no models."""
+
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'benchmarks'
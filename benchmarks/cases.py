@@ -0,0 +1,182 @@
+"""
+The benchmarked cases.
+
+``cases(context)`` returns the cases for one dataset, read from the
+database it was generated into. Each case has a ``setup`` (not timed)
+returning the argument of ``run`` (timed): a request, a payload...
+"""
+
+from django.urls import reverse
+
+from store.loadtest import AJAX, sale_payload
+from store.models import ExportCache, Item
+from accounts.models import Vendor
+
+# Lines of the benchmarked sale baskets.
+BASKET_SIZES = (1, 10, 100)
+
+# How deep into each list the "deep page" cases start (0.9: the page 90%
+# of the way through the table).
+DEEP_PAGE_DEPTH = 0.9
+
+# Search term for the item lookup: the start of a common product word.
+ITEM_SEARCH_TERM = 'pre'
+
+EXPORTS = (
+    'export_products', 'export_sales', 'sales-export', 'export_purchases',
+    'export_deliveries', 'export_invoices', 'export_bills',
+)
+
+
+class Case:
+    """
+    One benchmark: ``run(setup())`` is timed; it raises when the
+    operation fails so a broken case is not mistaken for a fast one.
+    """
+
+    def __init__(self, name, run, setup=None):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda: None)
+
+
+def _ok(response):
+    if response.status_code != 200:
+        raise AssertionError(f"HTTP {response.status_code}")
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    response.close()
+    return response
+
+
+class Context:
+    """
+    What the cases share: a logged-in test client and the user.
+    """
+
+    def __init__(self, client, user):
+        self.client = client
+        self.user = user
+
+
+def _sale_cases(context):
+    # The items with the most stock, so repeated sales never run out.
+    stocked = list(
+        Item.objects.order_by('-quantity', 'pk')
+        .values_list('pk', 'name', 'price')[:max(BASKET_SIZES)]
+    )
+    url = reverse('sale-create')
+
+    def basket_case(size):
+        basket = [(pk, name, price, 1) for pk, name, price in stocked[:size]]
+
+        def setup():
+            payload = sale_payload(basket, None)
+            return payload, {**AJAX, 'Idempotency-Key': payload['idempotency_key']}
+
+        def run(args):
+            payload, headers = args
+            _ok(context.client.post(
+                url, payload, content_type='application/json', headers=headers
+            ))
+
+        return Case(f'sale_create[{size} lines]', run, setup)
+
+    return [basket_case(size) for size in BASKET_SIZES if size <= len(stocked)]
+
+
+def _lookup_cases(context):
+    from store import dashboard
+
+    def get_items(_):
+        _ok(context.client.post(
+            reverse('get_items'), {'term': ITEM_SEARCH_TERM}, headers=AJAX
+        ))
+
+    def dashboard_page(_):
+        _ok(context.client.get(reverse('dashboard')))
+
+    return [
+        Case('get_items[search]', get_items),
+        Case('dashboard[cold cache]', dashboard_page, dashboard.invalidate),
+        Case('dashboard[warm cache]', dashboard_page),
+    ]
+
+
+def _export_cases(context):
+    def export_case(name):
+        def run(_):
+            _ok(context.client.get(reverse(name)))
+
+        # Incremental exports rebuild their file from scratch.
+        return Case(
+            f'{name}[full]', run, lambda: ExportCache.objects.all().delete()
+        )
+
+    return [export_case(name) for name in EXPORTS]
+
+
+def _deep_page_cursor(view_class):
+    from InventoryMS.pagination import KeysetPaginator
+
+    view = view_class()
+    view.kwargs = {}
+    paginator = KeysetPaginator(
+        view.get_queryset(), view.paginate_by, view.keyset_ordering
+    )
+    rows = paginator.queryset.count()
+    page = int(rows * DEEP_PAGE_DEPTH) // paginator.per_page
+    if page < 1:
+        return None
+    # Key of the last row of the page before.
+    key = paginator.queryset.values_list(*paginator.fields)[
+        page * paginator.per_page - 1
+    ]
+    return paginator.encode_cursor(key, page + 1)
+
+
+def _list_cases(context):
+    from bills.views import BillListView
+    from invoice.views import InvoiceListView
+    from store.views import ProductListView
+    from transactions.views import PurchaseListView, SaleListView
+
+    views = {
+        'saleslist': SaleListView,
+        'purchaseslist': PurchaseListView,
+        'productslist': ProductListView,
+        'invoicelist': InvoiceListView,
+        'bill_list': BillListView,
+    }
+    cases = []
+    for name, view_class in views.items():
+        cursor = _deep_page_cursor(view_class)
+        if cursor is None:
+            continue
+
+        def run(_, url=reverse(name), cursor=cursor):
+            _ok(context.client.get(url, {'cursor': cursor}))
+
+        cases.append(Case(f'{name}[deep page]', run))
+    return cases
+
+
+def _model_cases(context):
+    from transactions.models import Purchase
+
+    item = Item.objects.order_by('pk').first()
+    vendor = Vendor.objects.order_by('pk').first()
+
+    def run(_):
+        # post_save adds the stock and creates the bill.
+        Purchase.objects.create(item=item, vendor=vendor, price=10, quantity=5)
+
+    return [Case('purchase_create[with bill]', run)]
+
+
+def cases(context):
+    return (
+        _sale_cases(context) + _lookup_cases(context) + _export_cases(context)
+        + _list_cases(context) + _model_cases(context)
+    )
@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import serving
+from store.synthetic import SCALES
+
+
+class Command(BaseCommand):
+    help = (
+        "Start runserver and the production gunicorn setup on a generated "
+        "database and compare their requests per second and latency over HTTP"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--setup",
+            action="append",
+            choices=list(serving.SETUPS),
+            help="Setup to run (repeatable, default: all)",
+        )
+        parser.add_argument("--size", choices=sorted(SCALES), default="small",
+                            help="Dataset size (store.synthetic presets)")
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Seed of the dataset and the terminals")
+        parser.add_argument("--terminals", type=int, default=8,
+                            help="Concurrent POS terminals, and static file readers")
+        parser.add_argument("--seconds", type=float, default=20.0,
+                            help="Measured duration of the POS load")
+        parser.add_argument("--warmup", type=float, default=5.0,
+                            help="Seconds of POS load run before measuring")
+        parser.add_argument("--static-seconds", type=float, default=5.0,
+                            help="Duration of the static file load")
+        parser.add_argument("--output", help="Write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        if options["terminals"] < 1 or options["seconds"] <= 0 \
+                or options["static_seconds"] <= 0:
+            raise CommandError(
+                "--terminals, --seconds and --static-seconds must be positive"
+            )
+        try:
+            document = serving.run(
+                options["setup"] or list(serving.SETUPS),
+                SCALES[options["size"]],
+                seed=options["seed"],
+                terminals=options["terminals"],
+                seconds=options["seconds"],
+                warmup=options["warmup"],
+                static_seconds=options["static_seconds"],
+                progress=lambda message: self.stdout.write(f"  {message}"),
+            )
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{'setup':<12}{'POS req/s':>11}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'p99 ms':>9}{'errors':>8}{'static req/s':>14}{'p95 ms':>9}"
+        )
+        for name, result in document["results"].items():
+            pos, static = result["pos"]["all"], result["static"]
+            self.stdout.write(
+                f"{name:<12}{pos['per_second']:>11.1f}{pos['p50_ms']:>9.1f}"
+                f"{pos['p95_ms']:>9.1f}{pos['p99_ms']:>9.1f}"
+                f"{pos['errors'] + static['errors']:>8}"
+                f"{static['per_second']:>14.1f}{static['p95_ms']:>9.1f}"
+            )
+
+        results = document["results"]
+        if "runserver" in results and "gunicorn" in results:
+            before, after = results["runserver"], results["gunicorn"]
+            self.stdout.write(
+                "gunicorn / runserver: "
+                f"POS x{after['pos']['all']['per_second'] / before['pos']['all']['per_second']:.2f}, "
+                f"static x{after['static']['per_second'] / before['static']['per_second']:.2f}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(document, f, indent=2)
+                f.write("\n")
+            self.stdout.write(f"Wrote {options['output']}")
@@ -0,0 +1,111 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import runner
+from store.synthetic import SCALES
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json')
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot views and model operations against generated datasets "
+        "in a throwaway database, write the results as JSON and compare "
+        "them with a baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            action="append",
+            choices=sorted(SCALES),
+            help="Dataset size (store.synthetic presets; repeatable, default: small)",
+        )
+        parser.add_argument("--case", action="append",
+                            help="Only run the cases whose name contains this (repeatable)")
+        parser.add_argument("--repeats", type=int, default=runner.DEFAULT_REPEATS,
+                            help="Timed runs per case")
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Seed of the generated datasets")
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument(
+            "--baseline",
+            default=DEFAULT_BASELINE,
+            help="Baseline to compare with (default: benchmarks/baseline.json)",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=runner.DEFAULT_THRESHOLD,
+            help="Allowed growth of time and memory, as a fraction (default: 0.25)",
+        )
+        parser.add_argument(
+            "--update-baseline", "--save-baseline",
+            action="store_true",
+            dest="update_baseline",
+            help="Write the results to the baseline file instead of comparing",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeats"] < 1:
+            raise CommandError("--repeats must be at least 1")
+        # A run without a baseline would pass whatever the results.
+        if not options["update_baseline"] and not os.path.exists(options["baseline"]):
+            raise CommandError(
+                f"No baseline at {options['baseline']}; "
+                f"run with --update-baseline to create it"
+            )
+        sizes = options["size"] or ["small"]
+        document = runner.run(
+            {size: SCALES[size] for size in sizes},
+            seed=options["seed"],
+            repeats=options["repeats"],
+            selected=options["case"],
+            progress=lambda message: self.stdout.write(f"  {message}"),
+        )
+        self.report(document)
+
+        if options["output"]:
+            self.write(document, options["output"])
+        if options["update_baseline"]:
+            self.write(document, options["baseline"])
+            return
+
+        with open(options["baseline"]) as f:
+            baseline = json.load(f)
+        found = runner.regressions(document, baseline, options["threshold"])
+        for size, name, metric, before, now in found:
+            self.stdout.write(self.style.ERROR(
+                f"  {size} {name}: {metric} {before} -> {now}"
+            ))
+        if found:
+            raise CommandError(
+                f"{len(found)} regression(s) against {options['baseline']} "
+                f"(revision {baseline['meta'].get('revision')})"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"No regression against {options['baseline']}"
+        ))
+
+    def report(self, document):
+        for size, results in document["results"].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{size} dataset"))
+            self.stdout.write(
+                f"  {'case':<34}{'median ms':>11}{'min ms':>10}"
+                f"{'queries':>9}{'peak KiB':>11}"
+            )
+            for name, result in results.items():
+                self.stdout.write(
+                    f"  {name:<34}{result['wall_ms']:>11.1f}"
+                    f"{result['wall_ms_min']:>10.1f}{result['queries']:>9}"
+                    f"{result['peak_kb']:>11.1f}"
+                )
+
+    def write(self, document, path):
+        with open(path, "w") as f:
+            json.dump(document, f, indent=2)
+            f.write("\n")
+        self.stdout.write(f"Wrote {path}")
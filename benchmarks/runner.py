@@ -0,0 +1,176 @@
+"""
+Runs the benchmark cases and compares results with a baseline.
+
+For each dataset size a test database is created (as ``manage.py test``
+does, so real databases are never touched), filled by
+``store.synthetic.generate`` and dropped afterwards. The cache and
+``EXPORT_ROOT`` (export files) are replaced by throwaway ones for the run.
+
+Each case runs once to warm up, ``repeats`` times timed, then once more
+with its queries counted and tracemalloc on (which slows it down, so it
+is not timed). Results:
+
+    {"meta": {...}, "results": {size: {case: {
+        "wall_ms": median, "wall_ms_min": ..., "queries": ..., "peak_kb": ...
+    }}}}
+
+``regressions`` compares them with a baseline: a case regresses when it
+runs more queries, or its median time or peak memory grew by more than
+``threshold`` (0.25: 25%) and by more than the noise floor
+(``MIN_WALL_DELTA_MS``, ``MIN_MEMORY_DELTA_KB``).
+"""
+
+import datetime
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+
+from InventoryMS.querycount import QueryCounter
+from store.synthetic import generate
+from . import cases as benchmark_cases
+
+DEFAULT_REPEATS = 5
+DEFAULT_THRESHOLD = 0.25
+
+# Differences below these are noise whatever the ratio.
+MIN_WALL_DELTA_MS = 2.0
+MIN_MEMORY_DELTA_KB = 64
+
+RESULT_METRICS = ('wall_ms', 'peak_kb')
+
+
+def measure(case, repeats=DEFAULT_REPEATS):
+    case.run(case.setup())
+
+    times = []
+    for _ in range(repeats):
+        argument = case.setup()
+        started = time.perf_counter()
+        case.run(argument)
+        times.append(1000 * (time.perf_counter() - started))
+
+    argument = case.setup()
+    counter = QueryCounter()
+    tracemalloc.start()
+    try:
+        with connection.execute_wrapper(counter):
+            case.run(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': round(statistics.median(times), 3),
+        'wall_ms_min': round(min(times), 3),
+        'queries': counter.count,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def _revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, cwd=settings.BASE_DIR, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_size(scale, seed, repeats, selected=None, progress=None):
+    """
+    Benchmarks one dataset; returns ``{case name: result}``.
+    """
+    progress = progress or (lambda message: None)
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        progress(f"generating {scale}")
+        generate(scale, seed)
+        user = get_user_model().objects.create_superuser(
+            'benchmark', 'benchmark@example.com', None
+        )
+        client = Client()
+        client.force_login(user)
+
+        results = {}
+        for case in benchmark_cases.cases(benchmark_cases.Context(client, user)):
+            if selected and not any(name in case.name for name in selected):
+                continue
+            results[case.name] = measure(case, repeats)
+            progress(f"{case.name}: {results[case.name]['wall_ms']:.1f} ms")
+        return results
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+def run(scales, seed=0, repeats=DEFAULT_REPEATS, selected=None, progress=None):
+    """
+    Benchmarks every ``{size name: Scale}``; returns the results document.
+    """
+    document = {
+        'meta': {
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'revision': _revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'seed': seed,
+            'repeats': repeats,
+        },
+        'results': {},
+    }
+    setup_test_environment()
+    try:
+        # No sampled profiling: a profiled run takes twice as long.
+        with tempfile.TemporaryDirectory() as export_root, override_settings(
+            EXPORT_ROOT=export_root,
+            PROFILE_SAMPLE_RATE=0,
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'benchmarks',
+            }},
+        ):
+            for name, scale in scales.items():
+                document['results'][name] = run_size(
+                    scale, seed, repeats, selected, progress
+                )
+    finally:
+        teardown_test_environment()
+    return document
+
+
+def regressions(document, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    ``[(size, case, metric, baseline value, value)]`` of the results of
+    ``document`` that regressed against ``baseline``. Cases missing from
+    the baseline are skipped.
+    """
+    floors = {'wall_ms': MIN_WALL_DELTA_MS, 'peak_kb': MIN_MEMORY_DELTA_KB}
+    found = []
+    for size, results in document['results'].items():
+        for name, result in results.items():
+            before = baseline.get('results', {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                found.append(
+                    (size, name, 'queries', before['queries'], result['queries'])
+                )
+            for metric in RESULT_METRICS:
+                grew = result[metric] - before[metric]
+                if grew > floors[metric] and grew > before[metric] * threshold:
+                    found.append((size, name, metric, before[metric], result[metric]))
+    return found
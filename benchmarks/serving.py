@@ -0,0 +1,295 @@
+"""
+Compares serving stacks over HTTP (``manage.py benchmark_serving``).
+
+Each setup of ``SETUPS`` is started as a real server on a local port,
+against the same generated database, then driven by the POS terminals
+of ``store.loadtest`` (customer and item lookups, sales, dashboard) and
+by readers fetching the stylesheet of the dashboard page, as browsers do
+on every page load:
+
+- runserver: the old Docker command; DEBUG on, the autoreloader
+  watching the tree, static files served by Django.
+- gunicorn: the production image; gunicorn.conf.py, DEBUG off, hashed
+  and compressed static files served by WhiteNoise.
+
+Both use the production SQLite profile, so only the serving stack
+differs. The database is a test database (as ``manage.py test`` creates
+them) in a temporary directory, filled by ``store.synthetic.generate``.
+"""
+
+import datetime
+import os
+import platform
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urljoin
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+
+from store import loadtest
+from store.synthetic import generate
+
+USERNAME = 'benchmark'
+PASSWORD = 'benchmark'
+
+# Seconds to wait for a server to answer its first request.
+START_TIMEOUT = 60
+
+STYLESHEET = re.compile(r'<link rel="stylesheet" href="(/static/[^"]+)"')
+
+
+class Setup:
+    """
+    How to start one serving stack: ``command`` (``{bind}`` is replaced by
+    the address) with ``env`` added to the environment.
+    """
+
+    def __init__(self, name, command, env, collectstatic=False):
+        self.name = name
+        self.command = command
+        self.env = env
+        self.collectstatic = collectstatic
+
+
+SETUPS = {
+    'runserver': Setup(
+        'runserver',
+        [sys.executable, 'manage.py', 'runserver', '{bind}'],
+        {'INVENTORY_DEBUG': '1'},
+    ),
+    'gunicorn': Setup(
+        'gunicorn',
+        [sys.executable, '-m', 'gunicorn', 'InventoryMS.wsgi:application'],
+        {'INVENTORY_DEBUG': '0'},
+        collectstatic=True,
+    ),
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """
+    A running setup; a context manager that stops the server (and the
+    processes it started) on exit.
+    """
+
+    def __init__(self, setup, env, workdir):
+        self.setup = setup
+        self.env = env
+        self.port = _free_port()
+        self.bind = f'127.0.0.1:{self.port}'
+        self.base_url = f'http://{self.bind}/'
+        self.log_path = os.path.join(workdir, f'{setup.name}.log')
+        self.process = None
+
+    def __enter__(self):
+        env = {**self.env, **self.setup.env, 'GUNICORN_BIND': self.bind}
+        if self.setup.collectstatic:
+            subprocess.run(
+                [sys.executable, 'manage.py', 'collectstatic', '--noinput'],
+                cwd=settings.BASE_DIR, env=env, check=True,
+                stdout=subprocess.DEVNULL,
+            )
+        command = [part.format(bind=self.bind) for part in self.setup.command]
+        with open(self.log_path, 'wb') as log:
+            self.process = subprocess.Popen(
+                command, cwd=settings.BASE_DIR, env=env, stdout=log,
+                stderr=subprocess.STDOUT, start_new_session=True,
+            )
+        try:
+            self.wait_until_ready()
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def wait_until_ready(self):
+        url = urljoin(self.base_url, reverse('user-login'))
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                if requests.get(url, timeout=5).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        with open(self.log_path, errors='replace') as log:
+            output = log.read()[-2000:]
+        raise RuntimeError(f"{self.setup.name} did not start:\n{output}")
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        # The whole session: runserver's autoreloader runs the server in a
+        # child process.
+        os.killpg(self.process.pid, signal.SIGTERM)
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+
+
+def stylesheet_path(base_url):
+    """
+    The stylesheet URL of the dashboard page (hashed without DEBUG).
+    """
+    client = loadtest.HttpTerminalClient(base_url, USERNAME, PASSWORD)
+    try:
+        page = client.session.get(urljoin(base_url, reverse('dashboard'))).text
+    finally:
+        client.close()
+    match = STYLESHEET.search(page)
+    if match is None:
+        raise RuntimeError("No stylesheet on the dashboard page")
+    return match.group(1)
+
+
+def static_throughput(url, readers, seconds):
+    """
+    ``readers`` threads fetching ``url`` for ``seconds``; returns the
+    requests per second and latencies in milliseconds.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def read():
+        mine, failed = [], 0
+        with requests.Session() as session:
+            session.headers['Accept-Encoding'] = 'br, gzip'
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                response = session.get(url)
+                mine.append(1000 * (time.perf_counter() - started))
+                failed += response.status_code != 200
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'per_second': round(len(latencies) / seconds, 1),
+        'p50_ms': round(loadtest.percentile(latencies, 50) or 0, 2),
+        'p95_ms': round(loadtest.percentile(latencies, 95) or 0, 2),
+    }
+
+
+def _pos_results(report):
+    results = {}
+    for action, count, errors, rate, mean, p50, p95, p99 in report.rows():
+        if not count:
+            continue
+        results[action] = {
+            'requests': count,
+            'errors': errors,
+            'per_second': round(rate, 1),
+            'mean_ms': round(mean, 2),
+            'p50_ms': round(p50, 2),
+            'p95_ms': round(p95, 2),
+            'p99_ms': round(p99, 2),
+        }
+    return results
+
+
+def run_setup(setup, env, workdir, terminals, seconds, warmup, static_seconds,
+              seed=0):
+    with Server(setup, env, workdir) as server:
+        report = loadtest.run(
+            lambda: loadtest.HttpTerminalClient(server.base_url, USERNAME, PASSWORD),
+            terminals=terminals, seconds=seconds, warmup=warmup, seed=seed,
+        )
+        static_url = urljoin(server.base_url, stylesheet_path(server.base_url))
+        return {
+            'pos': _pos_results(report),
+            'static': static_throughput(static_url, terminals, static_seconds),
+        }
+
+
+def run(names, scale, seed=0, terminals=8, seconds=20.0, warmup=5.0,
+        static_seconds=5.0, progress=None):
+    """
+    Benchmarks the setups named ``names``; returns the results document.
+    """
+    if connection.vendor != 'sqlite':
+        raise ValueError("The serving benchmark runs on SQLite")
+    progress = progress or (lambda message: None)
+    document = {
+        'meta': {
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'seed': seed,
+            'terminals': terminals,
+            'seconds': seconds,
+        },
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'db.sqlite3')
+        # A file the servers can open, not the usual in-memory database.
+        test_settings = connection.settings_dict['TEST']
+        old_name, test_settings['NAME'] = test_settings.get('NAME'), db_path
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            progress(f"generating {scale}")
+            generate(scale, seed)
+            get_user_model().objects.create_superuser(
+                USERNAME, 'benchmark@example.com', PASSWORD
+            )
+            connections.close_all()
+
+            env = {
+                **os.environ,
+                'INVENTORY_DB_ENGINE': 'sqlite',
+                'INVENTORY_DB_PROFILE': 'production',
+                'INVENTORY_SQLITE_PATH': db_path,
+                'INVENTORY_ALLOWED_HOSTS': '127.0.0.1,localhost',
+                'INVENTORY_STATIC_ROOT': os.path.join(workdir, 'static'),
+                'INVENTORY_EXPORT_ROOT': os.path.join(workdir, 'exports'),
+                'INVENTORY_CACHE_DIR': os.path.join(workdir, 'cache'),
+                'INVENTORY_PROFILE_SAMPLE_RATE': '0',
+                'PROMETHEUS_MULTIPROC_DIR': os.path.join(workdir, 'metrics'),
+            }
+            env.pop('INVENTORY_SQLITE_REPLICA', None)
+            os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])
+
+            for name in names:
+                progress(f"running {name}")
+                document['results'][name] = run_setup(
+                    SETUPS[name], env, workdir, terminals, seconds, warmup,
+                    static_seconds, seed,
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            test_settings['NAME'] = old_name
+    return document
@@ -0,0 +1,62 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from . import runner
+
+
+def result(queries=5, wall_ms=10.0, peak_kb=100.0):
+    return {'wall_ms': wall_ms, 'wall_ms_min': wall_ms, 'queries': queries,
+            'peak_kb': peak_kb}
+
+
+def document(**kwargs):
+    return {'meta': {'revision': 'abc'},
+            'results': {'small': {'sale-create': result(**kwargs)}}}
+
+
+class RegressionsTests(SimpleTestCase):
+
+    def test_more_queries_regress(self):
+        found = runner.regressions(document(queries=6), document())
+        self.assertEqual(found, [('small', 'sale-create', 'queries', 5, 6)])
+
+    def test_growth_under_the_noise_floor_passes(self):
+        self.assertEqual(runner.regressions(document(wall_ms=11.5), document()), [])
+
+    def test_slower_past_the_threshold_regresses(self):
+        found = runner.regressions(document(wall_ms=20.0), document())
+        self.assertEqual(found, [('small', 'sale-create', 'wall_ms', 10.0, 20.0)])
+
+
+class RunBenchmarksCommandTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = os.path.join(directory.name, 'baseline.json')
+        self.enterContext(mock.patch.object(runner, 'run', return_value=document()))
+
+    def call(self, *args):
+        call_command('run_benchmarks', '--baseline', self.baseline, *args,
+                     stdout=io.StringIO())
+
+    def test_missing_baseline_fails(self):
+        with self.assertRaisesMessage(CommandError, '--update-baseline'):
+            self.call()
+        runner.run.assert_not_called()
+
+    def test_update_baseline_writes_it(self):
+        self.call('--update-baseline')
+        with open(self.baseline) as f:
+            self.assertEqual(json.load(f), document())
+        self.call()
+
+    def test_save_baseline_is_an_alias(self):
+        self.call('--save-baseline')
+        self.assertTrue(os.path.exists(self.baseline))
@@ -5,6 +5,8 @@ from .models import Bill
 @admin.register(Bill)
 class BillAdmin(admin.ModelAdmin):
     list_display = ['id', 'slug', 'purchase', 'payment_details', 'status']
+    # Purchase.__str__ đọc item và vendor
+    list_select_related = ['purchase__item', 'purchase__vendor']
 
     def has_add_permission(self, request, obj=None):
         # No one can add via admin; creation only via signals
@@ -1 +1,9 @@
-# Create your tests here.
+from django.urls import reverse
+
+from InventoryMS.testing import QueryBudgetTestCase
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    def test_list(self):
+        self.assertPagesLoad(reverse('bill_list'))
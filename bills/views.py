@@ -1,6 +1,7 @@
 # Django core imports
 from django.urls import reverse
 from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.utils.decorators import method_decorator
 # Class-based views
 from django.views.generic import (
     CreateView,
@@ -20,18 +21,25 @@ from .models import Bill
 from .tables import BillTable
 from accounts.models import Profile
 
-import openpyxl
-from django.http import HttpResponse
+from store.exports import XlsxExport
+from InventoryMS.db import read_from_replica
+from InventoryMS.pagination import KeysetPaginationMixin
+from InventoryMS.querycount import query_budget
 
 from django.contrib.auth.decorators import login_required
 
-class BillListView(LoginRequiredMixin, ExportMixin, SingleTableView):
+@query_budget(10)
+@method_decorator(read_from_replica, name='dispatch')
+class BillListView(LoginRequiredMixin, KeysetPaginationMixin, ExportMixin,
+                   SingleTableView):
     """View for listing bills."""
     model = Bill
+    queryset = Bill.objects.select_related('purchase__vendor')
     table_class = BillTable
     template_name = 'bills/bill_list.html'
     context_object_name = 'bills'
     paginate_by = 10
+    ordering = ['id']
     SingleTableView.table_pagination = False
 
 
@@ -60,90 +68,52 @@ class BillDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
         return reverse('bill_list')
 
 @login_required
+@read_from_replica
 def export_bills(request):
     """
     Export danh sách Hóa đơn nhập hàng (Bill)
     """
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="Bills_Report.xlsx"'
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Bills"
-
-    # 1. Định nghĩa Header
-    columns = [
-        'Bill ID', 
-        'Vendor Name',    # Tên nhà cung cấp
-        'Description',    # Mô tả đơn nhập
-        'Contact Number', # SĐT nhà cung cấp
-        'Email',          # Email nhà cung cấp
-        'Payment Details',# Chi tiết thanh toán
-        'Amount',         # Tổng tiền
-        'Status',         # Trạng thái (Paid/Pending)
-        'Order Date'      # Ngày nhập hàng
+    return BILLS_EXPORT.response()
+
+
+def _format_bill_row(row):
+    (bill_id, purchase_id, description, total_value, order_date,
+     vendor_name, vendor_phone, payment_details, status) = row
+
+    return [
+        bill_id,
+        vendor_name or "N/A",
+        (description or "-") if purchase_id else "-",
+        vendor_phone or "-",
+        # Vendor không lưu email
+        "-",
+        payment_details,
+        total_value if purchase_id else 0,
+        "Paid" if status else "Pending",
+        order_date.strftime('%Y-%m-%d') if order_date else "-"
     ]
-    ws.append(columns)
-
-    # Format Header in đậm
-    header_font = openpyxl.styles.Font(bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-
-    # 2. Query dữ liệu
-    # Dùng select_related để nối: Bill -> Purchase -> Vendor (Tối ưu tốc độ)
-    rows = Bill.objects.all().select_related('purchase', 'purchase__vendor').order_by('-id')
-
-    for bill in rows:
-        # -- Lấy thông tin Purchase & Vendor (An toàn tuyệt đối) --
-        purchase = bill.purchase
-        vendor_name = "N/A"
-        vendor_phone = "-"
-        vendor_email = "-"
-        description = "-"
-        amount = 0
-        order_date = "-"
-
-        if purchase:
-            description = purchase.description if purchase.description else "-"
-            amount = purchase.total_value
-            if purchase.order_date:
-                order_date = purchase.order_date.strftime('%Y-%m-%d')
-            
-            # Lấy thông tin Vendor
-            if purchase.vendor:
-                vendor_name = purchase.vendor.name
-                vendor_phone = purchase.vendor.phone if purchase.vendor.phone else "-"
-                vendor_email = purchase.vendor.email if purchase.vendor.email else "-"
-
-        # -- Xử lý trạng thái --
-        status_text = "Paid" if bill.status else "Pending"
-
-        # -- Ghi dòng dữ liệu --
-        ws.append([
-            bill.id,
-            vendor_name,
-            description,
-            vendor_phone,
-            vendor_email,
-            bill.payment_details,
-            amount,
-            status_text,
-            order_date
-        ])
-
-    # 3. Auto-fit độ rộng cột
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-
-    wb.save(response)
-    return response
\ No newline at end of file
+
+
+BILLS_EXPORT = XlsxExport(
+    filename="Bills_Report.xlsx",
+    title="Bills",
+    columns=[
+        'Bill ID',
+        'Vendor Name',
+        'Description',
+        'Contact Number',
+        'Email',
+        'Payment Details',
+        'Amount',
+        'Status',
+        'Order Date'
+    ],
+    queryset=Bill.objects.order_by('-id'),
+    fields=(
+        'id', 'purchase_id', 'purchase__description',
+        'purchase__total_value', 'purchase__order_date',
+        'purchase__vendor__name', 'purchase__vendor__phone_number',
+        'payment_details', 'status'
+    ),
+    format_row=_format_bill_row,
+)
@@ -0,0 +1,8 @@
+#!/bin/sh
+# One-shot migration step, run once per deployment before bin/start.sh so
+# the web workers never race each other to migrate.
+set -e
+
+cd "$(dirname "$0")/.."
+
+python manage.py migrate --noinput
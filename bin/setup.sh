@@ -10,12 +10,41 @@ if [ $? -ne 0 ]; then
   exit 1
 fi
 
+# Sessions and signed tokens stay valid across restarts only with a fixed key.
+if [ -z "$INVENTORY_SECRET_KEY" ]; then
+  echo "⚠️  INVENTORY_SECRET_KEY is not set; generating one for this container."
+  INVENTORY_SECRET_KEY=$(head -c 48 /dev/urandom | base64 | tr -d '\n')
+fi
+
+echo "🗄️  Running database migrations..."
+docker volume create sales-and-inventory-data > /dev/null
+docker run --rm -v sales-and-inventory-data:/data \
+  -e INVENTORY_SECRET_KEY="$INVENTORY_SECRET_KEY" \
+  sales-and-inventory-management:1.0 sh bin/migrate.sh
+
+if [ $? -ne 0 ]; then
+  echo "❌ Error: Database migrations failed!"
+  exit 1
+fi
+
 echo "🚀 Starting Docker containers in detached mode..."
-docker run -d -p 8000:8000 sales-and-inventory-management:1.0
+docker run -d -p 8000:8000 -v sales-and-inventory-data:/data \
+  -e INVENTORY_SECRET_KEY="$INVENTORY_SECRET_KEY" \
+  sales-and-inventory-management:1.0
 
 if [ $? -ne 0 ]; then
   echo "❌ Error: Docker container failed to start!"
   exit 1
 fi
 
-echo "✔️ Setup completed successfully!"
\ No newline at end of file
+# Spreadsheet exports are built by a worker container on the same volume.
+docker run -d -v sales-and-inventory-data:/data \
+  -e INVENTORY_SECRET_KEY="$INVENTORY_SECRET_KEY" \
+  sales-and-inventory-management:1.0 sh bin/worker.sh
+
+if [ $? -ne 0 ]; then
+  echo "❌ Error: Export worker container failed to start!"
+  exit 1
+fi
+
+echo "✔️ Setup completed successfully!"
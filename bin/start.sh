@@ -0,0 +1,17 @@
+#!/bin/sh
+# Production entry point of the Docker image: gunicorn with the settings
+# of gunicorn.conf.py. Migrations are a separate one-shot step
+# (bin/migrate.sh), run before the web container starts.
+set -e
+
+cd "$(dirname "$0")/.."
+
+# Metrics files of the previous run (InventoryMS.metrics). The export
+# worker container (bin/worker.sh) writes here too, so it is started
+# after this container.
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+  rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+  mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+exec gunicorn InventoryMS.wsgi:application
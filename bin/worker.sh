@@ -0,0 +1,10 @@
+#!/bin/sh
+# Export worker of the Docker image: builds the queued spreadsheet exports
+# (store.export_jobs) in its own container, on the same /data volume as
+# the web container (database, exports, cache and metrics files). Start
+# it after the web container, which empties the metrics directory.
+set -e
+
+cd "$(dirname "$0")/.."
+
+exec python manage.py run_export_worker
@@ -0,0 +1,80 @@
+"""
+Gunicorn settings for the production image (``bin/start.sh``).
+
+Worker processes run requests in parallel; each has a few threads so a
+worker waiting on SQLite's write lock or a slow export does not hold up
+the requests queued behind it. Every setting can be overridden from the
+environment:
+
+- GUNICORN_BIND: address to listen on (default 0.0.0.0:8000).
+- WEB_CONCURRENCY: worker processes (default 2 x CPUs + 1 with a shared
+  cache, else 1).
+- GUNICORN_THREADS: threads per worker (default 4).
+- GUNICORN_MAX_REQUESTS: requests after which a worker is replaced
+  (default 1000, plus up to 10% jitter so workers do not restart
+  together), which bounds slow memory growth.
+- GUNICORN_TIMEOUT: seconds before a stuck worker is killed (default
+  120: the synchronous exports of a large shop take that long).
+
+Several workers need a shared cache, REDIS_URL or INVENTORY_CACHE_DIR
+(set in the Docker image), for the dashboard and catalog invalidation to
+reach all of them (see the CACHES setting); without one a single worker
+is started.
+"""
+
+import os
+import random
+
+
+def cpu_count():
+    # The CPUs this container may use, not the host's.
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers():
+    if os.environ.get('REDIS_URL') or os.environ.get('INVENTORY_CACHE_DIR'):
+        return 2 * cpu_count() + 1
+    return 1
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', default_workers()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Import Django once in the master; workers start by forking it.
+preload_app = True
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Heartbeat files on disk can stall workers in Docker.
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = None
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    # A connection opened while preloading must not be shared by workers.
+    from django.db import connections
+    connections.close_all()
+
+
+def post_fork(server, worker):
+    # Forked workers share the master's random state: reseed, or their
+    # lock-retry backoff and profile sampling would move in step.
+    random.seed()
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -19,6 +19,9 @@ class InvoiceAdmin(admin.ModelAdmin):
         'grand_total'
     )
 
+    # Item.__str__ đọc category
+    list_select_related = ('customer', 'item__category')
+
     # Thêm thanh tìm kiếm để tìm theo tên khách hoặc tên hàng hóa
     search_fields = ('customer__first_name', 'customer__last_name', 'customer__phone', 'item__name')
 
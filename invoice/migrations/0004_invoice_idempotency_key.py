@@ -0,0 +1,20 @@
+# Generated by Django 5.1 on 2026-10-17 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoice", "0003_remove_invoice_delivery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="idempotency_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+    ]
@@ -45,6 +45,15 @@ class Invoice(models.Model):
     grand_total = models.FloatField(
         verbose_name='Grand Total (Ksh)', editable=False
     )
+    idempotency_key = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            # Export tăng dần theo ngày (watermark) và id
+            models.Index(fields=["date", "id"], name="invoice_date_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         """
@@ -1,3 +1,9 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from InventoryMS.testing import QueryBudgetTestCase
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    def test_list(self):
+        self.assertPagesLoad(reverse('invoicelist'))
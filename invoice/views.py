@@ -1,18 +1,15 @@
-# Standard library imports
-import openpyxl
-
 # Django core imports
 from django.urls import reverse
-from django.http import HttpResponse # <--- THÊM MỚI
 from django.contrib.auth.decorators import login_required # <--- THÊM MỚI
 
 # Authentication and permissions
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.contrib import messages
-from django.db import transaction
+from django.db import transaction, IntegrityError
 from django.core.exceptions import ValidationError
 from django.http import HttpResponseRedirect
+from django.utils.decorators import method_decorator
 
 # Class-based views
 from django.views.generic import (
@@ -28,20 +25,32 @@ from .models import Invoice
 from .tables import InvoiceTable
 from .forms import InvoiceForm  
 from store.models import Delivery
+from store.exports import IncrementalXlsxExport
+from InventoryMS.db import read_from_replica
+from InventoryMS.pagination import KeysetPaginationMixin
+from InventoryMS.querycount import query_budget
+from store.idempotency import (
+    IDEMPOTENCY_FIELD, get_idempotency_key, new_idempotency_key
+)
 
 # ----------------------------------------------------------------------------
 # EXISTING CLASS-BASED VIEWS
 # ----------------------------------------------------------------------------
 
-class InvoiceListView(LoginRequiredMixin, ExportMixin, SingleTableView):
+@query_budget(10)
+@method_decorator(read_from_replica, name='dispatch')
+class InvoiceListView(LoginRequiredMixin, KeysetPaginationMixin, ExportMixin,
+                      SingleTableView):
     """
     View for listing invoices with table export functionality.
     """
     model = Invoice
+    queryset = Invoice.objects.select_related('customer', 'item')
     table_class = InvoiceTable
     template_name = 'invoice/invoicelist.html'
     context_object_name = 'invoices'
     paginate_by = 10
+    ordering = ['id']
     table_pagination = False
 
 
@@ -67,7 +76,27 @@ class InvoiceCreateView(LoginRequiredMixin, CreateView):
     def get_success_url(self):
         return reverse('invoicelist')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Giữ nguyên key khi form bị render lại sau lỗi
+        context['idempotency_key'] = (
+            self.request.POST.get(IDEMPOTENCY_FIELD) or new_idempotency_key()
+        )
+        return context
+
     def form_valid(self, form):
+        try:
+            idempotency_key = get_idempotency_key(self.request)
+        except ValueError as e:
+            messages.error(self.request, str(e))
+            return self.render_to_response(self.get_context_data(form=form))
+
+        # Form gửi lại (double click / retry) -> trả về kết quả cũ
+        if idempotency_key and Invoice.objects.filter(
+                idempotency_key=idempotency_key).exists():
+            return HttpResponseRedirect(self.get_success_url())
+        form.instance.idempotency_key = idempotency_key
+
         try:
             # Dùng transaction.atomic để đảm bảo: Nếu lỗi thì không lưu gì cả
             with transaction.atomic():
@@ -86,6 +115,13 @@ class InvoiceCreateView(LoginRequiredMixin, CreateView):
             messages.success(self.request, "Invoice has been created successfully!")
             return super().form_valid(form)
 
+        except IntegrityError:
+            # Một request khác với cùng key đã tạo invoice trước
+            if idempotency_key and Invoice.objects.filter(
+                    idempotency_key=idempotency_key).exists():
+                return HttpResponseRedirect(self.get_success_url())
+            raise
+
         except ValidationError as e:
             # 4. Nếu bắt được lỗi (từ Signal) -> Gửi thông báo Lỗi
             # Lấy nội dung lỗi (bỏ cái dấu ngoặc vuông [] đi cho đẹp)
@@ -133,83 +169,63 @@ class InvoiceDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView)
 # ----------------------------------------------------------------------------
 
 @login_required
+@read_from_replica
 def export_invoices(request):
     """
     Export danh sách Invoice ra Excel với đầy đủ thông tin khách hàng, Shipping, Grand Total
     """
-    # 1. Tạo file Excel trong bộ nhớ
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="Invoices_List.xlsx"'
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Invoices"
-
-    # 2. Định nghĩa Header (Đầy đủ cột)
-    columns = [
-        'ID', 
-        'Date', 
-        'Customer Name', 
-        'Contact Number', 
-        'Item Name', 
-        'Price Per Item', 
-        'Quantity', 
-        'Total', 
-        'Shipping',        # Cột bạn cần
-        'Grand Total'      # Cột bạn cần
+    return INVOICES_EXPORT.response()
+
+
+def _format_invoice_row(row):
+    (invoice_id, date, customer_id, first_name, last_name, phone,
+     item_name, price_per_item, quantity, total, shipping, grand_total) = row
+
+    inv_date = date.strftime('%Y-%m-%d %H:%M') if date else "-"
+
+    if customer_id:
+        cust_name = f"{first_name} {last_name}"
+        cust_phone = phone or "-"
+    else:
+        cust_name = "Guest"
+        cust_phone = "-"
+
+    return [
+        invoice_id,
+        inv_date,
+        cust_name,
+        cust_phone,
+        item_name or "Unknown Item",
+        price_per_item,
+        quantity,
+        total,
+        shipping,
+        grand_total
     ]
-    ws.append(columns)
-
-    # Format Header in đậm
-    header_font = openpyxl.styles.Font(bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-
-    # 3. Query dữ liệu
-    # Dùng select_related để tối ưu hóa truy vấn
-    rows = Invoice.objects.all().select_related('customer', 'item').order_by('-date')
-
-    for invoice in rows:
-        # -- Xử lý ngày tháng --
-        inv_date = invoice.date.strftime('%Y-%m-%d %H:%M') if invoice.date else "-"
-
-        # -- Xử lý Khách hàng (Lấy từ quan hệ Customer) --
-        if invoice.customer:
-            cust_name = f"{invoice.customer.first_name} {invoice.customer.last_name}"
-            cust_phone = invoice.customer.phone if invoice.customer.phone else "-"
-        else:
-            cust_name = "Guest"
-            cust_phone = "-"
-
-        # -- Xử lý Item (Chỉ lấy tên, không lấy thông tin thừa) --
-        item_name = invoice.item.name if invoice.item else "Unknown Item"
-
-        # -- Ghi dòng dữ liệu --
-        ws.append([
-            invoice.id,
-            inv_date,
-            cust_name,
-            cust_phone,
-            item_name,
-            invoice.price_per_item,
-            invoice.quantity,
-            invoice.total,
-            invoice.shipping,    # Đã bổ sung
-            invoice.grand_total  # Đã bổ sung
-        ])
-
-    # 4. Auto-fit độ rộng cột
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-
-    wb.save(response)
-    return response
\ No newline at end of file
+
+
+INVOICES_EXPORT = IncrementalXlsxExport(
+    filename="Invoices_List.xlsx",
+    title="Invoices",
+    columns=[
+        'ID',
+        'Date',
+        'Customer Name',
+        'Contact Number',
+        'Item Name',
+        'Price Per Item',
+        'Quantity',
+        'Total',
+        'Shipping',
+        'Grand Total'
+    ],
+    queryset=Invoice.objects.order_by('-date', '-id'),
+    fields=(
+        'id', 'date', 'customer_id', 'customer__first_name',
+        'customer__last_name', 'customer__phone', 'item__name',
+        'price_per_item', 'quantity', 'total', 'shipping', 'grand_total'
+    ),
+    format_row=_format_invoice_row,
+    watermark='date',
+    newest_first=True,
+)
@@ -0,0 +1,84 @@
+// Background exports: links carrying data-export-job queue a job on the
+// server, poll its status and start the download once the file is ready.
+// Without JavaScript the link's href still downloads the file directly.
+(function () {
+    var POLL_INTERVAL = 2000;
+
+    function csrfToken() {
+        var input = document.querySelector('[name=csrfmiddlewaretoken]');
+        return input ? input.value : '';
+    }
+
+    function showProgress(job) {
+        if (typeof Swal === 'undefined') {
+            return;
+        }
+        var text = job.rows_total
+            ? job.rows_written + ' / ' + job.rows_total + ' rows (' + job.progress + '%)'
+            : 'Waiting for the export worker...';
+        if (Swal.isVisible()) {
+            Swal.update({ text: text });
+        } else {
+            Swal.fire({
+                title: 'Preparing export',
+                text: text,
+                allowOutsideClick: false,
+                showConfirmButton: false
+            });
+        }
+    }
+
+    function showError(message) {
+        if (typeof Swal === 'undefined') {
+            alert(message);
+            return;
+        }
+        Swal.fire({ icon: 'error', title: 'Export failed', text: message });
+    }
+
+    function poll(statusUrl) {
+        fetch(statusUrl, { credentials: 'same-origin' })
+            .then(function (response) { return response.json(); })
+            .then(function (job) {
+                if (job.download_url) {
+                    if (typeof Swal !== 'undefined') {
+                        Swal.close();
+                    }
+                    window.location = job.download_url;
+                } else if (job.status === 'Failed') {
+                    showError(job.error || 'The export could not be created.');
+                } else {
+                    showProgress(job);
+                    setTimeout(function () { poll(statusUrl); }, POLL_INTERVAL);
+                }
+            })
+            .catch(function () { showError('Lost contact with the server.'); });
+    }
+
+    document.addEventListener('click', function (event) {
+        var link = event.target.closest('[data-export-job]');
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        fetch(link.dataset.exportJob, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'X-CSRFToken': csrfToken() }
+        })
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function (job) {
+                showProgress(job);
+                poll(job.status_url);
+            })
+            .catch(function () {
+                // Fall back to the synchronous export.
+                window.location = link.href;
+            });
+    });
+})();
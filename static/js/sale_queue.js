@@ -0,0 +1,111 @@
+// Offline sale queue for the POS page.
+// Finished sales are kept in localStorage and sent to the batch sync
+// endpoint as JSON lines, many sales per request. Every sale carries its
+// idempotency key, so resending a batch never creates duplicates.
+var SaleQueue = (function () {
+    var STORAGE_KEY = 'pos.saleQueue';
+    var BATCH_SIZE = 50;
+    var FLUSH_INTERVAL = 5000;
+    var MAX_BACKOFF = 60000;
+
+    var options = {};
+    var flushing = false;
+    var backoff = FLUSH_INTERVAL;
+    var timer = null;
+
+    function load() {
+        try {
+            return JSON.parse(localStorage.getItem(STORAGE_KEY)) || [];
+        } catch (e) {
+            return [];
+        }
+    }
+
+    function save(queue) {
+        localStorage.setItem(STORAGE_KEY, JSON.stringify(queue));
+        if (options.onChange) {
+            options.onChange(queue.length);
+        }
+    }
+
+    function size() {
+        return load().length;
+    }
+
+    function enqueue(sale) {
+        var queue = load();
+        queue.push(sale);
+        save(queue);
+        schedule(0);
+    }
+
+    function schedule(delay) {
+        clearTimeout(timer);
+        timer = setTimeout(flush, delay);
+    }
+
+    function flush() {
+        var batch = load().slice(0, BATCH_SIZE);
+        if (flushing || batch.length === 0) {
+            schedule(FLUSH_INTERVAL);
+            return;
+        }
+        flushing = true;
+
+        fetch(options.url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {
+                'Content-Type': 'application/x-ndjson',
+                'X-CSRFToken': options.csrfToken
+            },
+            body: batch.map(function (sale) { return JSON.stringify(sale); }).join('\n')
+        })
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function (data) {
+                var done = {};
+                data.results.forEach(function (result) {
+                    var sale = batch[result.line - 1];
+                    if (result.status === 'success') {
+                        done[sale.idempotency_key] = true;
+                    } else if (result.code < 500) {
+                        // Rejected for good (e.g. out of stock): drop it and report.
+                        done[sale.idempotency_key] = true;
+                        if (options.onRejected) {
+                            options.onRejected(sale, result.message);
+                        }
+                    }
+                });
+                save(load().filter(function (sale) { return !done[sale.idempotency_key]; }));
+                backoff = FLUSH_INTERVAL;
+                flushing = false;
+                schedule(size() > 0 ? 0 : FLUSH_INTERVAL);
+            })
+            .catch(function () {
+                flushing = false;
+                backoff = Math.min(backoff * 2, MAX_BACKOFF);
+                schedule(backoff);
+            });
+    }
+
+    function start(settings) {
+        options = settings;
+        if (options.onChange) {
+            options.onChange(size());
+        }
+        window.addEventListener('online', function () { schedule(0); });
+        schedule(0);
+    }
+
+    return {
+        start: start,
+        enqueue: enqueue,
+        size: size,
+        flush: flush
+    };
+})();
@@ -7,10 +7,11 @@ This module defines the following admin classes:
 - CategoryAdmin: Configuration for the Category model in the admin interface.
 - ItemAdmin: Configuration for the Item model in the admin interface.
 - DeliveryAdmin: Configuration for the Delivery model in the admin interface.
+- ExportJobAdmin: Configuration for the ExportJob model in the admin interface.
 """
 
 from django.contrib import admin
-from .models import Category, Item, Delivery
+from .models import Category, Item, Delivery, ExportJob
 
 
 @admin.register(Category)
@@ -31,6 +32,7 @@ class ItemAdmin(admin.ModelAdmin):
     list_display = (
         'name', 'category', 'quantity', 'price', 'vendor'
     )
+    list_select_related = ('category', 'vendor')
     search_fields = ('name', 'category__name', 'vendor__name')
     list_filter = ('category', 'vendor')
     ordering = ('name',)
@@ -42,4 +44,17 @@ class DeliveryAdmin(admin.ModelAdmin):
     list_filter = ['is_delivered']
 
     def has_add_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the ExportJob model.
+    """
+    list_display = (
+        'id', 'export', 'status', 'requested_by',
+        'rows_written', 'rows_total', 'date_created', 'date_finished'
+    )
+    list_filter = ('export', 'status')
+    ordering = ('-date_created',)
@@ -0,0 +1,231 @@
+"""
+Module: store.catalog
+
+In-process item catalog for the POS autocomplete and price lookups.
+
+Each worker keeps a compact copy of the catalog (id, name, price, stock,
+category name) in ``__slots__`` records, plus a prefix index: every
+normalized name/category token is kept in one sorted array next to the
+id of its item, so all items with a token starting with a prefix sit in
+one contiguous slice found with two binary searches (a flattened trie).
+
+The copy is reloaded, in one query, when the version stamp kept in
+Django's cache changes (``invalidate()`` is called from the Item and
+Category signals) or after ``CATALOG_MAX_AGE`` seconds; large catalogs
+are reloaded in the background while the old copy keeps answering.
+Stock levels are only refreshed by those reloads: sales change stock
+with ``QuerySet.update()``, which does not invalidate the catalog, so
+the autocomplete stock is indicative; the item details lookup of the
+sale page reads the live stock and the sale itself re-checks it.
+"""
+
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import connections
+
+from InventoryMS.metrics import cache_lookup
+
+from .models import Item
+
+VERSION_KEY = 'catalog:version'
+
+# Seconds before a copy is reloaded even if nothing invalidated it.
+CATALOG_MAX_AGE = 300
+
+# Rows fetched per round-trip while loading.
+LOAD_CHUNK_SIZE = 5000
+
+# Catalogs slower to load than this (seconds) are reloaded in the
+# background.
+BACKGROUND_RELOAD_AFTER = 0.5
+
+_COMBINING_MARKS = re.compile(r'[\u0300-\u036f]')
+
+
+def normalize(text):
+    """
+    Lowercases ``text`` and strips Vietnamese (and other) diacritics.
+    """
+    text = unicodedata.normalize('NFKD', text.lower().replace('đ', 'd'))
+    return _COMBINING_MARKS.sub('', text)
+
+
+def tokenize(text):
+    return re.findall(r'\w+', normalize(text or ''))
+
+
+class CatalogItem:
+    """
+    One catalog entry.
+    """
+
+    __slots__ = ('id', 'name', 'price', 'stock', 'category', 'position')
+
+    def __init__(self, id, name, price, stock, category, position):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.stock = stock
+        self.category = category
+        self.position = position
+
+    def to_json(self):
+        """
+        Same shape as ``Item.to_json()`` for the sale page, plus stock.
+        """
+        return {
+            'id': self.id,
+            'text': self.name,
+            'name': self.name,
+            'price': self.price,
+            'category': self.category,
+            'stock': self.stock,
+            'quantity': 1,
+            'total_product': 0,
+        }
+
+
+class Catalog:
+    """
+    Immutable snapshot of the item catalog.
+    """
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.load_seconds = 0.0
+        self.items = {}
+        self.records = []
+        pairs = []
+        category_tokens = {}
+        for position, (pk, name, price, stock, category) in enumerate(rows):
+            record = CatalogItem(pk, name, price, stock, category, position)
+            self.items[pk] = record
+            self.records.append(record)
+            if category not in category_tokens:
+                category_tokens[category] = tokenize(category)
+            for token in set(tokenize(name)).union(category_tokens[category]):
+                pairs.append((token, pk))
+        pairs.sort()
+        self.tokens = [token for token, _ in pairs]
+        self.token_ids = array('q', (pk for _, pk in pairs))
+
+    def get(self, item_id):
+        return self.items.get(item_id)
+
+    def _prefix_ids(self, prefix):
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + '\U0010ffff', start)
+        return self.token_ids[start:end]
+
+    def search(self, query, limit=10):
+        """
+        Returns up to ``limit`` items that have a token starting with each
+        word of ``query``, in name order. An empty query returns the first
+        items by name.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return self.records[:limit]
+
+        # Walk the narrowest prefix range; check the other terms per item.
+        ranges = sorted(
+            (self._prefix_ids(term) for term in set(terms)), key=len
+        )
+        matches = set(ranges[0])
+        for ids in ranges[1:]:
+            if not matches:
+                break
+            matches.intersection_update(ids)
+        return heapq.nsmallest(
+            limit,
+            (self.items[pk] for pk in matches),
+            key=lambda record: record.position,
+        )
+
+
+_catalog = None
+_reloading = False
+_lock = threading.Lock()
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, timeout=None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def invalidate():
+    """
+    Makes every worker reload its catalog on its next lookup.
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def load(version=None):
+    started = time.monotonic()
+    rows = Item.objects.order_by('name', 'id').values_list(
+        'id', 'name', 'price', 'quantity', 'category__name'
+    ).iterator(chunk_size=LOAD_CHUNK_SIZE)
+    catalog = Catalog(rows, version)
+    catalog.load_seconds = time.monotonic() - started
+    return catalog
+
+
+def _reload_in_background(version):
+    global _catalog, _reloading
+    try:
+        _catalog = load(version)
+    finally:
+        _reloading = False
+        # This thread's own database connections.
+        connections.close_all()
+
+
+def _is_fresh(catalog, version):
+    return (
+        catalog is not None and catalog.version == version
+        and time.monotonic() - catalog.loaded_at < CATALOG_MAX_AGE
+    )
+
+
+def get_catalog():
+    """
+    Returns this worker's catalog, reloading it first if it is stale.
+
+    A catalog that took more than BACKGROUND_RELOAD_AFTER seconds to load
+    is reloaded in a background thread while the stale copy keeps
+    answering, so a single item edit does not stall every autocomplete.
+    """
+    global _catalog, _reloading
+    version = _current_version()
+    catalog = _catalog
+    fresh = _is_fresh(catalog, version)
+    cache_lookup('catalog', fresh)
+    if fresh:
+        return catalog
+    with _lock:
+        catalog = _catalog
+        if _is_fresh(catalog, version):
+            return catalog
+        if catalog is None or catalog.load_seconds < BACKGROUND_RELOAD_AFTER:
+            catalog = _catalog = load(version)
+        elif not _reloading:
+            _reloading = True
+            threading.Thread(
+                target=_reload_in_background, args=(version,), daemon=True
+            ).start()
+    return catalog
@@ -0,0 +1,165 @@
+"""
+Module: store.dashboard
+
+Dashboard metrics provider.
+
+The tiles (stock on hand, staff, vendors, deliveries and sales counts)
+and the category chart are computed in three queries and the sales chart
+in one, and both are kept in Django's cache. Cache keys carry a version
+number that ``invalidate()`` bumps from the post_save/post_delete
+signals of the models the dashboard shows (see store.signals), so a
+change is visible on the next page load; ``DASHBOARD_CACHE_TIMEOUT``
+bounds staleness if a signal is missed (e.g. ``QuerySet.update()``).
+
+Hits and misses are counted in the cache too; ``cache_stats()`` returns
+them with the hit rate.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import connections, router
+from django.db.models import Count, Sum
+
+from InventoryMS.metrics import cache_lookup
+
+from accounts.models import Profile, Vendor
+from transactions.models import Sale
+from transactions.rollups import series as sales_series
+from .models import Category, Delivery, Item
+
+DASHBOARD_CACHE_TIMEOUT = 300
+
+VERSION_KEY = 'dashboard:version'
+HITS_KEY = 'dashboard:hits'
+MISSES_KEY = 'dashboard:misses'
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock so a version lost from the cache never
+        # matches entries written before it was lost.
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, timeout=None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def invalidate():
+    """
+    Makes every cached dashboard entry stale.
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def _cached(name, compute):
+    key = f'dashboard:{_version()}:{name}'
+    value = cache.get(key)
+    cache_lookup('dashboard', value is not None)
+    if value is not None:
+        _count(HITS_KEY)
+        return value
+    _count(MISSES_KEY)
+    value = compute()
+    cache.set(key, value, DASHBOARD_CACHE_TIMEOUT)
+    return value
+
+
+# Models counted on the tiles, in _table_counts().
+COUNTED_MODELS = (Profile, Vendor, Delivery, Sale)
+
+
+def table_counts_sql(connection, models=COUNTED_MODELS):
+    subqueries = ", ".join(
+        f"(SELECT COUNT(*) FROM {connection.ops.quote_name(model._meta.db_table)})"
+        for model in models
+    )
+    return f"SELECT {subqueries}"
+
+
+def _table_counts(*models):
+    """
+    Returns the row count of each model, in one query.
+    """
+    alias = router.db_for_read(models[0])
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        cursor.execute(table_counts_sql(connection, models))
+        return cursor.fetchone()
+
+
+def category_counts_queryset():
+    return (
+        Category.objects.annotate(item_count=Count('item'))
+        .order_by('name').values_list('name', 'item_count')
+    )
+
+
+def _compute_tiles():
+    stock = Item.objects.aggregate(
+        items_count=Count('id'), total_items=Sum('quantity')
+    )
+    profiles_count, vendors_count, deliveries_count, sales_count = (
+        _table_counts(*COUNTED_MODELS)
+    )
+    category_counts = list(category_counts_queryset())
+    return {
+        'items_count': stock['items_count'],
+        'total_items': stock['total_items'] or 0,
+        'profiles_count': profiles_count,
+        'vendors_count': vendors_count,
+        'deliveries_count': deliveries_count,
+        'sales_count': sales_count,
+        'categories': [name for name, _ in category_counts],
+        'category_counts': [count for _, count in category_counts],
+    }
+
+
+def tiles():
+    """
+    Returns the dashboard counters and category chart data.
+    """
+    return _cached('tiles', _compute_tiles)
+
+
+def sales_chart(period='day', start=None, end=None):
+    """
+    Returns ``(labels, values)`` for the sales chart.
+    """
+    def compute():
+        rows = sales_series(period, start, end)
+        return (
+            [day.strftime('%Y-%m-%d') for day, _, _, _ in rows],
+            [float(revenue) for _, revenue, _, _ in rows],
+        )
+    return _cached(f'sales:{period}:{start}:{end}', compute)
+
+
+def cache_stats():
+    """
+    Returns the dashboard cache hits, misses and hit rate (0-1).
+    """
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def reset_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
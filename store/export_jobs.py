@@ -0,0 +1,117 @@
+"""
+Module: store.export_jobs
+
+Background export jobs.
+
+Views enqueue an ``ExportJob`` row; the ``run_export_worker`` management
+command claims queued jobs from the database, writes the workbook under
+``EXPORT_ROOT`` and records progress on the job as it goes, so
+big exports never run inside a web worker. Export rows are read from the
+replica database when one is configured.
+"""
+
+import logging
+import os
+import socket
+import tempfile
+import time
+from datetime import timedelta
+
+from django.core.files import File
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from InventoryMS.db import replica_reads
+from InventoryMS.metrics import EXPORT_JOB_SECONDS
+
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+# Export definitions the worker can run, keyed by ExportJob.export.
+EXPORTS = {
+    'sales': 'store.views.SALES_EXPORT',
+    'invoices': 'invoice.views.INVOICES_EXPORT',
+    'purchases': 'transactions.views.PURCHASES_EXPORT',
+}
+
+# Rows written between two progress updates.
+PROGRESS_EVERY = 5000
+
+
+def get_export(name):
+    """
+    Returns the XlsxExport registered under ``name``.
+    """
+    return import_string(EXPORTS[name])
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job(worker):
+    """
+    Claims the oldest queued job for ``worker``.
+
+    The claim is a conditional UPDATE on the status column, so two
+    workers polling the same table never run the same job.
+    Returns the claimed job or None.
+    """
+    queued = ExportJob.objects.filter(status='Q').order_by('date_created', 'id')
+    for job_id in queued.values_list('id', flat=True)[:5]:
+        claimed = ExportJob.objects.filter(pk=job_id, status='Q').update(
+            status='R', worker=worker, date_started=timezone.now()
+        )
+        if claimed:
+            return ExportJob.objects.get(pk=job_id)
+    return None
+
+
+def requeue_stale_jobs(max_age):
+    """
+    Puts running jobs that started more than ``max_age`` seconds ago
+    back in the queue (their worker has most likely died).
+    """
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    return ExportJob.objects.filter(
+        status='R', date_started__lt=cutoff
+    ).update(status='Q', worker='', rows_written=0)
+
+
+def _track_progress(job, rows):
+    written = 0
+    for row in rows:
+        yield row
+        written += 1
+        if written % PROGRESS_EVERY == 0:
+            ExportJob.objects.filter(pk=job.pk).update(rows_written=written)
+    job.rows_written = written
+
+
+def run_job(job):
+    """
+    Builds the workbook for ``job`` and attaches it to the job.
+    """
+    started = time.monotonic()
+    export = get_export(job.export)
+    try:
+        with replica_reads():
+            job.rows_total = export.queryset.count()
+        ExportJob.objects.filter(pk=job.pk).update(rows_total=job.rows_total)
+        with tempfile.TemporaryFile() as tmp, replica_reads():
+            export.write(tmp, rows=_track_progress(job, export.rows()))
+            tmp.seek(0)
+            job.file.save(f"{job.pk}-{export.filename}", File(tmp), save=False)
+    except Exception as e:
+        logger.exception(f"Export job {job.pk} failed")
+        job.status = 'F'
+        job.error = str(e)
+    else:
+        job.status = 'D'
+    job.date_finished = timezone.now()
+    job.save()
+    EXPORT_JOB_SECONDS.labels(job.export, job.get_status_display().lower()).observe(
+        time.monotonic() - started
+    )
+    return job
@@ -0,0 +1,404 @@
+"""
+Module: store.exports
+
+Shared spreadsheet export engine used by every ``export_*`` view.
+
+Rows are pulled from the database with ``values_list()`` and
+``iterator(chunk_size=...)`` and written to a write-only openpyxl
+worksheet, so no model instances or cell objects are kept around.
+Column widths are worked out from a bounded sample of the first rows
+(write-only sheets need them before the first row is written) and the
+finished file is streamed back to the client from a temporary file.
+
+``IncrementalXlsxExport`` additionally keeps the last generated file
+under ``EXPORT_ROOT/cache/`` together with the rows it was built
+from and the high-water mark (max id / max watermark) they cover, so a
+repeat download either reuses the file or only reads the new rows.
+Edits and deletions of the rows an export reads, including the joined
+customer and item rows, call ``invalidate()`` (see ``store.signals``).
+"""
+
+import glob
+import json
+import os
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import chain, islice
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Count, F, Max
+from django.http import FileResponse
+from django.utils import timezone
+
+from InventoryMS.metrics import cache_lookup
+
+from .models import ExportCache
+
+XLSX_CONTENT_TYPE = (
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+)
+
+# Rows fetched from the database per round-trip.
+CHUNK_SIZE = 2000
+
+# Rows inspected to work out column widths.
+WIDTH_SAMPLE_SIZE = 500
+MAX_COLUMN_WIDTH = 60
+
+
+def column_widths(columns, sample):
+    """
+    Returns a width for each column based on the header and sample rows.
+    """
+    widths = [len(str(column)) for column in columns]
+    for row in sample:
+        for index, value in enumerate(row):
+            if value is not None and len(str(value)) > widths[index]:
+                widths[index] = len(str(value))
+    return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+
+
+def write_xlsx(fileobj, title, columns, rows):
+    """
+    Writes ``rows`` below a bold ``columns`` header into ``fileobj``
+    using a write-only workbook.
+    """
+    rows = iter(rows)
+    sample = list(islice(rows, WIDTH_SAMPLE_SIZE))
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=title)
+
+    for index, width in enumerate(column_widths(columns, sample), start=1):
+        letter = openpyxl.utils.get_column_letter(index)
+        ws.column_dimensions[letter].width = width
+
+    header_font = Font(bold=True)
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(ws, value=column)
+        cell.font = header_font
+        header.append(cell)
+    ws.append(header)
+
+    for row in chain(sample, rows):
+        ws.append(row)
+
+    wb.save(fileobj)
+
+
+class XlsxExport:
+    """
+    Describes one spreadsheet export.
+
+    Attributes:
+    - filename: Name of the downloaded file.
+    - title: Title of the worksheet.
+    - columns: Header labels.
+    - queryset: Ordered queryset the rows are read from.
+    - fields: Fields passed to ``values_list()``.
+    - format_row: Turns a ``values_list()`` tuple into a sheet row.
+    """
+
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, filename, title, columns, queryset, fields,
+                 format_row=None):
+        self.filename = filename
+        self.title = title
+        self.columns = columns
+        self.queryset = queryset
+        self.fields = fields
+        self.format_row = format_row or list
+
+    def rows(self, queryset=None):
+        """
+        Yields formatted rows, fetching them from the database in chunks.
+        """
+        if queryset is None:
+            queryset = self.queryset
+        values = queryset.values_list(*self.fields).iterator(
+            chunk_size=self.chunk_size
+        )
+        for value in values:
+            yield self.format_row(value)
+
+    def write(self, fileobj, rows=None):
+        """
+        Writes the workbook to ``fileobj``.
+        """
+        if rows is None:
+            rows = self.rows()
+        write_xlsx(fileobj, self.title, self.columns, rows)
+
+    def response(self):
+        """
+        Builds the workbook in a temporary file and streams it back.
+        """
+        tmp = tempfile.TemporaryFile()
+        self.write(tmp)
+        tmp.seek(0)
+        return FileResponse(
+            tmp,
+            as_attachment=True,
+            filename=self.filename,
+            content_type=XLSX_CONTENT_TYPE,
+        )
+
+
+def _encode_value(value):
+    if isinstance(value, Decimal):
+        return {'$dec': str(value)}
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'$date': value.isoformat()}
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _decode_value(obj):
+    if '$dec' in obj:
+        return Decimal(obj['$dec'])
+    if '$dt' in obj:
+        return datetime.fromisoformat(obj['$dt'])
+    if '$date' in obj:
+        return date.fromisoformat(obj['$date'])
+    return obj
+
+
+def dump_rows(rows, fileobj):
+    """
+    Writes rows to ``fileobj`` as JSON lines and returns how many were
+    written. Decimals and dates keep their type when read back.
+    """
+    count = 0
+    for row in rows:
+        fileobj.write(json.dumps(list(row), default=_encode_value))
+        fileobj.write('\n')
+        count += 1
+    return count
+
+
+def load_rows(fileobj):
+    """
+    Yields rows written by ``dump_rows``.
+    """
+    for line in fileobj:
+        yield json.loads(line, object_hook=_decode_value)
+
+
+def invalidate():
+    """
+    Makes the next download of every incremental export rebuild it.
+    """
+    ExportCache.objects.update(version=F('version') + 1)
+
+
+class IncrementalXlsxExport(XlsxExport):
+    """
+    XlsxExport that reuses its previous output.
+
+    The rows of the last build are kept as JSON lines next to the
+    workbook. On the next request a single aggregate query tells whether
+    the table changed:
+    - nothing changed: the cached workbook is served as is;
+    - only rows with a higher primary key were added: just those rows
+      are read from the database, merged into the cached rows and the
+      workbook is rebuilt from disk;
+    - anything else (deleted rows, old rows whose watermark moved, an
+      ``invalidate()`` since the build, or a cache older than
+      ``rebuild_after``): full rebuild.
+
+    Attributes (in addition to XlsxExport):
+    - watermark: Date field that moves forward when a row is added
+      (or edited, for ``auto_now`` fields).
+    - newest_first: True when the export lists new rows first.
+    """
+
+    rebuild_after = timedelta(days=1)
+
+    def __init__(self, *args, watermark, newest_first=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.watermark = watermark
+        self.newest_first = newest_first
+
+    @property
+    def cache_name(self):
+        return os.path.splitext(self.filename)[0]
+
+    def _path(self, token, extension):
+        return os.path.join(
+            settings.EXPORT_ROOT, 'cache',
+            f"{self.cache_name}-{token}.{extension}"
+        )
+
+    def table_state(self):
+        """
+        Returns the row count and high-water mark of the queryset.
+        """
+        return self.queryset.aggregate(
+            row_count=Count('pk'),
+            max_key=Max('pk'),
+            max_watermark=Max(self.watermark),
+        )
+
+    def _is_fresh(self, cache):
+        """
+        Whether no row was edited since ``cache`` was built and it is not
+        older than ``rebuild_after``.
+        """
+        return (
+            cache.version == cache.built_version
+            and timezone.now() - cache.date_built <= self.rebuild_after
+        )
+
+    def _is_current(self, cache, state):
+        return (
+            self._is_fresh(cache)
+            and cache.row_count == state['row_count']
+            and cache.max_key == state['max_key']
+            and cache.max_watermark == state['max_watermark']
+        )
+
+    def _can_append(self, cache, state):
+        if cache.max_key is None or state['row_count'] < cache.row_count:
+            return False
+        if not self._is_fresh(cache):
+            return False
+        if cache.max_watermark is None:
+            return True
+        # Rows we already have must not have been edited since.
+        return not self.queryset.filter(**{
+            'pk__lte': cache.max_key,
+            f'{self.watermark}__gt': cache.max_watermark,
+        }).exists()
+
+    def _build(self, token, rows):
+        """
+        Writes ``rows`` to the cached rows file for ``token`` and builds
+        the workbook from them.
+        """
+        rows_path = self._path(token, 'jsonl')
+        with open(rows_path, 'w', encoding='utf-8') as rows_file:
+            count = dump_rows(rows, rows_file)
+        with open(rows_path, encoding='utf-8') as rows_file, \
+                open(self._path(token, 'xlsx'), 'wb') as xlsx_file:
+            self.write(xlsx_file, rows=load_rows(rows_file))
+        return count
+
+    def _append(self, cache, state, token):
+        """
+        Builds a new cached copy from the previous one plus the rows added
+        since. Returns False when the new rows do not add up to the
+        current row count (rows were deleted), leaving nothing behind.
+        """
+        new_rows = self.rows(self.queryset.filter(
+            pk__gt=cache.max_key, pk__lte=state['max_key']
+        ))
+        with tempfile.TemporaryFile('w+', encoding='utf-8') as new_file:
+            added = dump_rows(new_rows, new_file)
+            if cache.row_count + added != state['row_count']:
+                return False
+            new_file.seek(0)
+            with open(self._path(cache.token, 'jsonl'),
+                      encoding='utf-8') as old_file:
+                old_rows = load_rows(old_file)
+                added_rows = load_rows(new_file)
+                if self.newest_first:
+                    merged = chain(added_rows, old_rows)
+                else:
+                    merged = chain(old_rows, added_rows)
+                self._build(token, merged)
+        return True
+
+    def _store(self, cache, state, token, date_built):
+        """
+        Points the cache record at ``token``. Returns False if another
+        request replaced the record first.
+        """
+        fields = {
+            'token': token,
+            'row_count': state['row_count'],
+            'max_key': state['max_key'],
+            'max_watermark': state['max_watermark'],
+            # An invalidate() during the build leaves the copy stale.
+            'built_version': cache.version if cache is not None else 0,
+            'date_built': date_built,
+        }
+        if cache is None:
+            try:
+                ExportCache.objects.create(name=self.cache_name, **fields)
+            except IntegrityError:
+                return False
+            return True
+        return bool(ExportCache.objects.filter(
+            pk=cache.pk, token=cache.token
+        ).update(date_updated=timezone.now(), **fields))
+
+    def _remove_stale_files(self, token):
+        pattern = self._path('*', '*')
+        for path in glob.glob(pattern):
+            if f"-{token}." not in os.path.basename(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Still being streamed to someone (Windows).
+                    pass
+
+    def cached_file(self):
+        """
+        Returns the path of an up-to-date workbook, building or extending
+        the cached copy first when needed.
+        """
+        os.makedirs(os.path.dirname(self._path('x', 'xlsx')), exist_ok=True)
+        cache = ExportCache.objects.filter(name=self.cache_name).first()
+        if cache is not None and not os.path.exists(
+                self._path(cache.token, 'jsonl')):
+            cache.max_key = None
+        state = self.table_state()
+
+        current = (
+            cache is not None and cache.max_key is not None
+            and self._is_current(cache, state)
+        )
+        cache_lookup('export', current)
+        if current:
+            return self._path(cache.token, 'xlsx')
+
+        token = uuid.uuid4().hex
+        date_built = cache.date_built if cache is not None else None
+        appended = (
+            cache is not None
+            and self._can_append(cache, state)
+            and self._append(cache, state, token)
+        )
+        if not appended:
+            # Rows added after the state query are left for the next
+            # request, so the cache never covers more than its mark.
+            date_built = timezone.now()
+            queryset = self.queryset
+            if state['max_key'] is not None:
+                queryset = queryset.filter(pk__lte=state['max_key'])
+            self._build(token, self.rows(queryset))
+
+        if self._store(cache, state, token, date_built):
+            self._remove_stale_files(token)
+        return self._path(token, 'xlsx')
+
+    def response(self):
+        """
+        Streams the cached workbook, refreshing it first if needed.
+        """
+        return FileResponse(
+            open(self.cached_file(), 'rb'),
+            as_attachment=True,
+            filename=self.filename,
+            content_type=XLSX_CONTENT_TYPE,
+        )
@@ -0,0 +1,51 @@
+"""
+Module: store.idempotency
+
+Helpers for client-generated idempotency keys.
+
+POS terminals send a key with every sale/invoice submission and reuse it
+when they retry. The key is stored on the created row under a unique
+index, so a retry finds the original row and gets the original response
+back instead of creating a duplicate.
+"""
+
+import re
+import uuid
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_FIELD = 'idempotency_key'
+
+_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def get_idempotency_key(request, data=None):
+    """
+    Returns the idempotency key sent with ``request`` (header first, then
+    the ``idempotency_key`` field of ``data`` or of the form data), or
+    None when the client did not send one.
+
+    Raises ValueError for a malformed key.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key and data is not None:
+        key = data.get(IDEMPOTENCY_FIELD)
+    if not key and request.content_type != 'application/json':
+        key = request.POST.get(IDEMPOTENCY_FIELD)
+    return clean_idempotency_key(key)
+
+
+def clean_idempotency_key(key):
+    """
+    Returns ``key`` stripped, None when it is empty, and raises ValueError
+    when it is malformed.
+    """
+    if not key:
+        return None
+    key = str(key).strip()
+    if not _KEY_PATTERN.match(key):
+        raise ValueError("Invalid idempotency key")
+    return key
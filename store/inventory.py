@@ -0,0 +1,131 @@
+"""
+Module: store.inventory
+
+Stock mutation service. Every change to ``Item.quantity`` goes through
+here.
+
+A batch of changes is applied with one set-based UPDATE per chunk of
+items: increases are a plain ``quantity = quantity + CASE ... END`` and
+decreases carry the stock check in the WHERE clause
+(``quantity >= CASE ... END``), so the check and the write happen in the
+same statement and no concurrent writer can slip in between them, even
+on SQLite where ``select_for_update`` is a no-op.
+"""
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Item
+
+# Items per UPDATE statement; keeps the CASE expression and the number of
+# query parameters well inside SQLite's limits.
+BATCH_SIZE = 300
+
+
+class InsufficientStock(ValidationError):
+    """
+    Raised when a batch of stock changes cannot be applied.
+
+    Attributes:
+    - failures: One dict per failed line with ``item_id``, ``name``,
+      ``requested`` and ``available`` (``name`` and ``available`` are
+      None when the item does not exist).
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        names = ", ".join(
+            f["name"] or f"#{f['item_id']}" for f in failures
+        )
+        super().__init__(f"Not enough stock for item: {names}")
+
+
+def _collect(changes):
+    totals = defaultdict(int)
+    for item_id, delta in changes:
+        totals[int(item_id)] += delta
+    return totals
+
+
+def _chunks(totals):
+    pairs = list(totals.items())
+    for start in range(0, len(pairs), BATCH_SIZE):
+        yield dict(pairs[start:start + BATCH_SIZE])
+
+
+def _amounts(chunk):
+    return Case(
+        *[When(pk=pk, then=Value(amount)) for pk, amount in chunk.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _failures(decreases):
+    found = {
+        pk: (name, quantity)
+        for pk, name, quantity in Item.objects.filter(
+            pk__in=decreases
+        ).values_list("pk", "name", "quantity")
+    }
+    failures = []
+    for pk, amount in decreases.items():
+        name, available = found.get(pk, (None, None))
+        if available is None or available < amount:
+            failures.append({
+                "item_id": pk,
+                "name": name,
+                "requested": amount,
+                "available": available,
+            })
+    return failures
+
+
+def apply_stock_changes(changes):
+    """
+    Applies ``(item_id, delta)`` changes to item stock, all or nothing.
+
+    Deltas for the same item are summed first. Raises InsufficientStock,
+    with nothing applied, if any item would go below zero or does not
+    exist.
+    """
+    totals = _collect(changes)
+    decreases = {pk: -delta for pk, delta in totals.items() if delta < 0}
+    increases = {pk: delta for pk, delta in totals.items() if delta > 0}
+
+    try:
+        with transaction.atomic():
+            for chunk in _chunks(decreases):
+                amounts = _amounts(chunk)
+                updated = Item.objects.filter(
+                    pk__in=chunk, quantity__gte=amounts
+                ).update(
+                    quantity=F("quantity") - amounts,
+                    version=F("version") + 1,
+                )
+                if updated != len(chunk):
+                    raise InsufficientStock([])
+            for chunk in _chunks(increases):
+                Item.objects.filter(pk__in=chunk).update(
+                    quantity=F("quantity") + _amounts(chunk),
+                    version=F("version") + 1,
+                )
+    except InsufficientStock:
+        # Rolled back; look up which lines were short.
+        raise InsufficientStock(_failures(decreases))
+
+
+def remove_stock(lines):
+    """
+    Takes ``(item_id, quantity)`` lines out of stock.
+    """
+    apply_stock_changes((item_id, -quantity) for item_id, quantity in lines)
+
+
+def add_stock(lines):
+    """
+    Puts ``(item_id, quantity)`` lines into stock.
+    """
+    apply_stock_changes(lines)
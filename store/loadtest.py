@@ -0,0 +1,364 @@
+"""
+Module: store.loadtest
+
+Load harness for the POS workload (``manage.py load_test``).
+
+Each simulated terminal is a thread ringing up sales like a cashier:
+look up the customer (``get_customers``), look up each item of the basket
+(``get_items``), then submit the sale (``sale-create``, with an
+idempotency key as the sale page sends it). Now and then a manager opens
+the dashboard. Items are picked with the Zipf popularity of
+``store.synthetic``, so the load hits the same hot rows as the shop.
+
+Terminals talk to the application in-process through Django's test
+client, or to a running server over HTTP (``HttpTerminalClient``), and
+record the latency of every request. ``Report`` turns the records into
+throughput and p50/p95/p99 latencies per action.
+"""
+
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Max
+from django.test import Client
+from django.urls import reverse
+
+from accounts.models import Customer
+from .models import Item
+from .synthetic import (
+    LINE_COUNTS, LINE_WEIGHTS, TAX_PERCENTAGE, UNIT_COUNTS, UNIT_WEIGHTS,
+    Popularity, money,
+)
+
+ACTIONS = ('customer lookup', 'item lookup', 'sale', 'dashboard')
+
+# Share of sessions to a known customer, and of sessions after which the
+# terminal's manager opens the dashboard.
+CUSTOMER_LOOKUP_RATIO = 0.6
+DASHBOARD_RATIO = 0.05
+
+# Items sold and customers looked up by the terminals. Items need enough
+# stock for a long run.
+ITEM_SAMPLE = 2000
+CUSTOMER_SAMPLE = 1000
+MIN_STOCK = 100
+
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def percentile(ordered, p):
+    """
+    Nearest-rank percentile of an ordered list.
+    """
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def allowed_host():
+    """
+    A host name ALLOWED_HOSTS accepts (localhost when it is empty or a
+    wildcard, as with DEBUG).
+    """
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+class Workload:
+    """
+    The items and customers the terminals use, read once from the
+    database.
+    """
+
+    def __init__(self, seed=0):
+        rng = random.Random(seed)
+        self.items = {
+            pk: (name, price) for pk, name, price in
+            Item.objects.filter(quantity__gte=MIN_STOCK)
+            .order_by('pk').values_list('pk', 'name', 'price')[:ITEM_SAMPLE]
+        }
+        if not self.items:
+            raise ValueError(
+                f"No item has {MIN_STOCK} units in stock; "
+                "run generate_synthetic_data first"
+            )
+        self.popular_items = Popularity(rng, self.items)
+
+        # A window of customers from a random point of the table.
+        last = Customer.objects.aggregate(last=Max('pk'))['last'] or 0
+        self.customers = list(
+            Customer.objects.filter(pk__gte=rng.randrange(last + 1) - CUSTOMER_SAMPLE)
+            .order_by('pk').values_list('pk', 'first_name', 'last_name', 'phone')
+            [:CUSTOMER_SAMPLE]
+        )
+
+    def customer_term(self, rng):
+        """
+        ``(customer id, what the cashier types)``: the phone number, or
+        the start of the name.
+        """
+        pk, first_name, last_name, phone = rng.choice(self.customers)
+        if phone and rng.random() < 0.5:
+            return pk, phone
+        name = f'{first_name} {last_name or ""}'
+        return pk, name[:rng.randrange(3, 8)]
+
+    def basket(self, rng):
+        """
+        ``[(item id, name, price, quantity)]`` of one sale.
+        """
+        count = rng.choices(LINE_COUNTS, weights=LINE_WEIGHTS)[0]
+        lines = {}
+        for pk in self.popular_items.draw(rng, count):
+            lines[pk] = lines.get(pk, 0) + rng.choices(UNIT_COUNTS, weights=UNIT_WEIGHTS)[0]
+        return [(pk, *self.items[pk], quantity) for pk, quantity in lines.items()]
+
+
+def sale_payload(basket, customer_id):
+    """
+    The JSON the sale page posts for ``basket``.
+    """
+    items = []
+    sub_total = Decimal('0.00')
+    for pk, name, price, quantity in basket:
+        price = money(price)
+        total = price * quantity
+        sub_total += total
+        items.append({
+            'id': pk, 'price': str(price), 'quantity': quantity,
+            'total_item': str(total),
+        })
+    tax_amount = money(sub_total * Decimal(TAX_PERCENTAGE) / 100)
+    grand_total = sub_total + tax_amount
+    amount_paid = Decimal(math.ceil(grand_total / 10) * 10)
+    return {
+        'customer': customer_id or '',
+        'sub_total': str(sub_total),
+        'tax_amount': str(tax_amount),
+        'tax_percentage': TAX_PERCENTAGE,
+        'grand_total': str(grand_total),
+        'amount_paid': str(amount_paid),
+        'amount_change': str(amount_paid - grand_total),
+        'items': items,
+        'idempotency_key': uuid.uuid4().hex,
+    }
+
+
+class TestTerminalClient:
+    """
+    Runs requests in-process through Django's test client, logged in as
+    ``user``.
+    """
+
+    def __init__(self, user, host=None):
+        # Errors are recorded as 500s instead of stopping the terminal.
+        self.client = Client(
+            SERVER_NAME=host or allowed_host(), raise_request_exception=False
+        )
+        self.client.force_login(user)
+
+    def get(self, path, params=None, headers=None):
+        return self.client.get(path, params or {}, headers=headers).status_code
+
+    def post(self, path, data=None, json=None, headers=None):
+        if json is not None:
+            return self.client.post(
+                path, json, content_type='application/json', headers=headers
+            ).status_code
+        return self.client.post(path, data or {}, headers=headers).status_code
+
+    def close(self):
+        # Connections opened by this thread.
+        connections.close_all()
+
+
+class HttpTerminalClient:
+    """
+    Runs requests against a server at ``base_url``, logged in through the
+    login page.
+    """
+
+    def __init__(self, base_url, username, password):
+        import requests
+
+        self.base_url = base_url
+        self.session = requests.Session()
+        login_url = urljoin(base_url, reverse('user-login'))
+        self.session.get(login_url).raise_for_status()
+        response = self.session.post(
+            login_url,
+            {
+                'username': username,
+                'password': password,
+                'csrfmiddlewaretoken': self.session.cookies.get('csrftoken', ''),
+            },
+            headers={'Referer': login_url},
+            allow_redirects=False,
+        )
+        if response.status_code != 302:
+            raise ValueError(f"Could not log in to {login_url} as {username}")
+
+    def _headers(self, headers):
+        return {
+            'X-CSRFToken': self.session.cookies.get('csrftoken', ''),
+            'Referer': self.base_url,
+            **(headers or {}),
+        }
+
+    def get(self, path, params=None, headers=None):
+        return self.session.get(
+            urljoin(self.base_url, path), params=params, headers=headers
+        ).status_code
+
+    def post(self, path, data=None, json=None, headers=None):
+        return self.session.post(
+            urljoin(self.base_url, path), data=data, json=json,
+            headers=self._headers(headers),
+        ).status_code
+
+    def close(self):
+        self.session.close()
+
+
+class Report:
+    """
+    Latencies recorded by the terminals, per action.
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, action, seconds, status):
+        with self._lock:
+            self.latencies[action].append(seconds)
+            if status >= 400:
+                self.errors[action] += 1
+
+    def rows(self):
+        """
+        ``[(action, requests, errors, per second, mean, p50, p95, p99)]``,
+        latencies in milliseconds, with an "all" row last.
+        """
+        rows = []
+        everything = []
+        for action in ACTIONS:
+            latencies = sorted(self.latencies.get(action, []))
+            everything += latencies
+            if latencies:
+                rows.append(self._row(action, latencies, self.errors[action]))
+        everything.sort()
+        rows.append(self._row('all', everything, sum(self.errors.values())))
+        return rows
+
+    def _row(self, action, ordered, errors):
+        ms = [1000 * seconds for seconds in ordered]
+        return (
+            action, len(ordered), errors,
+            len(ordered) / self.seconds if self.seconds else 0,
+            sum(ms) / len(ms) if ms else None,
+            percentile(ms, 50), percentile(ms, 95), percentile(ms, 99),
+        )
+
+
+class Terminal:
+    """
+    One simulated till; see the module docstring.
+    """
+
+    def __init__(self, number, client, workload, report, seed=0, think_time=0.0):
+        self.client = client
+        self.workload = workload
+        self.report = report
+        self.rng = random.Random(f'{seed}-{number}')
+        self.think_time = think_time
+        self.recording = False
+
+    def request(self, action, method, *args, **kwargs):
+        started = time.perf_counter()
+        status = method(*args, **kwargs)
+        if self.recording:
+            self.report.record(action, time.perf_counter() - started, status)
+        if self.think_time:
+            time.sleep(self.rng.expovariate(1 / self.think_time))
+        return status
+
+    def session(self):
+        rng, client = self.rng, self.client
+        customer_id = None
+        if rng.random() < CUSTOMER_LOOKUP_RATIO:
+            customer_id, term = self.workload.customer_term(rng)
+            self.request('customer lookup', client.get, reverse('get_customers'),
+                         {'term': term})
+
+        basket = self.workload.basket(rng)
+        for pk, name, price, quantity in basket:
+            term = name[:rng.randrange(2, min(len(name), 8) + 1)]
+            self.request('item lookup', client.post, reverse('get_items'),
+                         {'term': term}, headers=AJAX)
+
+        payload = sale_payload(basket, customer_id)
+        self.request('sale', client.post, reverse('sale-create'), json=payload,
+                     headers={**AJAX, 'Idempotency-Key': payload['idempotency_key']})
+
+        if rng.random() < DASHBOARD_RATIO:
+            self.request('dashboard', client.get, reverse('dashboard'))
+
+    def run(self, recording_from, deadline):
+        try:
+            while (now := time.monotonic()) < deadline:
+                self.recording = now >= recording_from
+                self.session()
+        finally:
+            self.client.close()
+
+
+def run(make_client, terminals=4, seconds=30.0, warmup=5.0, seed=0,
+        think_time=0.0):
+    """
+    Runs ``terminals`` terminals for ``warmup`` + ``seconds`` seconds and
+    returns the Report of the last ``seconds``. ``make_client()`` returns
+    a new TestTerminalClient or HttpTerminalClient.
+    """
+    workload = Workload(seed)
+    report = Report()
+    clients = [make_client() for _ in range(terminals)]
+    recording_from = time.monotonic() + warmup
+    deadline = recording_from + seconds
+    threads = [
+        threading.Thread(
+            target=Terminal(number, client, workload, report, seed, think_time).run,
+            args=(recording_from, deadline),
+        )
+        for number, client in enumerate(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report.seconds = seconds
+    return report
+
+
+def terminal_user(username=None):
+    """
+    The user the in-process terminals log in as: ``username``, or the
+    first superuser.
+    """
+    users = get_user_model().objects.filter(is_active=True)
+    if username:
+        return users.get(username=username)
+    return users.filter(is_superuser=True).order_by('pk').first()
@@ -0,0 +1,168 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from InventoryMS.db import backoff_delay
+
+
+def _connect(path, profile):
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None,
+                           check_same_thread=False)
+    if profile == "production":
+        for pragma in settings.SQLITE_PRODUCTION_PRAGMAS:
+            conn.execute(pragma)
+    return conn
+
+
+def _seed(path, items, sales):
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE item (id INTEGER PRIMARY KEY, quantity INTEGER);"
+        "CREATE TABLE sale (id INTEGER PRIMARY KEY, date_added TEXT,"
+        " grand_total REAL);"
+        "CREATE TABLE saledetail (id INTEGER PRIMARY KEY, sale_id INTEGER,"
+        " item_id INTEGER, quantity INTEGER);"
+    )
+    conn.executemany(
+        "INSERT INTO item (id, quantity) VALUES (?, ?)",
+        ((i, 10 ** 9) for i in range(1, items + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO sale (date_added, grand_total) VALUES (datetime('now'), ?)",
+        ((random.uniform(1, 500),) for _ in range(sales)),
+    )
+    conn.commit()
+    conn.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent sale writes and export reads on a scratch SQLite "
+        "file with the default and the production pragmas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=5.0,
+                            help="Duration of each run")
+        parser.add_argument("--writers", type=int, default=4,
+                            help="Threads writing sales")
+        parser.add_argument("--readers", type=int, default=4,
+                            help="Threads running export-style scans")
+        parser.add_argument("--sales", type=int, default=20000,
+                            help="Sales in the table before the run")
+        parser.add_argument("--items", type=int, default=200,
+                            help="Items in the table before the run")
+        parser.add_argument("--profile", choices=["default", "production"],
+                            action="append",
+                            help="Profile to run (default: both)")
+
+    def handle(self, *args, **options):
+        profiles = options["profile"] or ["default", "production"]
+        for profile in profiles:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "bench.sqlite3")
+                _seed(path, options["items"], options["sales"])
+                stats = self.run(path, profile, options)
+
+            seconds = options["seconds"]
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{profile} profile"))
+            self.stdout.write(
+                f"  writes: {stats['writes'] / seconds:10.1f}/s"
+                f"   retries: {stats['retries']}"
+                f"   lock errors: {stats['write_errors']}"
+            )
+            self.stdout.write(
+                f"  reads:  {stats['reads'] / seconds:10.1f}/s"
+                f"   lock errors: {stats['read_errors']}"
+            )
+
+    def run(self, path, profile, options):
+        stats = dict.fromkeys(
+            ["writes", "retries", "write_errors", "reads", "read_errors"], 0
+        )
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["seconds"]
+        items = options["items"]
+        # The production profile opens write transactions with BEGIN
+        # IMMEDIATE and retries them, like Django with transaction_mode.
+        begin = "BEGIN IMMEDIATE" if profile == "production" else "BEGIN"
+        attempts = 5 if profile == "production" else 1
+
+        def count(key, n=1):
+            with lock:
+                stats[key] += n
+
+        def write_sale(conn):
+            conn.execute(begin)
+            try:
+                sale_id = conn.execute(
+                    "INSERT INTO sale (date_added, grand_total) "
+                    "VALUES (datetime('now'), ?)", (random.uniform(1, 500),)
+                ).lastrowid
+                lines = [(sale_id, random.randint(1, items), 1)
+                         for _ in range(3)]
+                conn.executemany(
+                    "INSERT INTO saledetail (sale_id, item_id, quantity) "
+                    "VALUES (?, ?, ?)", lines
+                )
+                conn.executemany(
+                    "UPDATE item SET quantity = quantity - ? "
+                    "WHERE id = ? AND quantity >= ?",
+                    [(q, item_id, q) for _, item_id, q in lines],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
+        def writer():
+            conn = _connect(path, profile)
+            while time.monotonic() < deadline:
+                for attempt in range(attempts):
+                    try:
+                        write_sale(conn)
+                    except sqlite3.OperationalError:
+                        if attempt == attempts - 1:
+                            count("write_errors")
+                            break
+                        count("retries")
+                        time.sleep(backoff_delay(attempt))
+                    else:
+                        count("writes")
+                        break
+            conn.close()
+
+        def reader():
+            conn = _connect(path, profile)
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute("BEGIN")
+                    conn.execute(
+                        "SELECT id, date_added, grand_total FROM sale "
+                        "ORDER BY id"
+                    ).fetchall()
+                    conn.execute("COMMIT")
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    count("read_errors")
+                else:
+                    count("reads")
+            conn.close()
+
+        threads = [threading.Thread(target=writer)
+                   for _ in range(options["writers"])]
+        threads += [threading.Thread(target=reader)
+                    for _ in range(options["readers"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats
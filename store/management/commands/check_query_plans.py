@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from store.query_plans import explain, plan_checks, problems
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the queries behind the list pages, dashboard and exports "
+        "and fail if any of them falls back to a full table scan or sort."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=None,
+            help="Database alias to explain on (default: the routed one)",
+        )
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Print every plan, not only the failing ones",
+        )
+
+    def handle(self, *args, **options):
+        failures = 0
+        checks = plan_checks()
+        for check in checks:
+            alias, sql, params, limited = check.sql(options["database"])
+            vendor = connections[alias].vendor
+            try:
+                plan = explain(alias, sql, params)
+            except NotImplementedError as exc:
+                raise CommandError(str(exc))
+            found = problems(vendor, plan, check, limited)
+            if found:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {check.name}"))
+                for line in found:
+                    self.stdout.write(f"    {line}")
+            else:
+                self.stdout.write(f"ok   {check.name}")
+            if found or options["verbose_plans"]:
+                self.stdout.write(f"    SQL: {sql}")
+                for line in plan:
+                    self.stdout.write(f"    | {line}")
+
+        if failures:
+            raise CommandError(
+                f"{failures} of {len(checks)} queries scan or sort without an index"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"All {len(checks)} query plans use indexes")
+        )
@@ -0,0 +1,161 @@
+from itertools import islice
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+from store.search import rebuild_index
+
+
+def _copied_models(using):
+    """
+    Returns every concrete model with a table, including many-to-many
+    tables, that exists in the ``using`` database.
+    """
+    tables = set(connections[using].introspection.table_names())
+    models = []
+    for model in apps.get_models(include_auto_created=True):
+        opts = model._meta
+        if opts.proxy or not opts.managed:
+            continue
+        if opts.db_table in tables:
+            models.append(model)
+    return models
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy every table of the SQLite database into PostgreSQL, keeping "
+        "primary keys. The target must be migrated; its rows are replaced."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            default="sqlite",
+            help="Database alias to read from (default: sqlite)",
+        )
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="Database alias to write to (default: default)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Rows read and written per batch",
+        )
+        parser.add_argument(
+            "--noinput", "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Do not ask before replacing the target rows",
+        )
+
+    def handle(self, *args, **options):
+        source, target = options["source"], options["database"]
+        for alias in (source, target):
+            if alias not in connections.settings:
+                raise CommandError(f"Unknown database alias: {alias}")
+        if source == target:
+            raise CommandError("Source and target must be different databases")
+
+        for alias in (source, target):
+            self.check_migrated(alias)
+
+        models = _copied_models(source)
+        if options["interactive"]:
+            answer = input(
+                f"This replaces the rows of {len(models)} tables in "
+                f"'{target}' with the rows from '{source}'. Type 'yes' to "
+                "continue: "
+            )
+            if answer != "yes":
+                raise CommandError("Copy cancelled.")
+
+        connection = connections[target]
+        with transaction.atomic(using=target):
+            # Foreign keys are created DEFERRABLE INITIALLY DEFERRED, so
+            # the tables can be filled in any order within the transaction.
+            connection.ops.execute_sql_flush(connection.ops.sql_flush(
+                no_style(),
+                [model._meta.db_table for model in models],
+                allow_cascade=True,
+            ))
+            for model in models:
+                copied = self.copy_table(model, source, target,
+                                         options["chunk_size"])
+                self.stdout.write(f"  {model._meta.db_table}: {copied} rows")
+
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+
+            # The search index is not a model table; rebuild it.
+            indexed = rebuild_index(using=target)
+            self.stdout.write(f"  search index: {indexed} items")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Copied {len(models)} tables to '{target}'")
+        )
+
+    def check_migrated(self, alias):
+        executor = MigrationExecutor(connections[alias])
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if plan:
+            raise CommandError(
+                f"Database '{alias}' has unapplied migrations; run "
+                f"'manage.py migrate --database {alias}' first."
+            )
+
+    def copy_table(self, model, source, target, chunk_size):
+        """
+        Streams ``model``'s rows from ``source`` to ``target`` in primary
+        key order, ``chunk_size`` rows at a time.
+        """
+        connection = connections[target]
+        fields = model._meta.concrete_fields
+        rows = model._base_manager.using(source).order_by("pk").values_list(
+            *[field.attname for field in fields]
+        ).iterator(chunk_size=chunk_size)
+
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ", ".join(
+            connection.ops.quote_name(field.column) for field in fields
+        )
+        copied = 0
+        with connection.cursor() as cursor:
+            for chunk in _chunks(rows, chunk_size):
+                chunk = [
+                    [
+                        field.get_db_prep_save(value, connection=connection)
+                        for field, value in zip(fields, row)
+                    ]
+                    for row in chunk
+                ]
+                raw = cursor.cursor
+                if connection.vendor == "postgresql" and hasattr(raw, "copy"):
+                    # psycopg 3: one COPY ... FROM STDIN per chunk.
+                    with raw.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                        for row in chunk:
+                            copy.write_row(row)
+                else:
+                    placeholders = ", ".join(["%s"] * len(fields))
+                    cursor.executemany(
+                        f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+                        chunk,
+                    )
+                copied += len(chunk)
+        return copied
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from store.dashboard import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show the dashboard cache hit rate"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counters after showing them",
+        )
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        self.stdout.write(
+            f"hits: {stats['hits']}  misses: {stats['misses']}  "
+            f"hit rate: {stats['hit_rate']:.1%}"
+        )
+        if options["reset"]:
+            reset_cache_stats()
+            self.stdout.write("Counters reset")
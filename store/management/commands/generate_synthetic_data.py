@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.dateparse import parse_date
+
+from store.synthetic import SCALES, Scale, generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a deterministic synthetic data set: "
+        "categories, vendors, items, customers, sales, purchases, bills, "
+        "invoices and deliveries, with skewed item popularity"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            choices=sorted(SCALES),
+            default="small",
+            help="Preset row counts (default: small)",
+        )
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Random seed; the same seed gives the same rows")
+        parser.add_argument("--end",
+                            help="Last day of the generated history (YYYY-MM-DD); default: today")
+        for name in Scale.FIELDS:
+            parser.add_argument(
+                f"--{name}", type=int,
+                help=f"Override the number of {name} of the preset",
+            )
+        parser.add_argument(
+            "--noinput", "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Do not ask for confirmation",
+        )
+
+    def handle(self, *args, **options):
+        scale = SCALES[options["scale"]].replace(
+            **{name: options[name] for name in Scale.FIELDS}
+        )
+        if min(getattr(scale, name) for name in Scale.FIELDS) < 1:
+            raise CommandError("Every count must be at least 1")
+        end = None
+        if options["end"]:
+            end = parse_date(options["end"])
+            if end is None:
+                raise CommandError(f"Invalid date: {options['end']} (expected YYYY-MM-DD)")
+
+        self.stdout.write(f"Generating {scale} (seed {options['seed']})")
+        if options["interactive"]:
+            answer = input(
+                f"This adds the rows to the '{connection.settings_dict['NAME']}' "
+                "database. Type 'yes' to continue: "
+            )
+            if answer != "yes":
+                raise CommandError("Cancelled.")
+
+        started = time.monotonic()
+        written = generate(scale, options["seed"], end, self.report_progress)
+        seconds = time.monotonic() - started
+
+        self.stdout.write("")
+        for label, count in written.items():
+            self.stdout.write(f"  {label:<14} {count:>10}")
+        total = sum(written.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {total} rows in {seconds:.1f}s ({total / seconds:.0f} rows/s)"
+        ))
+
+    def report_progress(self, label, done, total):
+        self.stdout.write(f"\r  {label}: {done}/{total}", ending="")
+        if done == total:
+            self.stdout.write("")
+        self.stdout.flush()
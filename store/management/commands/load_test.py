@@ -0,0 +1,88 @@
+import getpass
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive concurrent simulated POS terminals (customer lookup, item "
+        "lookup, sale, dashboard) and report throughput and p50/p95/p99 "
+        "latency per action"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--terminals", type=int, default=4,
+                            help="Concurrent terminals (threads)")
+        parser.add_argument("--seconds", type=float, default=30.0,
+                            help="Measured duration")
+        parser.add_argument("--warmup", type=float, default=5.0,
+                            help="Seconds run before measuring")
+        parser.add_argument("--think-time", type=float, default=0.0,
+                            help="Mean pause after each request, in seconds")
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Random seed of the terminals")
+        parser.add_argument(
+            "--url",
+            help="Base URL of a running server (e.g. http://127.0.0.1:8000/); "
+                 "default: run in-process through the test client",
+        )
+        parser.add_argument(
+            "--username",
+            help="User the terminals log in as (default in-process: the "
+                 "first superuser)",
+        )
+        parser.add_argument("--password",
+                            help="Password for --url (asked if missing)")
+
+    def handle(self, *args, **options):
+        if options["terminals"] < 1 or options["seconds"] <= 0:
+            raise CommandError("--terminals and --seconds must be positive")
+
+        if options["url"]:
+            if not options["username"]:
+                raise CommandError("--url needs --username")
+            password = options["password"] or getpass.getpass()
+
+            def make_client():
+                return loadtest.HttpTerminalClient(
+                    options["url"], options["username"], password
+                )
+            target = options["url"]
+        else:
+            user = loadtest.terminal_user(options["username"])
+            if user is None:
+                raise CommandError("No superuser to log in as; pass --username")
+
+            def make_client():
+                return loadtest.TestTerminalClient(user)
+            target = "in-process"
+
+        self.stdout.write(
+            f"{options['terminals']} terminals against {target} for "
+            f"{options['seconds']:g}s (+{options['warmup']:g}s warm-up)"
+        )
+        try:
+            report = loadtest.run(
+                make_client,
+                terminals=options["terminals"],
+                seconds=options["seconds"],
+                warmup=options["warmup"],
+                seed=options["seed"],
+                think_time=options["think_time"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{'action':<16}{'requests':>9}{'errors':>8}{'req/s':>9}"
+            f"{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        )
+        for action, requests, errors, rate, mean, p50, p95, p99 in report.rows():
+            if not requests:
+                continue
+            self.stdout.write(
+                f"{action:<16}{requests:>9}{errors:>8}{rate:>9.1f}"
+                f"{mean:>9.1f}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}"
+            )
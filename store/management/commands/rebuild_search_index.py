@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text item search index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="Database alias to rebuild the index in",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_index(using=options["database"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} item(s)"))
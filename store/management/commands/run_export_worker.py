@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.export_jobs import claim_job, requeue_stale_jobs, run_job, worker_name
+
+
+class Command(BaseCommand):
+    help = "Run queued spreadsheet export jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run the jobs that are queued now, then exit",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between polls when the queue is empty",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=3600,
+            help="Requeue running jobs older than this many seconds on start",
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+
+        requeued = requeue_stale_jobs(options["stale_after"])
+        if requeued:
+            self.stdout.write(
+                self.style.WARNING(f"Requeued {requeued} stale job(s)")
+            )
+
+        self.stdout.write(f"Export worker {worker} started")
+        try:
+            while True:
+                job = claim_job(worker)
+                if job is None:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                self.stdout.write(f"Running {job}")
+                job = run_job(job)
+                if job.status == "D":
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f"Finished {job}: {job.rows_written} rows -> {job.file.name}"
+                        )
+                    )
+                else:
+                    self.stdout.write(self.style.ERROR(f"Failed {job}: {job.error}"))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write("Export worker stopped")
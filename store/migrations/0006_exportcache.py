@@ -0,0 +1,34 @@
+# Generated by Django 5.1 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0005_exportjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("token", models.CharField(max_length=32)),
+                ("row_count", models.PositiveIntegerField(default=0)),
+                ("max_key", models.BigIntegerField(blank=True, null=True)),
+                ("max_watermark", models.DateTimeField(blank=True, null=True)),
+                ("date_built", models.DateTimeField()),
+                ("date_updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
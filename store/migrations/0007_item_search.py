@@ -0,0 +1,26 @@
+# Generated by Django 5.1 on 2026-10-17 21:10
+
+from django.db import migrations
+
+from store import search
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    search.create_index(connection)
+    search.rebuild_index(using=connection.alias)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0006_exportcache"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-17 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0007_item_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-17 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_item_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['date_created', 'id'], name='delivery_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(condition=models.Q(('is_delivered', False)), fields=['date_created'], name='delivery_pending_idx'),
+        ),
+    ]
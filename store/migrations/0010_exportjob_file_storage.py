@@ -0,0 +1,48 @@
+# Generated by Django 5.1 on 2026-10-17 18:48
+
+import os
+import shutil
+
+from django.conf import settings
+from django.db import migrations, models
+
+import store.models
+
+
+def move_exports(apps, schema_editor):
+    # Export files were kept under MEDIA_ROOT/exports/, inside the static
+    # directory: move the finished ones to EXPORT_ROOT and drop the cached
+    # incremental exports, which are rebuilt on the next download.
+    ExportJob = apps.get_model("store", "ExportJob")
+    db_alias = schema_editor.connection.alias
+    old_root = os.path.join(settings.MEDIA_ROOT, "exports")
+
+    for job in ExportJob.objects.using(db_alias).filter(file__startswith="exports/"):
+        source = os.path.join(settings.MEDIA_ROOT, job.file.name)
+        name = os.path.basename(job.file.name)
+        if os.path.exists(source):
+            os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+            shutil.move(source, os.path.join(settings.EXPORT_ROOT, name))
+        ExportJob.objects.using(db_alias).filter(pk=job.pk).update(file=name)
+
+    shutil.rmtree(os.path.join(old_root, "cache"), ignore_errors=True)
+    try:
+        os.rmdir(old_root)
+    except OSError:
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_delivery_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, storage=store.models.export_storage, upload_to=''),
+        ),
+        migrations.RunPython(move_exports, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-17 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_exportjob_file_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportcache",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="exportcache",
+            name="built_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
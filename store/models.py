@@ -7,12 +7,20 @@ This module defines the following classes:
 - Category: Represents a category for items.
 - Item: Represents an item in the inventory.
 - Delivery: Represents a delivery of an item to a customer.
+- ExportJob: Represents a spreadsheet export built by the export worker.
+- ExportCache: Records the cached copy of an incremental export.
+- ExportStorage: Stores export files outside the media directory.
 
 Each class provides specific fields and methods for handling related data.
 """
 
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from django.urls import reverse
+from django.contrib.auth.models import User
 from django.forms import model_to_dict
 from django_extensions.db.fields import AutoSlugField
 from phonenumber_field.modelfields import PhoneNumberField
@@ -46,6 +54,9 @@ class Item(models.Model):
     price = models.FloatField(default=0)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     vendor = models.ForeignKey(Vendor, on_delete=models.SET_NULL, null=True)
+    # Bumped on every change (including stock updates in store.inventory);
+    # used to build ETags.
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     def __str__(self):
         """
@@ -56,6 +67,11 @@ class Item(models.Model):
             f"{self.quantity}"
         )
 
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            self.version += 1
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         """
         Returns the absolute URL for an item detail view.
@@ -88,5 +104,109 @@ class Delivery(models.Model):
     is_delivered = models.BooleanField(default=False, verbose_name='Is Delivered')
     date_created = models.DateTimeField(auto_now_add=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["date_created", "id"], name="delivery_date_idx"),
+            # Chỉ các đơn chưa giao (ít dòng, hay được lọc)
+            models.Index(
+                fields=["date_created"],
+                condition=models.Q(is_delivered=False),
+                name="delivery_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Delivery for Invoice #{self.invoice_id}"
+
+
+EXPORT_CHOICES = [
+    ('sales', 'Sales'),
+    ('invoices', 'Invoices'),
+    ('purchases', 'Purchases'),
+]
+
+class ExportStorage(FileSystemStorage):
+    """
+    Stores export files in EXPORT_ROOT, which is not served as media.
+    """
+
+    @property
+    def base_location(self):
+        # Read on each use, so override_settings() applies.
+        return settings.EXPORT_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def export_storage():
+    return ExportStorage()
+
+
+EXPORT_STATUS_CHOICES = [
+    ('Q', 'Queued'),
+    ('R', 'Running'),
+    ('D', 'Done'),
+    ('F', 'Failed'),
+]
+
+
+class ExportJob(models.Model):
+    """
+    Represents a spreadsheet export built in the background by the
+    ``run_export_worker`` management command.
+    """
+    export = models.CharField(choices=EXPORT_CHOICES, max_length=20)
+    status = models.CharField(
+        choices=EXPORT_STATUS_CHOICES, max_length=1, default='Q'
+    )
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    worker = models.CharField(max_length=100, blank=True)
+    rows_total = models.PositiveIntegerField(null=True, blank=True)
+    rows_written = models.PositiveIntegerField(default=0)
+    file = models.FileField(storage=export_storage, blank=True)
+    error = models.TextField(blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_started = models.DateTimeField(null=True, blank=True)
+    date_finished = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Export #{self.id} ({self.export}) - {self.get_status_display()}"
+
+    @property
+    def progress(self):
+        """
+        Returns the share of rows written so far, as a percentage.
+        """
+        if self.status == 'D':
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(self.rows_written * 100 / self.rows_total))
+
+    class Meta:
+        ordering = ['-date_created']
+
+
+class ExportCache(models.Model):
+    """
+    Records the cached copy of an incremental export and the
+    high-water mark of the rows it covers. ``version`` is bumped when a
+    row the export reads is edited or deleted; the copy is current while
+    it equals ``built_version``.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    token = models.CharField(max_length=32)
+    row_count = models.PositiveIntegerField(default=0)
+    max_key = models.BigIntegerField(null=True, blank=True)
+    max_watermark = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=0)
+    built_version = models.PositiveIntegerField(default=0)
+    date_built = models.DateTimeField()
+    date_updated = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"Delivery for Invoice #{self.invoice.id}"
\ No newline at end of file
+        return f"{self.name} ({self.row_count} rows)"
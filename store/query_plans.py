@@ -0,0 +1,281 @@
+"""
+Module: store.query_plans
+
+Query plan regression check (``manage.py check_query_plans``).
+
+``plan_checks()`` lists the ORM queries behind the list pages, the
+customer lookup, the dashboard, the sales rollup and the exports.
+``explain`` runs each through the database planner:
+- SQLite: ``EXPLAIN QUERY PLAN``;
+- PostgreSQL: ``EXPLAIN`` with sequential scans and sorts disabled for
+  the transaction, so the planner takes an index whenever one can serve
+  the query and only falls back to a scan or sort when none can.
+
+``problems`` reports the plan steps that read a whole table or sort in
+a temporary structure. Queries that have to read a whole table (the
+dashboard counters, full exports) list it in ``allow_scan``; grouped
+queries that sort their groups set ``allow_sort``.
+"""
+
+import re
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+# SQLite: "SCAN sales" reads the whole table (or, with a LIMIT and no
+# sort, walks it in rowid order and stops); "SCAN sales USING INDEX x"
+# walks an index in order and is fine.
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)$')
+SQLITE_SORT = re.compile(r'^USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)')
+POSTGRES_SCAN = re.compile(r'\bSeq Scan on (\w+)')
+POSTGRES_SORT = re.compile(r'(?:^|->\s*)(?:Incremental )?Sort\b')
+
+
+class PlanCheck:
+    """
+    One query to explain.
+
+    Attributes:
+    - name: Label in the report.
+    - build: Callable returning a QuerySet, or ``(sql, params, model)``
+      for raw SQL.
+    - allow_scan: Tables the query may read in full.
+    - allow_sort: Whether the query may sort without an index.
+    """
+
+    def __init__(self, name, build, allow_scan=(), allow_sort=False):
+        self.name = name
+        self.build = build
+        self.allow_scan = set(allow_scan)
+        self.allow_sort = allow_sort
+
+    def sql(self, using=None):
+        """
+        Returns ``(alias, sql, params, limited)``; ``limited`` is True when
+        the query has a LIMIT.
+        """
+        query = self.build()
+        if isinstance(query, QuerySet):
+            alias = using or query.db
+            sql, params = query.query.get_compiler(using=alias).as_sql()
+            return alias, sql, params, query.query.high_mark is not None
+        sql, params, model = query
+        return using or router.db_for_read(model), sql, params, False
+
+
+def explain(alias, sql, params):
+    """
+    Returns the plan of ``sql`` as a list of lines.
+    """
+    connection = connections[alias]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+            cursor.execute(f"EXPLAIN {sql}", params)
+            return [row[0] for row in cursor.fetchall()]
+    raise NotImplementedError(
+        f"No query plan check for the {connection.vendor} backend"
+    )
+
+
+def problems(vendor, plan, check, limited=False):
+    """
+    Returns the plan lines that scan a table or sort when ``check`` does
+    not allow it.
+    """
+    scan, sort = (
+        (SQLITE_SCAN, SQLITE_SORT) if vendor == 'sqlite'
+        else (POSTGRES_SCAN, POSTGRES_SORT)
+    )
+    sorts = [line.strip() for line in plan if sort.search(line.strip())]
+    found = [] if check.allow_sort else sorts
+    # A limited SQLite scan without a sort stops after LIMIT rows.
+    scan_stops = vendor == 'sqlite' and limited and not sorts
+    for line in plan:
+        match = scan.search(line.strip())
+        if match and match.group(1) not in check.allow_scan and not scan_stops:
+            found.append(line.strip())
+    return found
+
+
+def _sample_key(model, fields):
+    """
+    A cursor key of the right types for ``fields`` (the plan does not
+    depend on the values).
+    """
+    key = []
+    for name in fields:
+        internal_type = model._meta.get_field(name).get_internal_type()
+        if internal_type == 'DateTimeField':
+            key.append(timezone.now())
+        elif internal_type == 'DateField':
+            key.append(timezone.localdate())
+        else:
+            key.append(1)
+    return tuple(key)
+
+
+def _list_view_checks(view_class):
+    from InventoryMS.pagination import KeysetPaginator
+
+    def paginator():
+        view = view_class()
+        view.kwargs = {}
+        return KeysetPaginator(
+            view.get_queryset(), view.paginate_by, view.keyset_ordering
+        )
+
+    def deep_page():
+        pages = paginator()
+        return pages.rows_after(_sample_key(pages.queryset.model, pages.fields))
+
+    def previous_keys():
+        pages = paginator()
+        return pages.keys_before(_sample_key(pages.queryset.model, pages.fields))
+
+    name = view_class.__name__
+    return [
+        PlanCheck(f"{name}: first page", lambda: paginator().rows_after()),
+        PlanCheck(f"{name}: page after cursor", deep_page),
+        PlanCheck(f"{name}: previous pages", previous_keys),
+    ]
+
+
+def _export_checks(export):
+    from .exports import IncrementalXlsxExport
+
+    table = export.queryset.model._meta.db_table
+    checks = [
+        PlanCheck(
+            f"export {export.filename}: rows",
+            lambda: export.queryset.values_list(*export.fields),
+            allow_scan={table},
+        ),
+    ]
+    if isinstance(export, IncrementalXlsxExport):
+        checks += [
+            PlanCheck(
+                f"export {export.filename}: edited rows",
+                lambda: export.queryset.filter(**{
+                    'pk__lte': 1,
+                    f'{export.watermark}__gt': timezone.now(),
+                }).values('pk')[:1],
+            ),
+            # Only the new rows are sorted.
+            PlanCheck(
+                f"export {export.filename}: added rows",
+                lambda: export.queryset.filter(
+                    pk__gt=1, pk__lte=100
+                ).values_list(*export.fields),
+                allow_sort=True,
+            ),
+        ]
+    return checks
+
+
+def plan_checks():
+    """
+    Returns the PlanChecks of the pages, dashboard and exports.
+    """
+    from accounts.views import _customer_matches
+    from bills.views import BILLS_EXPORT, BillListView
+    from invoice.views import INVOICES_EXPORT, InvoiceListView
+    from transactions.models import Purchase, SaleDetail
+    from transactions.rollups import daily_sales, daily_units, series_queryset
+    from transactions.views import (
+        PURCHASES_EXPORT, SALES_EXCEL_EXPORT, PurchaseListView, SaleListView,
+    )
+    from . import dashboard
+    from .models import Category, Delivery, Item
+    from .views import (
+        DELIVERIES_EXPORT, PRODUCTS_EXPORT, SALES_EXPORT, ProductListView,
+    )
+
+    today = timezone.localdate()
+    month_ago = today - timedelta(days=30)
+    counted_tables = {
+        model._meta.db_table for model in dashboard.COUNTED_MODELS
+    }
+
+    def table_counts():
+        connection = connections[router.db_for_read(Item)]
+        return dashboard.table_counts_sql(connection), [], Item
+
+    checks = []
+    for view_class in (SaleListView, PurchaseListView, ProductListView,
+                       InvoiceListView, BillListView):
+        checks += _list_view_checks(view_class)
+
+    checks += [
+        # The matches are found through the token index, then sorted.
+        PlanCheck(
+            "customer lookup: name prefix",
+            lambda: _customer_matches('ng').order_by('search_name', 'id')[:21],
+            allow_sort=True,
+        ),
+        # Both index searches are merged, then the matches sorted.
+        PlanCheck(
+            "customer lookup: name prefix or phone",
+            lambda: _customer_matches('0912345678')
+            .order_by('search_name', 'id')[:21],
+            allow_sort=True,
+        ),
+        PlanCheck(
+            "pending purchases",
+            lambda: Purchase.objects.filter(delivery_status='P')
+            .order_by('order_date')[:10],
+        ),
+        PlanCheck(
+            "pending deliveries",
+            lambda: Delivery.objects.filter(is_delivered=False)
+            .order_by('-date_created')[:10],
+        ),
+        PlanCheck(
+            "sales of an item",
+            lambda: SaleDetail.objects.filter(item_id=1).values('sale_id'),
+        ),
+        # The rows the stock totals aggregate over.
+        PlanCheck(
+            "dashboard: stock",
+            lambda: Item.objects.order_by().values_list('quantity'),
+            allow_scan={Item._meta.db_table},
+        ),
+        PlanCheck(
+            "dashboard: table counts", table_counts,
+            allow_scan=counted_tables,
+        ),
+        PlanCheck(
+            "dashboard: category chart", dashboard.category_counts_queryset,
+            allow_scan={Category._meta.db_table}, allow_sort=True,
+        ),
+        PlanCheck(
+            "dashboard: sales chart by day",
+            lambda: series_queryset('day', month_ago, today),
+        ),
+        PlanCheck(
+            "dashboard: sales chart by month",
+            lambda: series_queryset('month', month_ago, today),
+            allow_sort=True,
+        ),
+        PlanCheck(
+            "rollup: sales of a day",
+            lambda: daily_sales(today, today), allow_sort=True,
+        ),
+        PlanCheck(
+            "rollup: units of a day",
+            lambda: daily_units(today, today), allow_sort=True,
+        ),
+    ]
+
+    for export in (PRODUCTS_EXPORT, SALES_EXPORT, SALES_EXCEL_EXPORT,
+                   PURCHASES_EXPORT, DELIVERIES_EXPORT, INVOICES_EXPORT,
+                   BILLS_EXPORT):
+        checks += _export_checks(export)
+    return checks
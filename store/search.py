@@ -0,0 +1,244 @@
+"""
+Module: store.search
+
+Full-text item search.
+
+Items are indexed in ``store_item_search`` with their name, description,
+category name and vendor name:
+- SQLite: an FTS5 virtual table keyed by the item id (rowid), with
+  diacritics folded so "ca phe" finds "Cà phê", and prefix indexes for
+  the POS autocomplete; results are ranked with bm25().
+- PostgreSQL: a table with a weighted ``tsvector`` per item and a GIN
+  index; results are ranked with ts_rank().
+
+Every query term is matched as a prefix and all terms must match. The
+index is kept in sync by the signals in store.signals; ``rebuild_index``
+(``manage.py rebuild_search_index``) rebuilds it from scratch. On other
+database backends ``search_items`` falls back to ``icontains`` filters.
+"""
+
+import operator
+import re
+from functools import reduce
+
+from django.db import connections, router
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from accounts.models import Vendor
+from .models import Category, Item
+
+SEARCH_TABLE = 'store_item_search'
+
+# Most matches returned, best first.
+SEARCH_LIMIT = 1000
+
+# Statements per chunk of item ids.
+INDEX_BATCH_SIZE = 500
+
+# bm25() column weights: name, description, category, vendor.
+SQLITE_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "name, description, category, vendor, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+]
+POSTGRES_CREATE = [
+    f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+    "item_id bigint PRIMARY KEY REFERENCES store_item (id) "
+    "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document "
+    f"ON {SEARCH_TABLE} USING gin (document)",
+]
+DROP = [f"DROP TABLE IF EXISTS {SEARCH_TABLE}"]
+
+
+def _backend(connection):
+    if connection.vendor in ('sqlite', 'postgresql'):
+        return connection.vendor
+    return None
+
+
+def create_index(connection):
+    """
+    Creates the search table (migration helper).
+    """
+    backend = _backend(connection)
+    if backend is None:
+        return
+    statements = SQLITE_CREATE if backend == 'sqlite' else POSTGRES_CREATE
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def drop_index(connection):
+    if _backend(connection) is None:
+        return
+    with connection.cursor() as cursor:
+        for sql in DROP:
+            cursor.execute(sql)
+
+
+def _source_sql(where):
+    """
+    SELECT of (id, name, description, category, vendor) for the items
+    matching ``where``.
+    """
+    item = Item._meta.db_table
+    category = Category._meta.db_table
+    vendor = Vendor._meta.db_table
+    return (
+        f'SELECT i.id, i.name, i.description, c.name, COALESCE(v.name, \'\') '
+        f'FROM "{item}" i '
+        f'JOIN "{category}" c ON c.id = i.category_id '
+        f'LEFT JOIN "{vendor}" v ON v.id = i.vendor_id '
+        f'{where}'
+    )
+
+
+def _write_sql(backend, where):
+    if backend == 'sqlite':
+        return (
+            f"INSERT INTO {SEARCH_TABLE} "
+            f"(rowid, name, description, category, vendor) "
+            + _source_sql(where)
+        )
+    return (
+        f"INSERT INTO {SEARCH_TABLE} (item_id, document) "
+        "SELECT s.id, "
+        "setweight(to_tsvector('simple', s.name), 'A') || "
+        "setweight(to_tsvector('simple', s.category), 'B') || "
+        "setweight(to_tsvector('simple', s.vendor), 'C') || "
+        "setweight(to_tsvector('simple', s.description), 'D') "
+        f"FROM ({_source_sql(where)}) "
+        "AS s (id, name, description, category, vendor) "
+        "ON CONFLICT (item_id) DO UPDATE SET document = EXCLUDED.document"
+    )
+
+
+def _key_column(backend):
+    return 'rowid' if backend == 'sqlite' else 'item_id'
+
+
+def _connection(using):
+    return connections[using or router.db_for_write(Item)]
+
+
+def index_items(item_ids, using=None):
+    """
+    (Re)indexes the given items; ids of deleted items are removed.
+    """
+    connection = _connection(using)
+    backend = _backend(connection)
+    item_ids = list(item_ids)
+    if backend is None or not item_ids:
+        return
+    key = _key_column(backend)
+    with connection.cursor() as cursor:
+        for start in range(0, len(item_ids), INDEX_BATCH_SIZE):
+            chunk = item_ids[start:start + INDEX_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE {key} IN ({placeholders})",
+                chunk,
+            )
+            cursor.execute(
+                _write_sql(backend, f"WHERE i.id IN ({placeholders})"), chunk
+            )
+
+
+def remove_items(item_ids, using=None):
+    """
+    Removes the given items from the index.
+    """
+    connection = _connection(using)
+    backend = _backend(connection)
+    item_ids = list(item_ids)
+    if backend is None or not item_ids:
+        return
+    key = _key_column(backend)
+    with connection.cursor() as cursor:
+        for start in range(0, len(item_ids), INDEX_BATCH_SIZE):
+            chunk = item_ids[start:start + INDEX_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE {key} IN ({placeholders})",
+                chunk,
+            )
+
+
+def rebuild_index(using=None):
+    """
+    Rebuilds the whole index. Returns the number of items indexed.
+    """
+    connection = _connection(using)
+    backend = _backend(connection)
+    if backend is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(_write_sql(backend, ''))
+        cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def query_terms(query):
+    """
+    Splits a search box query into lowercase word terms.
+    """
+    return re.findall(r'\w+', (query or '').lower())
+
+
+def search_item_ids(terms, limit=SEARCH_LIMIT, using=None):
+    """
+    Returns the ids of the items matching every term as a prefix, best
+    match first, or None when the database has no search index.
+    """
+    connection = connections[using or router.db_for_read(Item)]
+    backend = _backend(connection)
+    if backend is None:
+        return None
+    if backend == 'sqlite':
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        sql = (
+            f"SELECT rowid FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s"
+        )
+        match = ' '.join(f'"{term}"*' for term in terms)
+    else:
+        sql = (
+            f"SELECT item_id FROM {SEARCH_TABLE}, "
+            "to_tsquery('simple', %s) AS query "
+            "WHERE document @@ query "
+            "ORDER BY ts_rank(document, query) DESC, item_id LIMIT %s"
+        )
+        match = ' & '.join(f'{term}:*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_items(queryset, query, limit=SEARCH_LIMIT):
+    """
+    Filters an Item queryset down to the items matching ``query``, best
+    match first. An empty query returns the queryset unchanged.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return queryset
+
+    ids = search_item_ids(terms, limit, using=queryset.db)
+    if ids is None:
+        return queryset.filter(
+            reduce(operator.and_, (Q(name__icontains=term) for term in terms))
+        )
+    if not ids:
+        return queryset.none()
+    ranking = Case(
+        *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(ranking)
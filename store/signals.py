@@ -0,0 +1,109 @@
+# store/signals.py
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from accounts.models import Customer, Profile, Vendor
+from InventoryMS.db import on_commit_once
+from invoice.models import Invoice
+from transactions.models import Purchase, Sale
+from .models import Category, Delivery, Item
+from . import catalog, dashboard, exports, search
+
+# Models whose changes show on the dashboard. Purchases and invoices
+# change stock through QuerySet.update(), which sends no Item signal.
+DASHBOARD_MODELS = [
+    Item, Category, Delivery, Sale, Purchase, Invoice, Profile, Vendor
+]
+
+
+def invalidate_dashboard(sender, using=None, **kwargs):
+    # After the commit: a request reading in between would otherwise cache
+    # the old values under the new version.
+    transaction.on_commit(dashboard.invalidate, using=using)
+
+
+for model in DASHBOARD_MODELS:
+    post_save.connect(
+        invalidate_dashboard, sender=model,
+        dispatch_uid=f"dashboard-save-{model._meta.label_lower}"
+    )
+    post_delete.connect(
+        invalidate_dashboard, sender=model,
+        dispatch_uid=f"dashboard-delete-{model._meta.label_lower}"
+    )
+
+
+# Search index: an item is reindexed when it, its category or its vendor
+# changes.
+
+@receiver(post_save, sender=Item)
+def item_post_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_items([instance.pk])
+
+
+@receiver(post_delete, sender=Item)
+def item_post_delete(sender, instance, **kwargs):
+    search.remove_items([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def category_post_save(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_items(
+            Item.objects.filter(category=instance).values_list('pk', flat=True)
+        )
+
+
+@receiver(post_save, sender=Vendor)
+def vendor_post_save(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_items(
+            Item.objects.filter(vendor=instance).values_list('pk', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Vendor)
+def vendor_pre_delete(sender, instance, **kwargs):
+    # Items keep existing with vendor=NULL (no Item signal is sent).
+    instance._search_item_ids = list(
+        Item.objects.filter(vendor=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Vendor)
+def vendor_post_delete(sender, instance, **kwargs):
+    search.index_items(getattr(instance, '_search_item_ids', []))
+
+
+# POS catalog: reloaded by every worker when an item or category changes.
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog(sender, using=None, **kwargs):
+    transaction.on_commit(catalog.invalidate, using=using)
+
+
+# Incremental exports: the rows they already hold change when a sale or
+# invoice, or the customer or item joined to it, is edited or deleted.
+# New rows are added by the next download without a rebuild.
+EXPORTED_MODELS = [Sale, Invoice, Customer, Item]
+
+
+def invalidate_exports(sender, created=False, raw=False, using=None, **kwargs):
+    if not created and not raw:
+        on_commit_once(exports.invalidate, using=using)
+
+
+for model in EXPORTED_MODELS:
+    post_save.connect(
+        invalidate_exports, sender=model,
+        dispatch_uid=f"exports-save-{model._meta.label_lower}"
+    )
+    post_delete.connect(
+        invalidate_exports, sender=model,
+        dispatch_uid=f"exports-delete-{model._meta.label_lower}"
+    )
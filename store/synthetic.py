@@ -0,0 +1,510 @@
+"""
+Module: store.synthetic
+
+Synthetic data at production scale (``manage.py generate_synthetic_data``).
+
+``generate(scale, seed)`` writes categories, vendors, items and customers,
+then sales with their details, purchases with their bills and invoices
+with their deliveries, spread over the ``scale.days`` days before ``end``.
+The same seed, scale and end date always give the same rows. Item and
+customer popularity follow a Zipf law: a few best sellers and regulars
+account for most sale lines, as in the shop.
+
+Rows are written with ``bulk_create``, ``BATCH_SIZE`` sales (or
+purchases, invoices) and their child rows per transaction. Fields whose
+``pre_save`` would replace the generated value (auto slugs, ``auto_now``
+dates) are bypassed while writing, and the totals the models' ``save()``
+would compute are filled in here. ``bulk_create`` sends no signals, so
+the sales rollup, search index, POS catalog and dashboard cache are
+rebuilt at the end.
+"""
+
+import itertools
+import math
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from accounts.models import Customer, Vendor, write_name_tokens
+from bills.models import Bill
+from invoice.models import Invoice
+from transactions.models import Purchase, Sale, SaleDetail
+from transactions.rollups import rebuild as rebuild_rollup
+from . import catalog, dashboard, search
+from .models import Category, Delivery, Item
+
+BATCH_SIZE = 2000
+
+# Weight of the n-th most popular item or customer: n ** -ZIPF_EXPONENT.
+ZIPF_EXPONENT = 1.1
+
+# Sales are rung up between these hours.
+OPENING_HOUR = 7
+CLOSING_HOUR = 21
+
+TAX_PERCENTAGE = 10.0
+CENT = Decimal('0.01')
+
+# Lines per sale and units per line.
+LINE_COUNTS = (1, 2, 3, 4, 5, 6, 8)
+LINE_WEIGHTS = (30, 25, 18, 12, 7, 5, 3)
+UNIT_COUNTS = (1, 2, 3, 4, 6, 10)
+UNIT_WEIGHTS = (62, 18, 8, 5, 4, 3)
+
+# Share of sales to a known customer, purchases with a bill and invoices
+# with a delivery.
+KNOWN_CUSTOMER_RATIO = 0.6
+BILL_RATIO = 0.9
+DELIVERY_RATIO = 0.7
+
+FAMILY_NAMES = (
+    'Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ',
+    'Đặng', 'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương', 'Lý',
+)
+MIDDLE_NAMES = ('Văn', 'Thị', 'Hữu', 'Minh', 'Ngọc', 'Thanh', 'Đức', 'Gia')
+GIVEN_NAMES = (
+    'An', 'Bình', 'Chi', 'Dũng', 'Hà', 'Hải', 'Hạnh', 'Hùng', 'Hương',
+    'Khánh', 'Lan', 'Linh', 'Long', 'Mai', 'Minh', 'Nam', 'Ngọc', 'Phong',
+    'Phương', 'Quân', 'Quang', 'Sơn', 'Thảo', 'Thu', 'Trang', 'Tuấn', 'Vy',
+    'Yến',
+)
+DISTRICTS = (
+    'Quận 1', 'Quận 3', 'Quận 5', 'Quận 7', 'Quận 10', 'Bình Thạnh',
+    'Gò Vấp', 'Phú Nhuận', 'Tân Bình', 'Thủ Đức', 'Hoàn Kiếm', 'Cầu Giấy',
+    'Đống Đa', 'Hai Bà Trưng', 'Hải Châu',
+)
+CATEGORY_NAMES = (
+    'Beverages', 'Snacks', 'Dairy', 'Bakery', 'Frozen', 'Produce',
+    'Household', 'Personal Care', 'Baby', 'Pet', 'Stationery', 'Electronics',
+    'Canned Goods', 'Condiments', 'Rice & Noodles', 'Coffee & Tea',
+)
+PRODUCT_WORDS = (
+    'Classic', 'Premium', 'Organic', 'Family', 'Mini', 'Extra', 'Fresh',
+    'Light', 'Original', 'Spicy', 'Sweet', 'Golden', 'Green', 'Royal',
+)
+PAYMENT_DETAILS = ('Cash', 'Bank transfer', 'Card', 'E-wallet')
+
+
+class Scale:
+    """
+    Number of rows of each kind to generate.
+    """
+
+    FIELDS = ('categories', 'vendors', 'items', 'customers', 'sales',
+              'purchases', 'invoices', 'days')
+
+    def __init__(self, categories, vendors, items, customers, sales,
+                 purchases, invoices, days):
+        self.categories = categories
+        self.vendors = vendors
+        self.items = items
+        self.customers = customers
+        self.sales = sales
+        self.purchases = purchases
+        self.invoices = invoices
+        self.days = days
+
+    def replace(self, **counts):
+        values = {name: getattr(self, name) for name in self.FIELDS}
+        values.update(
+            (name, count) for name, count in counts.items() if count is not None
+        )
+        return Scale(**values)
+
+    def __str__(self):
+        return ', '.join(f'{getattr(self, name)} {name}' for name in self.FIELDS)
+
+
+SCALES = {
+    # A few rows of every kind: tests and quick checks.
+    'tiny': Scale(categories=3, vendors=3, items=20, customers=20, sales=40,
+                  purchases=15, invoices=15, days=5),
+    'small': Scale(categories=12, vendors=20, items=500, customers=2000,
+                   sales=20_000, purchases=2_000, invoices=2_000, days=90),
+    'medium': Scale(categories=16, vendors=60, items=3000, customers=30_000,
+                    sales=300_000, purchases=20_000, invoices=20_000, days=365),
+    'large': Scale(categories=16, vendors=150, items=10_000,
+                   customers=200_000, sales=2_000_000, purchases=100_000,
+                   invoices=150_000, days=730),
+}
+
+
+class Popularity:
+    """
+    Draws values with Zipf weights: the values are shuffled and the n-th
+    one gets weight ``n ** -exponent``.
+    """
+
+    def __init__(self, rng, values, exponent=ZIPF_EXPONENT):
+        self.values = list(values)
+        rng.shuffle(self.values)
+        self.cum_weights = list(itertools.accumulate(
+            rank ** -exponent for rank in range(1, len(self.values) + 1)
+        ))
+
+    def draw(self, rng, k=1):
+        return rng.choices(self.values, cum_weights=self.cum_weights, k=k)
+
+
+@contextmanager
+def _keep_values(model, *names):
+    """
+    Makes the ``pre_save`` of the given fields of ``model`` keep the value
+    set on the instance (auto slugs and auto_now dates overwrite it).
+    """
+    fields = [model._meta.get_field(name) for name in names]
+    for field in fields:
+        field.pre_save = lambda obj, add, attname=field.attname: getattr(obj, attname)
+    try:
+        yield
+    finally:
+        for field in fields:
+            del field.pre_save
+
+
+def _next_number(model):
+    """
+    First number for generated names and slugs, past the existing rows
+    so they stay unique.
+    """
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _timeline(rng, count, start, days):
+    """
+    ``count`` increasing datetimes over ``days`` days from ``start``,
+    during opening hours.
+    """
+    hours = CLOSING_HOUR - OPENING_HOUR
+    openings = {}
+    for i in range(count):
+        position = (i + rng.random()) * days / count
+        day = int(position)
+        opening = openings.get(day)
+        if opening is None:
+            openings.clear()
+            opening = openings[day] = timezone.make_aware(
+                datetime.combine(start + timedelta(days=day), time(OPENING_HOUR))
+            )
+        yield opening + timedelta(hours=(position - day) * hours)
+
+
+def _batches(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def money(value):
+    return Decimal(value).quantize(CENT)
+
+
+class Generator:
+    """
+    Writes one synthetic data set; see the module docstring.
+
+    ``progress(label, done, total)`` is called after every batch.
+    """
+
+    def __init__(self, scale, seed=0, end=None, progress=None):
+        self.scale = scale
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.end = end or timezone.localdate()
+        self.start = self.end - timedelta(days=scale.days - 1)
+        self.progress = progress or (lambda label, done, total: None)
+        self.written = {}
+
+    def run(self):
+        category_ids = self.categories()
+        vendor_ids = self.vendors()
+        self.items(category_ids, vendor_ids)
+        self.customers()
+        self.sales()
+        self.purchases()
+        self.invoices()
+        self.refresh_derived_data()
+        return self.written
+
+    def _created(self, label, count):
+        self.written[label] = self.written.get(label, 0) + count
+
+    # Reference data
+
+    def categories(self):
+        number = _next_number(Category)
+        names = [
+            CATEGORY_NAMES[i % len(CATEGORY_NAMES)]
+            + (f' {i // len(CATEGORY_NAMES) + 1}' if i >= len(CATEGORY_NAMES) else '')
+            for i in range(self.scale.categories)
+        ]
+        rows = [
+            Category(name=name, slug=f'{slugify(name)}-{number + i}')
+            for i, name in enumerate(names)
+        ]
+        with _keep_values(Category, 'slug'):
+            Category.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        self._created('categories', len(rows))
+        self.progress('categories', len(rows), len(rows))
+        return [row.pk for row in rows]
+
+    def vendors(self):
+        rng = self.rng
+        number = _next_number(Vendor)
+        rows = []
+        for i in range(self.scale.vendors):
+            name = f'{rng.choice(FAMILY_NAMES)} {rng.choice(PRODUCT_WORDS)} Trading {number + i}'
+            rows.append(Vendor(
+                name=name[:50],
+                slug=slugify(name),
+                phone_number=int(f'28{rng.randrange(10 ** 8):08d}'),
+                address=rng.choice(DISTRICTS),
+            ))
+        with _keep_values(Vendor, 'slug'):
+            Vendor.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        self._created('vendors', len(rows))
+        self.progress('vendors', len(rows), len(rows))
+        return [row.pk for row in rows]
+
+    def items(self, category_ids, vendor_ids):
+        rng = self.rng
+        number = _next_number(Item)
+        vendors = Popularity(rng, vendor_ids)
+        rows = []
+        for i in range(self.scale.items):
+            name = f'{rng.choice(PRODUCT_WORDS)} {rng.choice(CATEGORY_NAMES)} {number + i}'
+            rows.append(Item(
+                name=name[:50],
+                slug=slugify(name),
+                description=f'{name} ({rng.choice(("each", "pack", "box", "bottle"))})',
+                # Log-normal prices: mostly cheap, a few expensive.
+                price=round(min(rng.lognormvariate(3, 1), 5000), 2),
+                quantity=rng.randrange(50, 5000),
+                category_id=rng.choice(category_ids),
+                vendor_id=vendors.draw(rng)[0],
+            ))
+        with _keep_values(Item, 'slug'):
+            for done, batch in enumerate(_batches(rows), 1):
+                Item.objects.bulk_create(batch)
+                self.progress('items', min(done * BATCH_SIZE, len(rows)), len(rows))
+        self._created('items', len(rows))
+        self.prices = {row.pk: row.price for row in rows}
+        self.item_vendors = {row.pk: row.vendor_id for row in rows}
+        self.popular_items = Popularity(rng, self.prices)
+
+    def _customer(self, number):
+        rng = self.rng
+        family, given = rng.choice(FAMILY_NAMES), rng.choice(GIVEN_NAMES)
+        # Distinct numbers: 7919 is prime to 10 ** 8.
+        digits = f'9{(number * 7919 + self.seed) % 10 ** 8:08d}'
+        phone = rng.choice((
+            f'0{digits}',
+            f'0{digits[:3]} {digits[3:6]} {digits[6:]}',
+            f'+84{digits}',
+        ))
+        email = None
+        if rng.random() < 0.4:
+            local = slugify(f"{given} {family}".replace('Đ', 'D').replace('đ', 'd'))
+            email = f"{local.replace('-', '.')}{number}@example.com"
+        customer = Customer(
+            first_name=given,
+            last_name=f'{family} {rng.choice(MIDDLE_NAMES)}',
+            phone=phone,
+            email=email,
+            address=rng.choice(DISTRICTS),
+            loyalty_points=int(rng.expovariate(1 / 50)),
+        )
+        customer.refresh_search_fields()
+        return customer
+
+    def customers(self):
+        number = _next_number(Customer)
+        total = self.scale.customers
+        ids = []
+        rows = (self._customer(number + i) for i in range(total))
+        for batch in _batches(rows):
+            Customer.objects.bulk_create(batch)
+            write_name_tokens(batch)
+            ids += [row.pk for row in batch]
+            self.progress('customers', len(ids), total)
+        self._created('customers', len(ids))
+        self.regulars = Popularity(self.rng, ids)
+
+    # Transactions
+
+    def _sale(self, date_added):
+        rng = self.rng
+        lines = {}
+        count = rng.choices(LINE_COUNTS, weights=LINE_WEIGHTS)[0]
+        for item_id in self.popular_items.draw(rng, count):
+            units = rng.choices(UNIT_COUNTS, weights=UNIT_WEIGHTS)[0]
+            lines[item_id] = lines.get(item_id, 0) + units
+        details = []
+        for item_id, quantity in lines.items():
+            price = money(self.prices[item_id])
+            details.append(SaleDetail(
+                item_id=item_id, price=price, quantity=quantity,
+                total_detail=price * quantity,
+            ))
+        sub_total = sum(detail.total_detail for detail in details)
+        tax_amount = money(sub_total * Decimal(TAX_PERCENTAGE) / 100)
+        grand_total = sub_total + tax_amount
+        # Paid in round amounts.
+        amount_paid = Decimal(math.ceil(grand_total / 10) * 10)
+        customer_id = None
+        if rng.random() < KNOWN_CUSTOMER_RATIO:
+            customer_id = self.regulars.draw(rng)[0]
+        sale = Sale(
+            date_added=date_added, customer_id=customer_id,
+            sub_total=sub_total, tax_amount=tax_amount,
+            tax_percentage=TAX_PERCENTAGE, grand_total=grand_total,
+            amount_paid=amount_paid, amount_change=amount_paid - grand_total,
+        )
+        return sale, details
+
+    def sales(self):
+        total = self.scale.sales
+        done = lines = 0
+        times = _timeline(self.rng, total, self.start, self.scale.days)
+        with _keep_values(Sale, 'date_added'):
+            for batch in _batches(self._sale(when) for when in times):
+                with transaction.atomic():
+                    Sale.objects.bulk_create([sale for sale, _ in batch])
+                    details = []
+                    for sale, sale_details in batch:
+                        for detail in sale_details:
+                            detail.sale_id = sale.pk
+                        details += sale_details
+                    SaleDetail.objects.bulk_create(details, batch_size=BATCH_SIZE)
+                done += len(batch)
+                lines += len(details)
+                self.progress('sales', done, total)
+        self._created('sales', done)
+        self._created('sale details', lines)
+
+    def _purchase(self, number, order_date):
+        rng = self.rng
+        item_id = self.popular_items.draw(rng)[0]
+        price = money(self.prices[item_id] * rng.uniform(0.55, 0.8))
+        quantity = rng.randrange(10, 200)
+        delivery_date = order_date + timedelta(hours=rng.randrange(12, 24 * 7))
+        delivered = delivery_date.date() < self.end
+        purchase = Purchase(
+            slug=f'{order_date:%Y-%m-%d-%H%M%S}-{number}',
+            order_date=order_date,
+            vendor_id=self.item_vendors[item_id],
+            item_id=item_id,
+            price=price,
+            quantity=quantity,
+            total_value=price * quantity,
+            delivery_status='S' if delivered else 'P',
+            delivery_date=delivery_date if delivered else None,
+        )
+        bill = None
+        if rng.random() < BILL_RATIO:
+            bill = Bill(
+                slug=f'bill-{number}',
+                payment_details=rng.choice(PAYMENT_DETAILS),
+                status=delivered and rng.random() < 0.9,
+            )
+        return purchase, bill
+
+    def purchases(self):
+        total = self.scale.purchases
+        number = _next_number(Purchase)
+        done = bills = 0
+        times = _timeline(self.rng, total, self.start, self.scale.days)
+        rows = (
+            self._purchase(number + i, when) for i, when in enumerate(times)
+        )
+        with _keep_values(Purchase, 'slug', 'order_date'), \
+                _keep_values(Bill, 'slug'):
+            for batch in _batches(rows):
+                with transaction.atomic():
+                    Purchase.objects.bulk_create([purchase for purchase, _ in batch])
+                    new_bills = []
+                    for purchase, bill in batch:
+                        if bill is not None:
+                            bill.purchase_id = purchase.pk
+                            new_bills.append(bill)
+                    Bill.objects.bulk_create(new_bills)
+                done += len(batch)
+                bills += len(new_bills)
+                self.progress('purchases', done, total)
+        self._created('purchases', done)
+        self._created('bills', bills)
+
+    def _invoice(self, number, date):
+        rng = self.rng
+        item_id = self.popular_items.draw(rng)[0]
+        price = round(self.prices[item_id], 2)
+        quantity = float(rng.choices(UNIT_COUNTS, weights=UNIT_WEIGHTS)[0])
+        shipping = float(rng.choice((0, 15, 25, 40)))
+        total = round(quantity * price, 2)
+        invoice = Invoice(
+            slug=f'{date:%Y-%m-%d-%H%M%S}-{number}',
+            date=date,
+            customer_id=self.regulars.draw(rng)[0],
+            item_id=item_id,
+            price_per_item=price,
+            quantity=quantity,
+            shipping=shipping,
+            total=total,
+            grand_total=round(total + shipping, 2),
+        )
+        delivery = None
+        if rng.random() < DELIVERY_RATIO:
+            date_created = date + timedelta(minutes=rng.randrange(5, 240))
+            delivery = Delivery(
+                location=rng.choice(DISTRICTS),
+                date_created=date_created,
+                is_delivered=(self.end - date_created.date()).days > 2,
+            )
+        return invoice, delivery
+
+    def invoices(self):
+        total = self.scale.invoices
+        number = _next_number(Invoice)
+        done = deliveries = 0
+        times = _timeline(self.rng, total, self.start, self.scale.days)
+        rows = (
+            self._invoice(number + i, when) for i, when in enumerate(times)
+        )
+        with _keep_values(Invoice, 'slug', 'date'), \
+                _keep_values(Delivery, 'date_created'):
+            for batch in _batches(rows):
+                with transaction.atomic():
+                    Invoice.objects.bulk_create([invoice for invoice, _ in batch])
+                    new_deliveries = []
+                    for invoice, delivery in batch:
+                        if delivery is not None:
+                            delivery.invoice_id = invoice.pk
+                            new_deliveries.append(delivery)
+                    Delivery.objects.bulk_create(new_deliveries)
+                done += len(batch)
+                deliveries += len(new_deliveries)
+                self.progress('invoices', done, total)
+        self._created('invoices', done)
+        self._created('deliveries', deliveries)
+
+    def refresh_derived_data(self):
+        """
+        Rebuilds what the skipped signals would have kept up to date.
+        """
+        rebuild_rollup(self.start, self.end)
+        search.rebuild_index()
+        catalog.invalidate()
+        dashboard.invalidate()
+
+
+def generate(scale, seed=0, end=None, progress=None):
+    """
+    Writes a synthetic data set; returns the rows written per kind.
+    """
+    return Generator(scale, seed, end, progress).run()
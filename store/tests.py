@@ -1,3 +1,484 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from InventoryMS.testing import QueryBudgetTestCase
+from accounts.models import Customer, Vendor
+from transactions.models import Sale
+from . import catalog, dashboard, export_jobs, exports, inventory, search
+from .inventory import InsufficientStock, apply_stock_changes, remove_stock
+from .models import Category, ExportCache, ExportJob, Item
+from .query_plans import PlanCheck, explain, problems
+from .views import SALES_EXPORT
+
+
+class StoreTestCase(TestCase):
+    """
+    A logged-in client and a few items.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.category = Category.objects.create(name='Drinks')
+        cls.vendor = Vendor.objects.create(name='Acme')
+        cls.items = [
+            Item.objects.create(
+                name=name, description='-', category=cls.category,
+                vendor=cls.vendor, quantity=10, price=price,
+            )
+            for name, price in [('Coffee', 2.5), ('Tea', 1.5), ('Water', 1.0)]
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+
+class ItemDetailsBatchTests(StoreTestCase):
+
+    def url(self, ids):
+        return reverse('item-details-batch') + f'?ids={ids}'
+
+    def test_returns_requested_items(self):
+        coffee, tea, _ = self.items
+        response = self.client.get(self.url(f'{tea.pk},{coffee.pk},0'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(set(data['items']), {str(coffee.pk), str(tea.pk)})
+        self.assertEqual(data['items'][str(coffee.pk)]['price'], 2.5)
+        self.assertEqual(data['missing'], [0])
+
+    def test_unchanged_items_revalidate_with_304(self):
+        url = self.url(f'{self.items[0].pk},{self.items[1].pk}')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_changed_item_gets_new_etag(self):
+        url = self.url(f'{self.items[0].pk},{self.items[1].pk}')
+        etag = self.client.get(url)['ETag']
+        item = self.items[1]
+        item.price = 9
+        item.save()
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_invalid_ids(self):
+        response = self.client.get(self.url('1,abc'))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {'error': 'ids must be comma-separated integers'}
+        )
+
+
+
+class StockChangeTests(StoreTestCase):
+
+    def stock(self):
+        return [item.quantity for item in Item.objects.order_by('name')]
+
+    def test_applies_every_change(self):
+        coffee, tea, water = self.items
+        apply_stock_changes([(coffee.pk, -3), (tea.pk, 2), (coffee.pk, -1)])
+        # Coffee, Tea, Water
+        self.assertEqual(self.stock(), [6, 12, 10])
+
+    def test_shortage_applies_nothing(self):
+        coffee, tea, water = self.items
+        with self.assertRaises(InsufficientStock) as raised:
+            apply_stock_changes([(coffee.pk, -4), (tea.pk, -11), (water.pk, 5)])
+        self.assertEqual(self.stock(), [10, 10, 10])
+        self.assertEqual(raised.exception.failures, [{
+            'item_id': tea.pk, 'name': 'Tea', 'requested': 11, 'available': 10,
+        }])
+
+    def test_lines_of_an_item_are_added_up(self):
+        coffee = self.items[0]
+        with self.assertRaises(InsufficientStock):
+            remove_stock([(coffee.pk, 6), (coffee.pk, 6)])
+        self.assertEqual(self.stock(), [10, 10, 10])
+
+    def test_missing_item(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            remove_stock([(self.items[0].pk, 1), (0, 1)])
+        self.assertEqual(raised.exception.failures, [{
+            'item_id': 0, 'name': None, 'requested': 1, 'available': None,
+        }])
+        self.assertEqual(self.stock(), [10, 10, 10])
+
+    def test_shortage_in_a_later_chunk_rolls_back_earlier_ones(self):
+        coffee, tea, water = self.items
+        with mock.patch.object(inventory, 'BATCH_SIZE', 1):
+            with self.assertRaises(InsufficientStock):
+                remove_stock([(coffee.pk, 1), (tea.pk, 1), (water.pk, 11)])
+        self.assertEqual(self.stock(), [10, 10, 10])
+
+
+
+class QueryPlanTests(TestCase):
+
+    def test_every_plan_uses_an_index(self):
+        out = io.StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('query plans use indexes', out.getvalue())
+
+    def plan_problems(self, queryset, **allow):
+        check = PlanCheck('test', lambda: queryset, **allow)
+        alias, sql, params, limited = check.sql()
+        plan = explain(alias, sql, params)
+        return problems(connection.vendor, plan, check, limited)
+
+    def test_reports_scans_and_sorts(self):
+        unindexed = Item.objects.filter(description='x').order_by('price')
+        self.assertTrue(self.plan_problems(unindexed))
+        self.assertEqual(
+            self.plan_problems(unindexed, allow_scan={'store_item'}, allow_sort=True),
+            [],
+        )
+        self.assertEqual(self.plan_problems(Item.objects.filter(pk=1)), [])
+
+
+
+# With INVENTORY_DB_ENGINE=postgresql the SQLite database is 'sqlite'.
+COPY_FROM_SQLITE = 'sqlite' in settings.DATABASES and connection.vendor == 'postgresql'
+
+
+@unittest.skipUnless(COPY_FROM_SQLITE, "needs INVENTORY_DB_ENGINE=postgresql")
+class CopySqliteToPostgresTests(TransactionTestCase):
+    # The runner sets up the databases of skipped classes too.
+    databases = {'default', 'sqlite'} if COPY_FROM_SQLITE else {'default'}
+
+    def test_copies_rows_and_keys(self):
+        # bulk_create: no signals writing to the default database.
+        category = Category.objects.using('sqlite').bulk_create([
+            Category(pk=7, name='Drinks', slug='drinks'),
+        ])[0]
+        Item.objects.using('sqlite').bulk_create([
+            Item(pk=pk, name=name, slug=name.lower(), description='-',
+                 category=category, quantity=3, price=2)
+            for pk, name in [(4, 'Coffee'), (9, 'Tea')]
+        ])
+
+        call_command('copy_sqlite_to_postgres', interactive=False, stdout=io.StringIO())
+
+        self.assertEqual(
+            list(Item.objects.order_by('pk').values_list('pk', 'name', 'category_id')),
+            [(4, 'Coffee', 7), (9, 'Tea', 7)],
+        )
+        self.assertEqual(search.search_item_ids(['cof'], using='default'), [4])
+        # Sequences continue after the copied keys.
+        self.assertGreater(Category.objects.create(name='Snacks').pk, 7)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "SQLite FTS5 index")
+class SearchTests(StoreTestCase):
+
+    def ids(self, query):
+        return search.search_item_ids(search.query_terms(query))
+
+    def add(self, name, description='-'):
+        return Item.objects.create(
+            name=name, description=description, category=self.category,
+            quantity=1, price=1,
+        )
+
+    def test_ignores_diacritics(self):
+        item = self.add('Cà phê sữa đá')
+        self.assertEqual(self.ids('ca phe'), [item.pk])
+        self.assertEqual(self.ids('CÀ PHÊ'), [item.pk])
+
+    def test_every_term_is_a_prefix(self):
+        item = self.add('Caramel latte')
+        self.assertEqual(self.ids('cara lat'), [item.pk])
+        self.assertEqual(self.ids('cara tea'), [])
+        self.assertEqual(self.ids('aramel'), [])
+
+    def test_name_matches_rank_first(self):
+        kettle = self.add('Kettle', description='For tea and coffee')
+        tea = self.items[1]
+        self.assertEqual(self.ids('tea'), [tea.pk, kettle.pk])
+        self.assertEqual(
+            list(search.search_items(Item.objects.all(), 'tea')), [tea, kettle]
+        )
+
+    def test_index_follows_item_changes(self):
+        coffee = self.items[0]
+        coffee.name = 'Espresso'
+        coffee.save()
+        self.assertEqual(self.ids('espresso'), [coffee.pk])
+        self.assertEqual(self.ids('coffee'), [])
+        coffee.delete()
+        self.assertEqual(self.ids('espresso'), [])
+
+    def test_index_follows_category_and_vendor_renames(self):
+        self.category.name = 'Beverages'
+        self.category.save()
+        self.vendor.name = 'Globex'
+        self.vendor.save()
+        self.assertEqual(set(self.ids('bever')), {item.pk for item in self.items})
+        self.assertEqual(set(self.ids('globex')), {item.pk for item in self.items})
+
+    def test_search_page(self):
+        response = self.client.get(reverse('item_search_list_view'), {'q': 'wat'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page_obj']), [self.items[2]])
+
+
+class DashboardInvalidationTests(StoreTestCase):
+
+    def test_invalidated_after_commit(self):
+        version = dashboard._version()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Category.objects.create(name='Snacks')
+        self.assertEqual(dashboard._version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(dashboard._version(), version)
+
+
+class CatalogTests(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Each test starts without a loaded catalog.
+        self.enterContext(mock.patch.object(catalog, '_catalog', None))
+
+    def names(self, query, limit=10):
+        return [record.name for record in catalog.load().search(query, limit)]
+
+    def test_search_matches_token_prefixes(self):
+        Item.objects.create(name='Cà phê sữa', description='-', category=self.category, quantity=1, price=2)
+        self.assertEqual(self.names('ca'), ['Cà phê sữa'])
+        self.assertEqual(self.names('PHE su'), ['Cà phê sữa'])
+        self.assertEqual(self.names('phe tea'), [])
+        self.assertEqual(self.names('ffee'), [])
+        # Category tokens match too; results come in the database's name order.
+        self.assertEqual(self.names('dri', limit=2), ['Coffee', 'Cà phê sữa'])
+        self.assertEqual(self.names('', limit=2), ['Coffee', 'Cà phê sữa'])
+
+    def test_reloaded_after_invalidate(self):
+        loaded = catalog.get_catalog()
+        Item.objects.filter(pk=self.items[0].pk).update(price=9)
+        self.assertIs(catalog.get_catalog(), loaded)
+        catalog.invalidate()
+        reloaded = catalog.get_catalog()
+        self.assertIsNot(reloaded, loaded)
+        self.assertEqual(reloaded.get(self.items[0].pk).price, 9)
+
+    def test_reloaded_after_max_age(self):
+        loaded = catalog.get_catalog()
+        loaded.loaded_at -= catalog.CATALOG_MAX_AGE + 1
+        self.assertIsNot(catalog.get_catalog(), loaded)
+
+    def test_item_details_stock_is_live(self):
+        coffee = self.items[0]
+        catalog.get_catalog()
+        Item.objects.filter(pk=coffee.pk).update(quantity=3)
+        response = self.client.get(reverse('get_item_details', args=[coffee.pk]))
+        self.assertEqual(response.json(), {'price': 2.5, 'stock': 3})
+        response = self.client.get(reverse('get_item_details', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalidated_after_commit(self):
+        version = catalog._current_version()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            item = self.items[0]
+            item.price = 3
+            item.save()
+        self.assertEqual(catalog._current_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(catalog._current_version(), version)
+
+
+class XlsxExportTests(StoreTestCase):
+
+    def load(self, content):
+        return openpyxl.load_workbook(io.BytesIO(content)).active
+
+    def test_products_download(self):
+        Item.objects.create(name='Juice', description='-', category=self.category, quantity=0, price=3)
+        response = self.client.get(reverse('export_products'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], exports.XLSX_CONTENT_TYPE)
+        self.assertEqual(
+            response['Content-Disposition'], 'attachment; filename="List_Products.xlsx"'
+        )
+        sheet = self.load(b''.join(response.streaming_content))
+        response.close()
+
+        self.assertEqual(sheet.title, 'Products')
+        rows = list(sheet.values)
+        self.assertEqual(rows[0], ('ID', 'Name', 'Category', 'Quantity', 'Price', 'Vendor'))
+        self.assertTrue(all(cell.font.bold for cell in sheet[1]))
+        self.assertEqual(
+            [row[1:] for row in rows[1:]],
+            [('Coffee', 'Drinks', 10, 2.5, 'Acme'), ('Tea', 'Drinks', 10, 1.5, 'Acme'),
+             ('Water', 'Drinks', 10, 1, 'Acme'), ('Juice', 'Drinks', 0, 3, '-')],
+        )
+        # Widest of the header and the values, plus 2.
+        self.assertEqual(sheet.column_dimensions['B'].width, len('Coffee') + 2)
+        self.assertEqual(sheet.column_dimensions['D'].width, len('Quantity') + 2)
+
+    def test_long_values_are_capped_and_rows_past_the_sample_written(self):
+        rows = [['x' * 100]] + [[str(i)] for i in range(exports.WIDTH_SAMPLE_SIZE + 10)]
+        content = io.BytesIO()
+        exports.write_xlsx(content, 'Long', ['Value'], iter(rows))
+        sheet = self.load(content.getvalue())
+        self.assertEqual(sheet.column_dimensions['A'].width, exports.MAX_COLUMN_WIDTH)
+        self.assertEqual(sheet.max_row, len(rows) + 1)
+
+
+class ExportJobTests(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        self.export_root = export_root.name
+        self.enterContext(override_settings(EXPORT_ROOT=self.export_root))
+
+    def test_file_is_written_to_export_root(self):
+        job = ExportJob.objects.create(export='sales', requested_by=self.user)
+        export_jobs.run_job(job)
+        self.assertEqual(job.status, 'D')
+        self.assertTrue(os.path.exists(os.path.join(self.export_root, job.file.name)))
+
+        response = self.client.get(reverse('export-job-download', args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Content-Disposition'))
+        response.close()
+
+    def test_failed_count_fails_the_job(self):
+        job = ExportJob.objects.create(export='sales', requested_by=self.user)
+        export = mock.Mock(**{'queryset.count.side_effect': RuntimeError('no replica')})
+        with mock.patch.object(export_jobs, 'get_export', return_value=export), \
+                self.assertLogs('store.export_jobs'):
+            export_jobs.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'F')
+        self.assertEqual(job.error, 'no replica')
+
+
+
+class IncrementalExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(first_name='An', last_name='Ng', phone='0912345678')
+        for _ in range(3):
+            cls.add_sale()
+
+    @classmethod
+    def add_sale(cls):
+        return Sale.objects.create(customer=cls.customer, sub_total=10, grand_total=10, amount_paid=10)
+
+    def setUp(self):
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        self.enterContext(override_settings(EXPORT_ROOT=export_root.name))
+
+    def sheet_rows(self, path):
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return [row for row in workbook.active.values][1:]
+        finally:
+            workbook.close()
+
+    def cache(self):
+        return ExportCache.objects.get(name=SALES_EXPORT.cache_name)
+
+    def test_unchanged_table_reuses_the_file(self):
+        path = SALES_EXPORT.cached_file()
+        self.assertEqual(len(self.sheet_rows(path)), 3)
+        self.assertEqual(SALES_EXPORT.cached_file(), path)
+
+    def test_new_rows_are_appended(self):
+        SALES_EXPORT.cached_file()
+        built = self.cache().date_built
+        sale = self.add_sale()
+        with mock.patch.object(SALES_EXPORT, '_build', wraps=SALES_EXPORT._build) as build:
+            rows = self.sheet_rows(SALES_EXPORT.cached_file())
+        self.assertEqual([row[0] for row in rows][-1], sale.pk)
+        self.assertEqual(len(rows), 4)
+        # Built from the cached rows plus the new one, not re-read.
+        self.assertEqual(self.cache().date_built, built)
+        self.assertEqual(build.call_count, 1)
+
+    def test_deleted_rows_rebuild(self):
+        SALES_EXPORT.cached_file()
+        built = self.cache().date_built
+        Sale.objects.order_by('pk').first().delete()
+        self.add_sale()
+        self.assertEqual(len(self.sheet_rows(SALES_EXPORT.cached_file())), 3)
+        self.assertGreater(self.cache().date_built, built)
+
+    def test_edited_customer_rebuilds(self):
+        path = SALES_EXPORT.cached_file()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.first_name = 'Binh'
+            self.customer.save()
+            # Bumped once per transaction.
+            self.customer.save()
+        rows = self.sheet_rows(SALES_EXPORT.cached_file())
+        self.assertEqual({row[2] for row in rows}, {'Binh Ng - 0912345678'})
+        self.assertEqual(self.cache().version, 1)
+        self.assertEqual(self.cache().built_version, 1)
+        self.assertNotEqual(SALES_EXPORT.cached_file(), path)
+
+    def test_old_copy_is_rebuilt(self):
+        path = SALES_EXPORT.cached_file()
+        ExportCache.objects.update(date_built=timezone.now() - timedelta(days=2))
+        self.assertNotEqual(SALES_EXPORT.cached_file(), path)
+        self.assertGreater(self.cache().date_built, timezone.now() - timedelta(minutes=1))
+
+
+@unittest.skipUnless(settings.SERVE_MEDIA, "media is not served")
+class MediaTests(TestCase):
+
+    def test_profile_pictures_are_served(self):
+        response = self.client.get(settings.MEDIA_URL + 'profile_pics/Steve.jpg')
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_media_is_not_served(self):
+        for path in ['logo/favicon.png', 'exports/report.xlsx']:
+            with self.subTest(path=path):
+                response = self.client.get(settings.MEDIA_URL + path)
+                self.assertEqual(response.status_code, 404)
+
+    def test_no_escape_from_profile_pictures(self):
+        response = self.client.get(settings.MEDIA_URL + 'profile_pics/../logo/favicon.png')
+        self.assertIn(response.status_code, (400, 404))
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    def test_pages(self):
+        self.assertPagesLoad(*[
+            reverse(name)
+            for name in ['dashboard', 'productslist', 'deliveries', 'category-list']
+        ])
+
+    def test_item_lookups(self):
+        ids = ','.join(str(pk) for pk in Item.objects.values_list('pk', flat=True)[:10])
+        response = self.client.get(reverse('item-details-batch') + f'?ids={ids}')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(
+            reverse('get_items'), {'term': 'a'},
+            headers={'X-Requested-With': 'XMLHttpRequest'},
+        )
+        self.assertEqual(response.status_code, 200)
@@ -1,7 +1,10 @@
+import os
+import re
+
 # Django core imports
-from django.urls import path
+from django.urls import path, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from django.views.static import serve
 
 # Local app imports
 from . import views
@@ -142,17 +145,55 @@ urlpatterns = [
         views.get_item_details,
         name='get_item_details'
     ),
+    path(
+        'item-details/',
+        views.item_details_batch,
+        name='item-details-batch'
+    ),
 
     path(
         'export-deliveries/', 
         views.export_deliveries, 
         name='export_deliveries'
     ),
+
+    # Background export jobs
+    path(
+        'export-jobs/<str:export>/new/',
+        views.export_job_create,
+        name='export-job-create'
+    ),
+    path(
+        'export-jobs/<int:pk>/',
+        views.export_job_status,
+        name='export-job-status'
+    ),
+    path(
+        'export-jobs/<int:pk>/download/',
+        views.export_job_download,
+        name='export-job-download'
+    ),
+
+    # Request profiles (staff)
+    path(
+        'profiles/',
+        views.request_profiles,
+        name='request-profiles'
+    ),
+    path(
+        'profiles/<str:name>/',
+        views.request_profile,
+        name='request-profile'
+    ),
 ]
 
-# Static media files configuration for development
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT
-    )
+# Uploaded media: only the profile pictures are public. Exports are
+# downloaded through their views, which check the user.
+if settings.SERVE_MEDIA:
+    urlpatterns += [
+        re_path(
+            r'^%sprofile_pics/(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+            serve,
+            {'document_root': os.path.join(settings.MEDIA_ROOT, 'profile_pics')}
+        ),
+    ]
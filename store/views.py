@@ -11,19 +11,24 @@ and querying functionalities.
 """
 
 # Standard library imports
+import hashlib
 import operator
 from functools import reduce
 
 # Django core imports
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 from django.urls import reverse, reverse_lazy
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST
+from django.http import JsonResponse, FileResponse, Http404
+from django.views.decorators.http import condition, require_POST
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q, Count, Sum
+from django.db.models import Q
+from django.utils.decorators import method_decorator
+from django.utils.dateparse import parse_date
+from django.conf import settings
 
 # Authentication and permissions
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.mixins import PermissionRequiredMixin
 # Class-based views
@@ -38,62 +43,57 @@ import django_tables2 as tables
 from django_tables2.export.views import ExportMixin
 
 # Local app imports
-from accounts.models import Profile, Vendor
 from transactions.models import Sale
-from .models import Category, Item, Delivery
+from transactions.rollups import PERIODS as SALES_PERIODS
+from .models import Category, Item, Delivery, ExportJob, EXPORT_CHOICES
 from .forms import ItemForm, CategoryForm, DeliveryForm
 from .tables import ItemTable
-
-import openpyxl
-
+from .exports import XlsxExport, IncrementalXlsxExport
+from . import dashboard as dashboard_metrics
+from .search import search_items
+from .catalog import get_catalog
+from InventoryMS.db import read_from_replica
+from InventoryMS.pagination import KeysetPaginationMixin
+from InventoryMS.querycount import query_budget
+from InventoryMS import profiling
+
+@query_budget(12)
 @login_required
+@read_from_replica
 def dashboard(request):
-    profiles = Profile.objects.all()
-    Category.objects.annotate(nitem=Count("item"))
-    items = Item.objects.all()
-    total_items = (
-        Item.objects.all()
-        .aggregate(Sum("quantity"))
-        .get("quantity__sum", 0.00)
-    )
-    items_count = items.count()
-    profiles_count = profiles.count()
-
-    # Prepare data for charts
-    category_counts = Category.objects.annotate(
-        item_count=Count("item")
-    ).values("name", "item_count")
-    categories = [cat["name"] for cat in category_counts]
-    category_counts = [cat["item_count"] for cat in category_counts]
-
-    sale_dates = (
-        Sale.objects.values("date_added__date")
-        .annotate(total_sales=Sum("grand_total"))
-        .order_by("date_added__date")
+    # Counters and charts come from the cached metrics provider
+    period = request.GET.get("period", "day")
+    if period not in SALES_PERIODS:
+        period = "day"
+    start = _parse_day(request.GET.get("start"))
+    end = _parse_day(request.GET.get("end"))
+    sale_dates_labels, sale_dates_values = dashboard_metrics.sales_chart(
+        period, start, end
     )
-    sale_dates_labels = [
-        date["date_added__date"].strftime("%Y-%m-%d") for date in sale_dates
-    ]
-    sale_dates_values = [float(date["total_sales"]) for date in sale_dates]
 
     context = {
-        "items": items,
-        "profiles": profiles,
-        "profiles_count": profiles_count,
-        "items_count": items_count,
-        "total_items": total_items,
-        "vendors": Vendor.objects.all(),
-        "delivery": Delivery.objects.all(),
-        "sales": Sale.objects.all(),
-        "categories": categories,
-        "category_counts": category_counts,
+        **dashboard_metrics.tiles(),
         "sale_dates_labels": sale_dates_labels,
         "sale_dates_values": sale_dates_values,
+        "sales_periods": list(SALES_PERIODS),
+        "sales_period": period,
+        "sales_start": start,
+        "sales_end": end,
     }
     return render(request, "store/dashboard.html", context)
 
 
-class ProductListView(LoginRequiredMixin, ExportMixin, tables.SingleTableView):
+def _parse_day(value):
+    try:
+        return parse_date(value or "")
+    except ValueError:
+        return None
+
+
+@query_budget(10)
+@method_decorator(read_from_replica, name='dispatch')
+class ProductListView(LoginRequiredMixin, KeysetPaginationMixin, ExportMixin,
+                      tables.SingleTableView):
     """
     View class to display a list of products.
 
@@ -106,6 +106,7 @@ class ProductListView(LoginRequiredMixin, ExportMixin, tables.SingleTableView):
     """
 
     model = Item
+    queryset = Item.objects.select_related('category', 'vendor')
     table_class = ItemTable
     template_name = "store/productslist.html"
     context_object_name = "items"
@@ -124,19 +125,14 @@ class ItemSearchListView(ProductListView):
     """
 
     paginate_by = 10
+    # Results are ranked, not keyed: OFFSET over at most SEARCH_LIMIT rows
+    keyset_ordering = None
 
     def get_queryset(self):
         result = super(ItemSearchListView, self).get_queryset()
 
-        query = self.request.GET.get("q")
-        if query:
-            query_list = query.split()
-            result = result.filter(
-                reduce(
-                    operator.and_, (Q(name__icontains=q) for q in query_list)
-                )
-            )
-        return result
+        # Ranked full-text match on name, description, category, vendor
+        return search_items(result, self.request.GET.get("q"))
 
 
 class ProductDetailView(LoginRequiredMixin, FormMixin, DetailView):
@@ -226,6 +222,8 @@ class ProductDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView)
             return False
 
 
+@query_budget(10)
+@method_decorator(read_from_replica, name='dispatch')
 class DeliveryListView(
     LoginRequiredMixin, ExportMixin, tables.SingleTableView
 ):
@@ -240,6 +238,7 @@ class DeliveryListView(
     """
 
     model = Delivery
+    queryset = Delivery.objects.select_related('invoice__customer')
     pagination = 10
     template_name = "store/deliveries.html"
     context_object_name = "deliveries"
@@ -339,6 +338,8 @@ class DeliveryDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView
             return False
 
 
+@query_budget(10)
+@method_decorator(read_from_replica, name='dispatch')
 class CategoryListView(LoginRequiredMixin, ListView):
     model = Category
     template_name = 'store/category_list.html'
@@ -388,6 +389,7 @@ def is_ajax(request):
     return request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
 
 
+@query_budget(6)
 @csrf_exempt
 @require_POST
 @login_required
@@ -397,8 +399,8 @@ def get_items_ajax_view(request):
             term = request.POST.get("term", "")
             data = []
 
-            items = Item.objects.filter(name__icontains=term)
-            for item in items[:10]:
+            # Served from the in-process catalog, no queries
+            for item in get_catalog().search(term, limit=10):
                 data.append(item.to_json())
 
             return JsonResponse(data, safe=False)
@@ -407,248 +409,328 @@ def get_items_ajax_view(request):
     return JsonResponse({'error': 'Not an AJAX request'}, status=400)
 
 @login_required
+@read_from_replica
 def export_products(request):
-    # 1. Tạo file Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="List_Products.xlsx"'
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Products"
-
-    # 2. Tạo tiêu đề cột (Header)
-    columns = ['ID', 'Name', 'Category', 'Quantity', 'Price', 'Vendor']
-    ws.append(columns)
-
-    # In đậm tiêu đề
-    header_font = openpyxl.styles.Font(bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-
-    # 3. Lấy dữ liệu
-    rows = Item.objects.all().select_related('category', 'vendor').order_by('id')
-
-    for item in rows:
-        # Xử lý Category và Vendor (Lấy tên)
-        cat_name = item.category.name if item.category else "-"
-        ven_name = item.vendor.name if item.vendor else "-"
-        
-        # Xử lý ngày hết hạn
-        exp_date = "-"
-        # if item.expiring_date:
-        #      exp_date = item.expiring_date.strftime('%d/%m/%Y')
-
-        # Ghi dòng dữ liệu
-        ws.append([
-            item.id,
-            item.name,
-            cat_name,
-            item.quantity,
-            item.price,
-            # exp_date,
-            ven_name
-        ])
-
-    # 4. Chỉnh độ rộng cột tự động
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-
-    wb.save(response)
-    return response
+    return PRODUCTS_EXPORT.response()
+
+
+def _format_product_row(row):
+    item_id, name, category, quantity, price, vendor = row
+    return [item_id, name, category or "-", quantity, price, vendor or "-"]
+
+
+PRODUCTS_EXPORT = XlsxExport(
+    filename="List_Products.xlsx",
+    title="Products",
+    columns=['ID', 'Name', 'Category', 'Quantity', 'Price', 'Vendor'],
+    queryset=Item.objects.order_by('id'),
+    fields=('id', 'name', 'category__name', 'quantity', 'price', 'vendor__name'),
+    format_row=_format_product_row,
+)
+
 
 @login_required
+@read_from_replica
 def export_sales(request):
     """
     Export danh sách đơn hàng (Y chang giao diện Web)
     """
-    # 1. Tạo file Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="Sales_List.xlsx"'
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Sales"
-
-    # 2. Định nghĩa Header (Khớp với các cột trong ảnh bạn gửi)
-    columns = [
-        'ID', 
-        'Date', 
-        'Customer', 
-        'Sub Total', 
-        'Grand Total', 
-        'Tax Amount', 
-        'Tax Percentage', 
-        'Amount Paid', 
-        'Amount Change'
+    return SALES_EXPORT.response()
+
+
+def _format_sale_row(row):
+    (sale_id, date_added, customer_id, first_name, last_name, phone,
+     sub_total, grand_total, tax_amount, tax_percentage,
+     amount_paid, amount_change) = row
+
+    # Format y hệt trên web: YYYY-MM-DD HH:MM:SS
+    sale_date = date_added.strftime('%Y-%m-%d %H:%M:%S') if date_added else "-"
+
+    # Hiển thị kiểu: "Tên - SĐT"
+    if customer_id:
+        customer_str = f"{first_name} {last_name} - {phone or ''}"
+    else:
+        customer_str = "None"
+
+    return [
+        sale_id,
+        sale_date,
+        customer_str,
+        sub_total,
+        grand_total,
+        tax_amount,
+        tax_percentage,
+        amount_paid,
+        amount_change
     ]
-    ws.append(columns)
-
-    # Format Header in đậm
-    header_font = openpyxl.styles.Font(bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-
-    # 3. Query dữ liệu
-    # Dùng select_related('customer') để lấy thông tin khách nhanh hơn
-    rows = Sale.objects.all().select_related('customer').order_by('date_added')
-
-    for sale in rows:
-        # -- Xử lý ngày tháng --
-        sale_date = "-"
-        if sale.date_added:
-            # Format y hệt trong ảnh: YYYY-MM-DD HH:MM:SS
-            sale_date = sale.date_added.strftime('%Y-%m-%d %H:%M:%S')
-
-        # -- Xử lý tên khách hàng --
-        # Trong ảnh bạn hiển thị kiểu: "Tên - SĐT"
-        customer_obj = sale.customer
-        if customer_obj:
-            customer_str = f"{customer_obj.first_name} {customer_obj.last_name} - {getattr(customer_obj, 'phone', '')}"
-        else:
-            customer_str = "None"
-
-        # -- Ghi dòng dữ liệu --
-        ws.append([
-            sale.id,
-            sale_date,
-            customer_str,
-            sale.sub_total,
-            sale.grand_total,
-            sale.tax_amount,
-            sale.tax_percentage,
-            sale.amount_paid,
-            sale.amount_change
-        ])
-
-    # 4. Auto-fit độ rộng cột cho đẹp
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-
-    wb.save(response)
-    return response
+
+
+SALES_EXPORT = IncrementalXlsxExport(
+    filename="Sales_List.xlsx",
+    title="Sales",
+    columns=[
+        'ID',
+        'Date',
+        'Customer',
+        'Sub Total',
+        'Grand Total',
+        'Tax Amount',
+        'Tax Percentage',
+        'Amount Paid',
+        'Amount Change'
+    ],
+    queryset=Sale.objects.order_by('date_added', 'id'),
+    fields=(
+        'id', 'date_added', 'customer_id', 'customer__first_name',
+        'customer__last_name', 'customer__phone', 'sub_total',
+        'grand_total', 'tax_amount', 'tax_percentage', 'amount_paid',
+        'amount_change'
+    ),
+    format_row=_format_sale_row,
+    watermark='date_added',
+)
+
 
 @login_required
 def get_item_details(request, item_id):
+    # The sale page checks stock here: read it live (one primary key
+    # lookup), not from the catalog, whose stock can be minutes old.
+    item = Item.objects.filter(pk=item_id).values('price', 'quantity').first()
+    if item is None:
+        return JsonResponse({'error': 'Item not found'}, status=404)
+    data = {
+        'price': item['price'],
+        'stock': item['quantity'],
+    }
+    return JsonResponse(data)
+
+
+# Most item ids accepted by item_details_batch
+ITEM_DETAILS_MAX_IDS = 500
+
+
+def _requested_item_ids(request):
+    """
+    Returns the sorted, de-duplicated ids of ``?ids=1,2,3``.
+    Raises ValueError on anything else.
+    """
     try:
-        item = Item.objects.get(id=item_id)
-        data = {
-            'price': item.price,
-            # Có thể thêm các thông tin khác nếu cần sau này (vd: tồn kho)
+        ids = {
+            int(value) for value in request.GET.get("ids", "").split(",")
+            if value
         }
-        return JsonResponse(data)
-    except Item.DoesNotExist:
-        return JsonResponse({'error': 'Item not found'}, status=404)
-    
+    except ValueError:
+        raise ValueError("ids must be comma-separated integers")
+    if not ids:
+        raise ValueError("No item ids given")
+    if len(ids) > ITEM_DETAILS_MAX_IDS:
+        raise ValueError(f"At most {ITEM_DETAILS_MAX_IDS} item ids per request")
+    return sorted(ids)
+
+
+def _item_details_etag(request):
+    try:
+        ids = _requested_item_ids(request)
+    except ValueError:
+        return None
+    versions = Item.objects.filter(pk__in=ids).order_by("pk").values_list(
+        "pk", "version"
+    )
+    digest = hashlib.sha1(usedforsecurity=False)
+    digest.update(",".join(map(str, ids)).encode())
+    for pk, version in versions:
+        digest.update(f";{pk}:{version}".encode())
+    return digest.hexdigest()
+
+
+@query_budget(6)
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_item_details_etag)
+def item_details_batch(request):
+    """
+    Returns name, price and stock for ``?ids=1,2,3`` in one response.
+
+    The strong ETag changes whenever one of the items changes (its
+    ``version``), so terminals revalidate with If-None-Match and get a
+    304 without a body while nothing changed.
+    """
+    try:
+        ids = _requested_item_ids(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    items = {
+        str(pk): {"name": name, "price": price, "stock": quantity}
+        for pk, name, price, quantity in Item.objects.filter(
+            pk__in=ids
+        ).values_list("pk", "name", "price", "quantity")
+    }
+    missing = [pk for pk in ids if str(pk) not in items]
+    return JsonResponse({"items": items, "missing": missing})
+
+
+@login_required
+@read_from_replica
 def export_deliveries(request):
     """
-    Export danh sách Delivery chuẩn đẹp (xử lý cả Sale và Invoice)
+    Export danh sách Delivery (mỗi delivery gắn với một Invoice)
     """
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="Deliveries_List.xlsx"'
+    return DELIVERIES_EXPORT.response()
+
+
+def _format_delivery_row(row):
+    (delivery_id, invoice_id, customer_id, first_name, last_name, phone,
+     address, location, date_created, is_delivered) = row
+
+    cust_name = "Guest"
+    cust_phone = "-"
+    cust_address_db = "-"  # Địa chỉ lưu trong bảng Customer
+    if customer_id:
+        cust_name = f"{first_name} {last_name}"
+        cust_phone = phone or "-"
+        cust_address_db = address or "-"
+
+    # Ưu tiên Location riêng -> Địa chỉ khách
+    final_address = cust_address_db
+    if location:
+        final_address = location
+    elif final_address == "-":
+        final_address = "Chưa có địa chỉ"
+
+    date_str = date_created.strftime('%d/%m/%Y %H:%M') if date_created else "-"
+    status = "Delivered" if is_delivered else "Pending"
+
+    return [
+        delivery_id,
+        f"Invoice #{invoice_id}" if invoice_id else "-",
+        cust_name,
+        cust_phone,
+        final_address,
+        date_str,
+        status
+    ]
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Deliveries"
 
-    # 1. Định nghĩa Header
-    columns = [
-        'ID', 
-        'Order Reference', # Tên đơn (Sale #.. hoặc Invoice #..)
-        'Customer Name', 
-        'Contact Number', 
-        'Address',         # Địa chỉ (đã xử lý logic)
-        'Delivery Date', 
+DELIVERIES_EXPORT = XlsxExport(
+    filename="Deliveries_List.xlsx",
+    title="Deliveries",
+    columns=[
+        'ID',
+        'Order Reference',
+        'Customer Name',
+        'Contact Number',
+        'Address',
+        'Delivery Date',
         'Status'
-    ]
-    ws.append(columns)
-
-    # Format Header in đậm
-    header_font = openpyxl.styles.Font(bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-
-    # 2. Query dữ liệu
-    # Dùng select_related để lấy hết thông tin liên quan trong 1 lần query
-    rows = Delivery.objects.all().select_related(
-        'sale', 'invoice', 
-        'sale__customer', 'invoice__customer'
-    ).order_by('-id')
-
-    for delivery in rows:
-        # --- A. Xác định nguồn đơn (Sale hay Invoice) và Khách hàng ---
-        order_ref = "-"
-        customer = None
-        
-        if delivery.sale:
-            order_ref = f"Sale #{delivery.sale.id}"
-            customer = delivery.sale.customer
-        elif delivery.invoice:
-            order_ref = f"Invoice #{delivery.invoice.id}"
-            customer = delivery.invoice.customer
-
-        # --- B. Lấy thông tin Khách hàng ---
-        cust_name = "Guest"
-        cust_phone = "-"
-        cust_address_db = "-" # Địa chỉ lưu trong bảng Customer
-
-        if customer:
-            cust_name = f"{customer.first_name} {customer.last_name}"
-            cust_phone = customer.phone if customer.phone else "-"
-            cust_address_db = customer.address if customer.address else "-"
-
-        # --- C. Xử lý Logic Địa chỉ (Ưu tiên Location riêng -> Địa chỉ khách) ---
-        final_address = cust_address_db
-        if delivery.location:
-            final_address = delivery.location
-        elif final_address == "-":
-            final_address = "Chưa có địa chỉ"
-
-        # --- D. Xử lý Ngày tháng & Trạng thái ---
-        date_str = delivery.date_created.strftime('%d/%m/%Y %H:%M') if delivery.date_created else "-"
-        status = "Delivered" if delivery.is_delivered else "Pending"
-
-        # --- E. Ghi dòng dữ liệu ---
-        ws.append([
-            delivery.id,
-            order_ref,
-            cust_name,
-            cust_phone,
-            final_address,
-            date_str,
-            status
-        ])
-
-    # 3. Auto-fit độ rộng cột
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-
-    wb.save(response)
-    return response
\ No newline at end of file
+    ],
+    queryset=Delivery.objects.order_by('-id'),
+    fields=(
+        'id', 'invoice_id', 'invoice__customer_id',
+        'invoice__customer__first_name', 'invoice__customer__last_name',
+        'invoice__customer__phone', 'invoice__customer__address',
+        'location', 'date_created', 'is_delivered'
+    ),
+    format_row=_format_delivery_row,
+)
+
+
+def _export_job_json(job):
+    data = {
+        'id': job.id,
+        'export': job.export,
+        'status': job.get_status_display(),
+        'rows_total': job.rows_total,
+        'rows_written': job.rows_written,
+        'progress': job.progress,
+        'status_url': reverse('export-job-status', kwargs={'pk': job.pk}),
+        'download_url': None,
+        'error': job.error or None,
+    }
+    if job.status == 'D':
+        data['download_url'] = reverse(
+            'export-job-download', kwargs={'pk': job.pk}
+        )
+    return data
+
+
+def _get_user_export_job(request, pk):
+    jobs = ExportJob.objects.all()
+    if not request.user.is_superuser:
+        jobs = jobs.filter(requested_by=request.user)
+    return get_object_or_404(jobs, pk=pk)
+
+
+@require_POST
+@login_required
+def export_job_create(request, export):
+    """
+    Queues a background export; the client then polls ``status_url``.
+    """
+    if export not in dict(EXPORT_CHOICES):
+        raise Http404("Unknown export")
+    job = ExportJob.objects.create(export=export, requested_by=request.user)
+    return JsonResponse(_export_job_json(job), status=202)
+
+
+@login_required
+def export_job_status(request, pk):
+    job = _get_user_export_job(request, pk)
+    return JsonResponse(_export_job_json(job))
+
+
+@login_required
+def export_job_download(request, pk):
+    job = _get_user_export_job(request, pk)
+    if job.status != 'D' or not job.file:
+        raise Http404("Export is not ready")
+    filename = job.file.name.rsplit('/', 1)[-1].split('-', 1)[-1]
+    return FileResponse(
+        job.file.open('rb'), as_attachment=True, filename=filename
+    )
+
+
+def _is_staff(user):
+    return user.is_active and user.is_staff
+
+
+@login_required
+@user_passes_test(_is_staff)
+def request_profiles(request):
+    """
+    Lists the captured request profiles (InventoryMS.profiling), with a
+    token for profiling a request on demand.
+    """
+    return render(request, 'store/request_profiles.html', {
+        'captures': profiling.list_captures(),
+        'profile_header': profiling.PROFILE_HEADER,
+        'profile_token': profiling.profile_token(),
+        'token_minutes': profiling.PROFILE_TOKEN_MAX_AGE // 60,
+        'slow_ms': settings.PROFILE_SLOW_REQUEST_MS,
+    })
+
+
+@login_required
+@user_passes_test(_is_staff)
+def request_profile(request, name):
+    """
+    One capture as a pstats report; ``?download=1`` returns the .prof file.
+    """
+    summary = profiling.read_capture(name)
+    if summary is None:
+        raise Http404("Unknown profile")
+    if request.GET.get('download'):
+        return FileResponse(
+            open(profiling.capture_path(name, 'prof'), 'rb'),
+            as_attachment=True, filename=f'{name}.prof',
+        )
+    sort = request.GET.get('sort', 'cumulative')
+    stats = profiling.stats_text(name, sort)
+    if stats is None:
+        raise Http404("Unknown profile")
+    return render(request, 'store/request_profile.html', {
+        'capture': summary,
+        'stats': stats,
+        'sort': sort,
+        'sorts': profiling.PSTATS_SORTS,
+    })
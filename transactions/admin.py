@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Sale, SaleDetail, Purchase
+from .models import Sale, SaleDetail, Purchase, DailySalesRollup
 
 
 @admin.register(Sale)
@@ -41,6 +41,7 @@ class SaleDetailAdmin(admin.ModelAdmin):
         'quantity',
         'total_detail'
     )
+    list_select_related = ('item__category',)
     search_fields = ('sale__id', 'item__name')
     list_filter = ('sale', 'item')
     ordering = ('sale', 'item')
@@ -54,4 +55,22 @@ class SaleDetailAdmin(admin.ModelAdmin):
 @admin.register(Purchase)
 class PurchaseAdmin(admin.ModelAdmin):
     list_display = ['id', 'slug', 'item', 'order_date', 'delivery_status']
+    list_select_related = ['item__category']
     list_filter = ['delivery_status']
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    """
+    Admin interface for the daily sales rollup (read only; rebuild it with
+    the rebuild_sales_rollup command).
+    """
+    list_display = ('date', 'revenue', 'sale_count', 'units')
+    date_hierarchy = 'date'
+    ordering = ('-date',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from transactions.rollups import rebuild
+
+
+def _date(value):
+    if value is None:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise CommandError(f"Invalid date: {value} (expected YYYY-MM-DD)")
+    return day
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollup from the sales table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            help="First day to rebuild (YYYY-MM-DD); default: first sale",
+        )
+        parser.add_argument(
+            "--end",
+            help="Last day to rebuild (YYYY-MM-DD); default: last sale",
+        )
+
+    def handle(self, *args, **options):
+        start, end = _date(options["start"]), _date(options["end"])
+        if start and end and start > end:
+            raise CommandError("--start is after --end")
+
+        days = rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} day(s)"))
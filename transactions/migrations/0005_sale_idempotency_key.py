@@ -0,0 +1,20 @@
+# Generated by Django 5.1 on 2026-10-17 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactions", "0004_purchase_vendor"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sale",
+            name="idempotency_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+    ]
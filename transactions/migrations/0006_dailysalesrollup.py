@@ -0,0 +1,75 @@
+# Generated by Django 5.1 on 2026-10-17 20:05
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollup(apps, schema_editor):
+    Sale = apps.get_model("transactions", "Sale")
+    SaleDetail = apps.get_model("transactions", "SaleDetail")
+    DailySalesRollup = apps.get_model("transactions", "DailySalesRollup")
+    db_alias = schema_editor.connection.alias
+
+    days = {
+        row["day"]: DailySalesRollup(
+            date=row["day"],
+            revenue=row["revenue"] or Decimal("0.00"),
+            sale_count=row["sale_count"],
+        )
+        for row in Sale.objects.using(db_alias)
+        .annotate(day=TruncDate("date_added"))
+        .values("day")
+        .annotate(revenue=Sum("grand_total"), sale_count=Count("id"))
+        .order_by()
+    }
+    for row in (
+        SaleDetail.objects.using(db_alias)
+        .annotate(day=TruncDate("sale__date_added"))
+        .values("day")
+        .annotate(units=Sum("quantity"))
+        .order_by()
+    ):
+        days[row["day"]].units = row["units"] or 0
+    DailySalesRollup.objects.using(db_alias).bulk_create(days.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactions", "0005_sale_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySalesRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True)),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                ("sale_count", models.PositiveIntegerField(default=0)),
+                ("units", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Daily Sales Rollup",
+                "verbose_name_plural": "Daily Sales Rollups",
+                "ordering": ["date"],
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
@@ -50,11 +50,22 @@ class Sale(models.Model):
         decimal_places=2,
         default=Decimal("0.00")
     )
+    idempotency_key = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     class Meta:
         db_table = "sales"
         verbose_name = "Sale"
         verbose_name_plural = "Sales"
+        indexes = [
+            # Danh sách, export và rollup theo ngày bán
+            models.Index(fields=["date_added", "id"], name="sale_date_added_idx"),
+        ]
 
     def __str__(self):
         """
@@ -100,6 +111,9 @@ class SaleDetail(models.Model):
         db_table = "sale_details"
         verbose_name = "Sale Detail"
         verbose_name_plural = "Sale Details"
+        indexes = [
+            models.Index(fields=["item", "sale"], name="saledetail_item_sale_idx"),
+        ]
 
     def __str__(self):
         """
@@ -107,11 +121,35 @@ class SaleDetail(models.Model):
         """
         return (
             f"Detail ID: {self.id} | "
-            f"Sale ID: {self.sale.id} | "
+            f"Sale ID: {self.sale_id} | "
             f"Quantity: {self.quantity}"
         )
 
 
+class DailySalesRollup(models.Model):
+    """
+    Sales totals for one day, kept up to date as sales are written
+    (see transactions.rollups) so reports never scan the sales table.
+    """
+
+    date = models.DateField(unique=True)
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00")
+    )
+    sale_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["date"]
+        verbose_name = "Daily Sales Rollup"
+        verbose_name_plural = "Daily Sales Rollups"
+
+    def __str__(self):
+        return f"{self.date}: {self.revenue} ({self.sale_count} sales)"
+
+
 class Purchase(models.Model):
     """
     Represents a purchase of an item,
@@ -152,12 +190,10 @@ class Purchase(models.Model):
     def save(self, *args, **kwargs):
         """
         Calculates the total value before saving the Purchase instance.
+        Stock is added by the post_save signal through store.inventory.
         """
         self.total_value = Decimal(self.price) * Decimal(self.quantity)
         super().save(*args, **kwargs)
-        # Update the item quantity
-        self.item.quantity += self.quantity
-        self.item.save()
 
     def __str__(self):
         vendor_name = self.vendor.name if self.vendor else ""
@@ -165,3 +201,10 @@ class Purchase(models.Model):
 
     class Meta:
         ordering = ["order_date"]
+        indexes = [
+            models.Index(fields=["order_date", "id"], name="purchase_order_date_idx"),
+            models.Index(
+                fields=["delivery_status", "order_date"],
+                name="purchase_status_date_idx",
+            ),
+        ]
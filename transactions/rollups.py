@@ -0,0 +1,164 @@
+"""
+Daily sales rollup.
+
+``DailySalesRollup`` holds one row per day with the revenue, number of
+sales and units sold. New sales are added to their day with a single
+UPDATE (``record_sale``); edits and deletions recompute just the day
+they touch (``refresh_days``). Reports read the rollup, grouped by day,
+week or month, instead of aggregating the sales table.
+"""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import DailySalesRollup, Sale, SaleDetail
+
+CENT = Decimal('0.01')
+
+# Chart periods and the function that truncates a day to its period.
+PERIODS = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def sale_day(sale):
+    return timezone.localdate(sale.date_added)
+
+
+def record_sale(day, revenue=Decimal('0.00'), sale_count=0, units=0):
+    """
+    Adds to the totals of ``day``, creating its row when needed.
+    """
+    # Sales are created from floats; their exact binary expansion has
+    # more digits than the column can take.
+    revenue = Decimal(revenue).quantize(CENT)
+    changes = {
+        'revenue': F('revenue') + Value(revenue),
+        'sale_count': F('sale_count') + sale_count,
+        'units': F('units') + units,
+    }
+    if DailySalesRollup.objects.filter(date=day).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailySalesRollup.objects.create(
+                date=day, revenue=revenue, sale_count=sale_count, units=units
+            )
+    except IntegrityError:
+        # Another sale created the row first.
+        DailySalesRollup.objects.filter(date=day).update(**changes)
+
+
+def _date_range(queryset, field, start=None, end=None):
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{field}__lte': end})
+    return queryset
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _datetime_range(queryset, field, start=None, end=None):
+    """
+    ``_date_range`` for a datetime field, as bounds on the column itself
+    (not on its date) so its index can be used.
+    """
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': _day_start(start)})
+    if end is not None:
+        queryset = queryset.filter(
+            **{f'{field}__lt': _day_start(end + timedelta(days=1))}
+        )
+    return queryset
+
+
+def daily_sales(start=None, end=None):
+    """
+    Revenue and number of sales per day, from the sales table.
+    """
+    sales = _datetime_range(Sale.objects.all(), 'date_added', start, end)
+    return (
+        sales.annotate(day=TruncDate('date_added')).values('day')
+        .annotate(revenue=Sum('grand_total'), sale_count=Count('id'))
+        .order_by()
+    )
+
+
+def daily_units(start=None, end=None):
+    """
+    Units sold per day, from the sale details.
+    """
+    details = _datetime_range(
+        SaleDetail.objects.all(), 'sale__date_added', start, end
+    )
+    return (
+        details.annotate(day=TruncDate('sale__date_added')).values('day')
+        .annotate(units=Sum('quantity')).order_by()
+    )
+
+
+def rebuild(start=None, end=None):
+    """
+    Recomputes the rollup rows between ``start`` and ``end`` (inclusive,
+    open-ended when None) from the sales table. Returns the number of
+    days written.
+    """
+    days = {
+        row['day']: DailySalesRollup(
+            date=row['day'],
+            revenue=row['revenue'] or Decimal('0.00'),
+            sale_count=row['sale_count'],
+        )
+        for row in daily_sales(start, end)
+    }
+    for row in daily_units(start, end):
+        days[row['day']].units = row['units'] or 0
+
+    with transaction.atomic():
+        _date_range(DailySalesRollup.objects.all(), 'date', start, end).delete()
+        DailySalesRollup.objects.bulk_create(days.values(), batch_size=500)
+    return len(days)
+
+
+def refresh_days(*days):
+    """
+    Recomputes the rollup rows of the given days.
+    """
+    for day in set(days):
+        rebuild(day, day)
+
+
+def series_queryset(period='day', start=None, end=None):
+    rollups = _date_range(DailySalesRollup.objects.all(), 'date', start, end)
+    fields = ('date', 'revenue', 'sale_count', 'units')
+    trunc = PERIODS[period]
+    if trunc is None:
+        return rollups.order_by('date').values_list(*fields)
+    return (
+        rollups.annotate(period=trunc('date')).values('period')
+        .annotate(
+            total_revenue=Sum('revenue'),
+            total_sales=Sum('sale_count'),
+            total_units=Sum('units'),
+        )
+        .order_by('period')
+        .values_list('period', 'total_revenue', 'total_sales', 'total_units')
+    )
+
+
+def series(period='day', start=None, end=None):
+    """
+    Returns ``(date, revenue, sale_count, units)`` tuples, oldest first,
+    one per ``period`` between ``start`` and ``end``.
+    """
+    return list(series_queryset(period, start, end))
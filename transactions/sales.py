@@ -0,0 +1,177 @@
+"""
+Sale creation shared by the single-sale view and the batch sync endpoint.
+
+``create_sale`` takes a payload in the ``SaleCreateView`` JSON format,
+validates it and writes the sale, its details and the stock decrements
+in one transaction. ``sale_error`` maps the exceptions it raises to the
+status code and message the sale page displays.
+"""
+
+import json
+import logging
+
+from django.db import IntegrityError, transaction
+
+from InventoryMS.db import retry_on_db_lock
+from InventoryMS.metrics import SALES, STOCK_OUT_REJECTIONS
+
+from store.models import Item
+from store.inventory import InsufficientStock, remove_stock
+from accounts.models import Customer
+from .models import Sale, SaleDetail
+from .rollups import record_sale, sale_day
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = [
+    'customer', 'sub_total', 'grand_total',
+    'amount_paid', 'amount_change', 'items'
+]
+ITEM_FIELDS = ["id", "price", "quantity", "total_item"]
+
+
+def sale_for_idempotency_key(key):
+    return Sale.objects.filter(idempotency_key=key).values_list(
+        'id', flat=True
+    ).first()
+
+
+def create_sale(data, idempotency_key=None):
+    """
+    Creates a sale from a ``SaleCreateView`` payload.
+
+    Returns ``(sale_id, replayed)``; ``replayed`` is True when a sale with
+    ``idempotency_key`` already existed and nothing was written.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Sale should be a JSON object")
+
+    # Validate required fields
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            raise ValueError(f"Missing required field: {field}")
+
+    # A retried submission gets the original sale back
+    if idempotency_key:
+        sale_id = sale_for_idempotency_key(idempotency_key)
+        if sale_id is not None:
+            return sale_id, True
+
+    # Khách ẩn danh nếu customer rỗng
+    customer_id = data.get('customer')
+    customer_obj = None
+    if customer_id and str(customer_id).strip():
+        customer_obj = Customer.objects.get(id=int(customer_id))
+
+    # Create sale attributes
+    sale_attributes = {
+        "customer": customer_obj,
+        "sub_total": float(data["sub_total"]),
+        "grand_total": float(data["grand_total"]),
+        "tax_amount": float(data.get("tax_amount", 0.0)),
+        "tax_percentage": float(data.get("tax_percentage", 0.0)),
+        "amount_paid": float(data["amount_paid"]),
+        "amount_change": float(data["amount_change"]),
+        "idempotency_key": idempotency_key,
+    }
+
+    # Validate sale lines before taking the write lock
+    items = data["items"]
+    if not isinstance(items, list):
+        raise ValueError("Items should be a list")
+
+    for item in items:
+        if not all(k in item for k in ITEM_FIELDS):
+            raise ValueError("Item is missing required fields")
+
+    # Fetch every item of the basket in one query
+    items_by_id = Item.objects.only("id", "name", "quantity").in_bulk(
+        {int(item["id"]) for item in items}
+    )
+
+    stock_lines = []
+    requested = {}
+    for item in items:
+        item_id = int(item["id"])
+        if item_id not in items_by_id:
+            raise Item.DoesNotExist()
+        stock_lines.append((item_id, int(item["quantity"])))
+        requested[item_id] = requested.get(item_id, 0) + int(item["quantity"])
+
+    # Quick in-memory check; remove_stock() re-checks atomically
+    for item_id, quantity in requested.items():
+        if items_by_id[item_id].quantity < quantity:
+            STOCK_OUT_REJECTIONS.inc()
+            raise ValueError(
+                f"Not enough stock for item: {items_by_id[item_id].name}"
+            )
+
+    try:
+        sale_id = _write_sale(sale_attributes, items, items_by_id, stock_lines)
+    except InsufficientStock:
+        STOCK_OUT_REJECTIONS.inc()
+        raise
+    except IntegrityError:
+        # Another request with the same key won the race
+        sale_id = idempotency_key and sale_for_idempotency_key(idempotency_key)
+        if not sale_id:
+            raise
+        return sale_id, True
+
+    return sale_id, False
+
+
+@retry_on_db_lock
+def _write_sale(sale_attributes, items, items_by_id, stock_lines):
+    """
+    Writes the sale, its details and the stock decrements in one
+    transaction, retried as a whole if the database is locked.
+    """
+    new_sale = Sale.objects.create(**sale_attributes)
+    logger.info(f"Sale created: {new_sale}")
+
+    # Create all sale details in one INSERT
+    SaleDetail.objects.bulk_create([
+        SaleDetail(
+            sale=new_sale,
+            item=items_by_id[int(item["id"])],
+            price=float(item["price"]),
+            quantity=int(item["quantity"]),
+            total_detail=float(item["total_item"])
+        )
+        for item in items
+    ])
+    logger.info(f"{len(items)} sale details created for sale {new_sale.id}")
+
+    # Reduce item quantities in one checked batch
+    remove_stock(stock_lines)
+
+    # Revenue and sale count were added by the post_save signal
+    record_sale(
+        sale_day(new_sale),
+        units=sum(quantity for _, quantity in stock_lines)
+    )
+    # Not counted if an outer block (a batch chunk) is rolled back
+    transaction.on_commit(SALES.inc)
+    return new_sale.id
+
+
+def sale_error(exc):
+    """
+    Returns ``(status_code, message)`` for an exception raised while
+    creating a sale.
+    """
+    if isinstance(exc, json.JSONDecodeError):
+        return 400, 'Invalid JSON format in request body!'
+    if isinstance(exc, Customer.DoesNotExist):
+        return 400, 'Customer does not exist!'
+    if isinstance(exc, Item.DoesNotExist):
+        return 400, 'Item does not exist!'
+    if isinstance(exc, InsufficientStock):
+        return 400, f'Value error: {exc.message}'
+    if isinstance(exc, ValueError):
+        return 400, f'Value error: {str(exc)}'
+    if isinstance(exc, TypeError):
+        return 400, f'Type error: {str(exc)}'
+    logger.error(f"Exception during sale creation: {exc}")
+    return 500, f'There was an error during the creation: {str(exc)}'
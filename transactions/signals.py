@@ -1,13 +1,13 @@
 # transactions/signals.py
-from decimal import Decimal
 from django.db import transaction
-from django.db.models import F
 from django.dispatch import receiver
-from django.db.models.signals import post_save
-from .models import Purchase
+from django.db.models.signals import post_delete, post_save
+from .models import Purchase, Sale, SaleDetail
+from .rollups import record_sale, refresh_days, sale_day
 from bills.models import Bill
-from store.models import Item
-from django.conf import settings
+from store.inventory import add_stock
+from InventoryMS.db import on_commit_once
+
 
 @receiver(post_save, sender=Purchase)
 def purchase_post_save(sender, instance: Purchase, created, **kwargs):
@@ -16,15 +16,7 @@ def purchase_post_save(sender, instance: Purchase, created, **kwargs):
 
     # Create bill and increment inventory atomically
     with transaction.atomic():
-        # Lock the item row for update to avoid race conditions
-        item = Item.objects.select_for_update().get(pk=instance.item_id)
-
-        # increase stock by purchase.quantity
-        item.quantity = F('quantity') + instance.quantity
-        item.save()
-
-        # refresh to get concrete int value if needed
-        item.refresh_from_db()
+        add_stock([(instance.item_id, instance.quantity)])
 
         # Create associated bill
         Bill.objects.create(
@@ -33,24 +25,41 @@ def purchase_post_save(sender, instance: Purchase, created, **kwargs):
             status=False,
         )
 
-# transactions/signals.py (add this function)
-from .models import Sale, SaleDetail
 
 @receiver(post_save, sender=Sale)
-def sale_post_save(sender, instance: Sale, created, **kwargs):
-    # Option A: If SaleDetails are created after Sale, you may instead listen to SaleDetail.post_save
-    # Implementing on Sale to iterate pre-existing details:
-    if not created:
+def sale_post_save(sender, instance: Sale, created, raw=False, using=None, **kwargs):
+    if raw:
         return
-    with transaction.atomic():
-        # lock all item rows involved
-        detail_qs = instance.saledetail_set.select_related('item').all()
-        item_ids = [d.item_id for d in detail_qs]
-        items_map = {it.id: it for it in Item.objects.select_for_update().filter(id__in=item_ids)}
-
-        for d in detail_qs:
-            item = items_map[d.item_id]
-            if item.quantity < d.quantity:
-                raise ValidationError(f"Not enough stock for item {item.name}")
-            item.quantity = F('quantity') - d.quantity
-            item.save()
+
+    # A new sale only adds to its day; the units are added by
+    # create_sale() once the sale details exist.
+    if created:
+        record_sale(
+            sale_day(instance), revenue=instance.grand_total, sale_count=1
+        )
+    else:
+        on_commit_once(refresh_days, sale_day(instance), using=using)
+
+
+@receiver(post_delete, sender=Sale)
+def sale_post_delete(sender, instance: Sale, using=None, **kwargs):
+    # Once per day, however many sales of it a delete() removed.
+    on_commit_once(refresh_days, sale_day(instance), using=using)
+
+
+def _refresh_sale_day(sale_id):
+    sale = Sale.objects.filter(pk=sale_id).only('date_added').first()
+    # A deleted sale refreshed its day itself.
+    if sale is not None:
+        refresh_days(sale_day(sale))
+
+
+@receiver(post_save, sender=SaleDetail)
+@receiver(post_delete, sender=SaleDetail)
+def sale_detail_changed(sender, instance: SaleDetail, raw=False, using=None, **kwargs):
+    # bulk_create() in create_sale() sends no signal; this covers the
+    # details edited one by one (admin). Deleting a sale deletes its
+    # details first: their day is refreshed once, after the commit.
+    if raw:
+        return
+    on_commit_once(_refresh_sale_day, instance.sale_id, using=using)
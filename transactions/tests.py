@@ -1,3 +1,256 @@
-from django.test import TestCase
+import io
+import json
+import uuid
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from InventoryMS.testing import QueryBudgetTestCase
+from accounts.models import Customer, Vendor
+from store.models import Category, Item
+from . import rollups, sales
+from .models import DailySalesRollup, Sale, SaleDetail
+
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def sale_payload(*lines, idempotency_key=None):
+    """
+    A SaleCreateView payload for ``(item, quantity)`` lines.
+    """
+    total = sum(item.price * quantity for item, quantity in lines)
+    payload = {
+        'customer': '',
+        'sub_total': total,
+        'grand_total': total,
+        'amount_paid': total,
+        'amount_change': 0,
+        'items': [
+            {
+                'id': item.pk, 'price': item.price, 'quantity': quantity,
+                'total_item': item.price * quantity,
+            }
+            for item, quantity in lines
+        ],
+    }
+    if idempotency_key:
+        payload['idempotency_key'] = idempotency_key
+    return payload
+
+
+class SaleTestCase(TestCase):
+    """
+    A logged-in client and two items in stock.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        category = Category.objects.create(name='Drinks')
+        vendor = Vendor.objects.create(name='Acme')
+        cls.coffee = Item.objects.create(
+            name='Coffee', description='-', category=category, vendor=vendor,
+            quantity=10, price=2.5,
+        )
+        cls.tea = Item.objects.create(
+            name='Tea', description='-', category=category, vendor=vendor,
+            quantity=5, price=1.5,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def stock(self, item):
+        return Item.objects.values_list('quantity', flat=True).get(pk=item.pk)
+
+
+
+class IdempotentSaleTests(SaleTestCase):
+
+    def post_sale(self, payload, **headers):
+        return self.client.post(
+            reverse('sale-create'), payload, content_type='application/json',
+            headers={**AJAX, **headers},
+        )
+
+    def test_retry_with_the_header_replays_the_sale(self):
+        key = uuid.uuid4().hex
+        first = self.post_sale(sale_payload((self.coffee, 2)), **{'Idempotency-Key': key})
+        retry = self.post_sale(sale_payload((self.coffee, 2)), **{'Idempotency-Key': key})
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()['sale_id'], first.json()['sale_id'])
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(self.stock(self.coffee), 8)
+
+    def test_retry_with_the_field_replays_the_sale(self):
+        payload = sale_payload((self.tea, 1), idempotency_key=uuid.uuid4().hex)
+        first = self.post_sale(payload)
+        retry = self.post_sale(payload)
+        self.assertEqual(retry.json()['sale_id'], first.json()['sale_id'])
+        self.assertEqual(self.stock(self.tea), 4)
+
+    def test_without_a_key_each_post_is_a_sale(self):
+        self.post_sale(sale_payload((self.tea, 1)))
+        self.post_sale(sale_payload((self.tea, 1)))
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_malformed_key_is_rejected(self):
+        response = self.post_sale(sale_payload((self.tea, 1)), **{'Idempotency-Key': 'a b'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Sale.objects.count(), 0)
+
+    def test_concurrent_duplicate_returns_the_winner(self):
+        key = uuid.uuid4().hex
+        winner, _ = sales.create_sale(sale_payload((self.coffee, 1)), key)
+        # The other request checked for the key before the winner committed.
+        lookup = mock.Mock(side_effect=[None, winner])
+        with mock.patch.object(sales, 'sale_for_idempotency_key', lookup):
+            sale_id, replayed = sales.create_sale(sale_payload((self.coffee, 1)), key)
+        self.assertEqual((sale_id, replayed), (winner, True))
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(self.stock(self.coffee), 9)
+
+
+class SaleBatchSyncTests(SaleTestCase):
+
+    def post_batch(self, body):
+        return self.client.post(
+            reverse('sale-batch'), body, content_type='application/x-ndjson'
+        )
+
+    def test_creates_each_sale(self):
+        lines = [
+            json.dumps(sale_payload((self.coffee, 1), idempotency_key=uuid.uuid4().hex)),
+            json.dumps(sale_payload((self.tea, 99), idempotency_key=uuid.uuid4().hex)),
+        ]
+        response = self.post_batch('\n'.join(lines))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['created'], data['failed']), (1, 1))
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(self.stock(self.coffee), 9)
+        self.assertEqual(self.stock(self.tea), 5)
+
+    def test_invalid_utf8_is_a_bad_request(self):
+        response = self.post_batch(b'{"customer": "\xff"}\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], 'error')
+
+
+class SalesRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Drinks')
+        cls.coffee = Item.objects.create(
+            name='Coffee', description='-', category=category, quantity=10, price=2.5,
+        )
+
+    def setUp(self):
+        self.day = timezone.localdate()
+
+    def add_sale(self, *quantities):
+        total = sum(quantities) * Decimal('2.50')
+        sale = Sale.objects.create(sub_total=total, grand_total=total, amount_paid=total)
+        SaleDetail.objects.bulk_create(
+            SaleDetail(sale=sale, item=self.coffee, price=Decimal('2.50'), quantity=quantity,
+                       total_detail=quantity * Decimal('2.50'))
+            for quantity in quantities
+        )
+        rollups.record_sale(self.day, units=sum(quantities))
+        return sale
+
+    def totals(self):
+        row = DailySalesRollup.objects.filter(date=self.day).first()
+        return row and (row.revenue, row.sale_count, row.units)
+
+    def test_record_sale_creates_then_adds(self):
+        # Revenue comes in as floats; 0.1 + 0.2 is 0.30000000000000004.
+        rollups.record_sale(self.day, revenue=0.1 + 0.2, sale_count=1, units=2)
+        rollups.record_sale(self.day, revenue=0.1 + 0.2, sale_count=1, units=1)
+        self.assertEqual(self.totals(), (Decimal('0.60'), 2, 3))
+
+    def test_record_sale_when_another_sale_created_the_row(self):
+        DailySalesRollup.objects.create(date=self.day, revenue=5, sale_count=1)
+        update = QuerySet.update
+        calls = []
+
+        def missed_first_update(queryset, **kwargs):
+            # As if the row was created right after this UPDATE.
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=missed_first_update):
+            rollups.record_sale(self.day, revenue=2, sale_count=1, units=3)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.totals(), (Decimal('7.00'), 2, 3))
+
+    def test_deleting_a_sale_refreshes_its_day_once(self):
+        sale = self.add_sale(1, 2, 3)
+        self.add_sale(4)
+        self.assertEqual(self.totals(), (Decimal('25.00'), 2, 10))
+        with mock.patch('transactions.signals.refresh_days', wraps=rollups.refresh_days) as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            sale.delete()
+        refresh.assert_called_once_with(self.day)
+        self.assertEqual(self.totals(), (Decimal('10.00'), 1, 4))
+
+    def test_rebuild_command(self):
+        self.add_sale(1, 2)
+        DailySalesRollup.objects.all().delete()
+        out = io.StringIO()
+        call_command('rebuild_sales_rollup', stdout=out)
+        self.assertIn('Rebuilt 1 day(s)', out.getvalue())
+        self.assertEqual(self.totals(), (Decimal('7.50'), 1, 3))
+
+    def test_rebuild_command_checks_dates(self):
+        for args in [('--start', 'yesterday'), ('--start', '2024-02-02', '--end', '2024-02-01')]:
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                call_command('rebuild_sales_rollup', *args)
+
+
+class QueryBudgetTests(QueryBudgetTestCase):
+
+    def test_pages(self):
+        sale = Sale.objects.order_by('pk').first()
+        self.assertPagesLoad(
+            reverse('saleslist'),
+            reverse('purchaseslist'),
+            reverse('sale-detail', args=[sale.pk]),
+            reverse('sale-create'),
+        )
+
+
+@override_settings(QUERY_COUNT_ENABLED=True, QUERY_BUDGET_RAISE=True)
+class SaleCreateBudgetTests(TransactionTestCase):
+    """
+    The first sale of a day, which also inserts the day's rollup row, in
+    autocommit as in production (a TestCase would turn its BEGIN into a
+    SAVEPOINT and RELEASE).
+    """
+
+    def test_first_sale_of_the_day(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        category = Category.objects.create(name='Drinks')
+        coffee = Item.objects.create(
+            name='Coffee', description='-', category=category, quantity=10, price=2.5,
+        )
+        customer = Customer.objects.create(first_name='An', phone='0912345678')
+        self.client.force_login(user)
+
+        payload = sale_payload((coffee, 2), idempotency_key=str(uuid.uuid4()))
+        payload['customer'] = customer.pk
+        response = self.client.post(
+            reverse('sale-create'), payload, content_type='application/json',
+            headers=AJAX,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'success')
@@ -14,6 +14,7 @@ from .views import (
     SaleDetailView,
     SaleCreateView,
     SaleDeleteView,
+    sale_batch_sync,
 
     export_sales_to_excel,
     export_purchases
@@ -44,6 +45,7 @@ urlpatterns = [
     path('sales/', SaleListView.as_view(), name='saleslist'),
     path('sale/<int:pk>/', SaleDetailView.as_view(), name='sale-detail'),
     path('new-sale/', SaleCreateView, name='sale-create'),
+    path('sales/batch/', sale_batch_sync, name='sale-batch'),
     path(
          'sale/<slug:slug>/delete/', SaleDeleteView.as_view(),
          name='sale-delete'
@@ -3,10 +3,11 @@ import json
 import logging
 
 # Django core imports
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.urls import reverse
 from django.shortcuts import render
-from django.db import transaction
+from django.views.decorators.http import require_POST
+from django.utils.decorators import method_decorator
 
 # Class-based views
 from django.views.generic import DetailView, ListView
@@ -16,181 +17,165 @@ from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.mixins import PermissionRequiredMixin
 
-# Third-party packages
-from openpyxl import Workbook
-
 # Local app imports
-from store.models import Item
-from accounts.models import Customer
-from .models import Sale, Purchase, SaleDetail
+from InventoryMS.db import is_lock_error, read_from_replica, retry_on_db_lock
+from InventoryMS.pagination import KeysetPaginationMixin
+from InventoryMS.querycount import query_budget
+from store.exports import XlsxExport
+from store.idempotency import (
+    IDEMPOTENCY_FIELD, clean_idempotency_key, get_idempotency_key
+)
+from .models import Sale, Purchase
 from .forms import PurchaseForm
-import openpyxl
+from .sales import create_sale, sale_error
 
 from django.contrib.auth.decorators import login_required
 
 logger = logging.getLogger(__name__)
 
+# Batch sale sync limits
+SALE_BATCH_MAX_LINES = 500
+SALE_BATCH_CHUNK = 50
+
 
 def is_ajax(request):
     return request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
 
 
+@read_from_replica
 def export_sales_to_excel(request):
-    # Create a workbook and select the active worksheet.
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = 'Sales'
+    return SALES_EXCEL_EXPORT.response()
+
 
-    # Define the column headers
-    columns = [
+def _format_sales_excel_row(row):
+    sale_id, date_added, phone, *totals = row
+    # Convert timezone-aware datetime to naive datetime
+    if date_added is not None and date_added.tzinfo is not None:
+        date_added = date_added.replace(tzinfo=None)
+    return [sale_id, date_added, phone, *totals]
+
+
+SALES_EXCEL_EXPORT = XlsxExport(
+    filename='sales.xlsx',
+    title='Sales',
+    columns=[
         'ID', 'Date', 'Customer', 'Sub Total',
         'Grand Total', 'Tax Amount', 'Tax Percentage',
         'Amount Paid', 'Amount Change'
-    ]
-    worksheet.append(columns)
-
-    # Fetch sales data
-    sales = Sale.objects.all()
-
-    for sale in sales:
-        # Convert timezone-aware datetime to naive datetime
-        if sale.date_added.tzinfo is not None:
-            date_added = sale.date_added.replace(tzinfo=None)
-        else:
-            date_added = sale.date_added
-
-        worksheet.append([
-            sale.id,
-            date_added,
-            sale.customer.phone,
-            sale.sub_total,
-            sale.grand_total,
-            sale.tax_amount,
-            sale.tax_percentage,
-            sale.amount_paid,
-            sale.amount_change
-        ])
-
-    # Set up the response to send the file
-    response = HttpResponse(
-        content_type=(
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-    )
-    response['Content-Disposition'] = 'attachment; filename=sales.xlsx'
-    workbook.save(response)
-
-    return response
+    ],
+    queryset=Sale.objects.order_by('id'),
+    fields=(
+        'id', 'date_added', 'customer__phone', 'sub_total',
+        'grand_total', 'tax_amount', 'tax_percentage',
+        'amount_paid', 'amount_change'
+    ),
+    format_row=_format_sales_excel_row,
+)
 
 
 @login_required
+@read_from_replica
 def export_purchases(request):
     """
     Export danh sách Purchase Order an toàn (Fix lỗi NoneType)
     """
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="Purchase_Orders.xlsx"'
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Purchases"
-
-    # 1. Header
-    columns = [
-        'ID', 
-        'Date', 
-        'Vendor',          # Cột gây lỗi
-        'Item Name', 
-        'Quantity', 
-        'Price (Ksh)', 
-        'Total Value', 
-        'Status',
-        'Delivery Date'
+    return PURCHASES_EXPORT.response()
+
+
+def _format_purchase_row(row):
+    (purchase_id, order_date, delivery_date, vendor_name, item_name,
+     quantity, price, total_value, delivery_status) = row
+
+    o_date = order_date.strftime('%Y-%m-%d %H:%M') if order_date else "-"
+    d_date = delivery_date.strftime('%Y-%m-%d') if delivery_date else "-"
+
+    # Hiển thị chữ thay vì ký tự P/S
+    status_display = "Successful" if delivery_status == 'S' else "Pending"
+
+    return [
+        purchase_id,
+        o_date,
+        vendor_name or "N/A",
+        item_name or "Unknown",
+        quantity,
+        price,
+        total_value,
+        status_display,
+        d_date
     ]
-    ws.append(columns)
-
-    # Format Header
-    header_font = openpyxl.styles.Font(bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-
-    # 2. Query dữ liệu
-    rows = Purchase.objects.all().select_related('vendor', 'item').order_by('-order_date')
-
-    for p in rows:
-        # -- Xử lý Ngày tháng --
-        o_date = p.order_date.strftime('%Y-%m-%d %H:%M') if p.order_date else "-"
-        d_date = p.delivery_date.strftime('%Y-%m-%d') if p.delivery_date else "-"
-
-        # -- Xử lý Vendor (FIX LỖI NONE TYPE TẠI ĐÂY) --
-        # Kiểm tra: Nếu có vendor thì lấy tên, nếu không thì ghi 'N/A'
-        if p.vendor:
-            vendor_name = p.vendor.name
-        else:
-            vendor_name = "N/A" 
-
-        # -- Xử lý Item --
-        item_name = p.item.name if p.item else "Unknown"
-
-        # -- Xử lý Status (Hiển thị chữ thay vì ký tự P/S) --
-        status_display = "Pending"
-        if p.delivery_status == 'S':
-            status_display = "Successful"
-
-        ws.append([
-            p.id,
-            o_date,
-            vendor_name,    # Biến đã được xử lý an toàn
-            item_name,
-            p.quantity,
-            p.price,
-            p.total_value,
-            status_display,
-            d_date
-        ])
-
-    # 3. Auto-fit cột
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
-
-    wb.save(response)
-    return response
 
 
-class SaleListView(LoginRequiredMixin, ListView):
+PURCHASES_EXPORT = XlsxExport(
+    filename='Purchase_Orders.xlsx',
+    title='Purchases',
+    columns=[
+        'ID',
+        'Date',
+        'Vendor',
+        'Item Name',
+        'Quantity',
+        'Price (Ksh)',
+        'Total Value',
+        'Status',
+        'Delivery Date'
+    ],
+    queryset=Purchase.objects.order_by('-order_date', '-id'),
+    fields=(
+        'id', 'order_date', 'delivery_date', 'vendor__name', 'item__name',
+        'quantity', 'price', 'total_value', 'delivery_status'
+    ),
+    format_row=_format_purchase_row,
+)
+
+
+@query_budget(10)
+@method_decorator(read_from_replica, name='dispatch')
+class SaleListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     View to list all sales with pagination.
     """
 
     model = Sale
+    queryset = Sale.objects.select_related("customer")
     template_name = "transactions/sales_list.html"
     context_object_name = "sales"
     paginate_by = 10
 
-    ordering = ['-date_added']
+    ordering = ['-date_added', '-id']
+    keyset_ordering = ('-date_added', '-id')
 
 
+@query_budget(8)
 class SaleDetailView(LoginRequiredMixin, DetailView):
     """
     View to display details of a specific sale.
     """
 
     model = Sale
+    queryset = Sale.objects.select_related("customer")
     template_name = "transactions/saledetail.html"
 
+def _sale_created_response(sale_id, replayed=False):
+    response = JsonResponse(
+        {
+            'status': 'success',
+            'message': 'Sale created successfully!',
+            'redirect': '/transactions/sales/',
+            'sale_id': sale_id,
+        }
+    )
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+# The first sale of a day is the worst case: 14 statements with BEGIN and
+# the SAVEPOINT around the new rollup row.
+@query_budget(14)
 def SaleCreateView(request):
+    # Customers are loaded by the page through get_customers
     context = {
         "active_icon": "sales",
-        "customers": [c.to_select2() for c in Customer.objects.all()]
     }
 
     if request.method == 'POST':
@@ -200,119 +185,96 @@ def SaleCreateView(request):
                 data = json.loads(request.body)
                 logger.info(f"Received data: {data}")
 
-                # Validate required fields
-                required_fields = [
-                    'customer', 'sub_total', 'grand_total',
-                    'amount_paid', 'amount_change', 'items'
-                ]
-                for field in required_fields:
-                    if field not in data:
-                        raise ValueError(f"Missing required field: {field}")
-
-                # --- ĐOẠN ĐÃ SỬA (FIX BUG SỐ 1) ---
-                # Lấy ID khách hàng từ dữ liệu
-                customer_id = data.get('customer')
-                customer_obj = None  # Mặc định là None (Khách ẩn danh)
-
-                # Kiểm tra: nếu customer_id không rỗng và không phải None thì mới đi tìm trong DB
-                if customer_id and str(customer_id).strip():
-                    customer_obj = Customer.objects.get(id=int(customer_id))
-                # ----------------------------------
-
-                # Create sale attributes
-                sale_attributes = {
-                    "customer": customer_obj, # Truyền object khách hàng (hoặc None) vào đây
-                    "sub_total": float(data["sub_total"]),
-                    "grand_total": float(data["grand_total"]),
-                    "tax_amount": float(data.get("tax_amount", 0.0)),
-                    "tax_percentage": float(data.get("tax_percentage", 0.0)),
-                    "amount_paid": float(data["amount_paid"]),
-                    "amount_change": float(data["amount_change"]),
-                }
-
-                # Use a transaction to ensure atomicity
-                with transaction.atomic():
-                    # Create the sale
-                    new_sale = Sale.objects.create(**sale_attributes)
-                    logger.info(f"Sale created: {new_sale}")
-
-                    # Create sale details and update item quantities
-                    items = data["items"]
-                    if not isinstance(items, list):
-                        raise ValueError("Items should be a list")
-
-                    for item in items:
-                        if not all(
-                            k in item for k in [
-                                "id", "price", "quantity", "total_item"
-                            ]
-                        ):
-                            raise ValueError("Item is missing required fields")
-
-                        item_instance = Item.objects.get(id=int(item["id"]))
-                        if item_instance.quantity < int(item["quantity"]):
-                            raise ValueError(f"Not enough stock for item: {item_instance.name}")
-
-                        detail_attributes = {
-                            "sale": new_sale,
-                            "item": item_instance,
-                            "price": float(item["price"]),
-                            "quantity": int(item["quantity"]),
-                            "total_detail": float(item["total_item"])
-                        }
-                        SaleDetail.objects.create(**detail_attributes)
-                        logger.info(f"Sale detail created: {detail_attributes}")
-
-                        # Reduce item quantity
-                        item_instance.quantity -= int(item["quantity"])
-                        item_instance.save()
-
-                return JsonResponse(
-                    {
-                        'status': 'success',
-                        'message': 'Sale created successfully!',
-                        'redirect': '/transactions/sales/'
-                    }
+                sale_id, replayed = create_sale(
+                    data, get_idempotency_key(request, data)
                 )
+                return _sale_created_response(sale_id, replayed)
 
-            except json.JSONDecodeError:
-                return JsonResponse(
-                    {
-                        'status': 'error',
-                        'message': 'Invalid JSON format in request body!'
-                    }, status=400)
-            except Customer.DoesNotExist:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Customer does not exist!'
-                    }, status=400)
-            except Item.DoesNotExist:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Item does not exist!'
-                    }, status=400)
-            except ValueError as ve:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'Value error: {str(ve)}'
-                    }, status=400)
-            except TypeError as te:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'Type error: {str(te)}'
-                    }, status=400)
             except Exception as e:
-                logger.error(f"Exception during sale creation: {e}")
+                status, message = sale_error(e)
                 return JsonResponse(
                     {
                         'status': 'error',
-                        'message': (
-                            f'There was an error during the creation: {str(e)}'
-                        )
-                    }, status=500)
+                        'message': message
+                    }, status=status)
 
     return render(request, "transactions/sale_create.html", context=context)
 
+
+@retry_on_db_lock
+def _sync_sale_chunk(lines, start):
+    """
+    Creates the sales of one batch chunk in a single transaction.
+
+    Lock errors are not reported per line: they abort the chunk so
+    ``retry_on_db_lock`` can run it again from the start.
+    """
+    results = []
+    for number, line in enumerate(lines, start=start + 1):
+        result = {'line': number}
+        data = None
+        try:
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                raise ValueError("Sale should be a JSON object")
+            sale_id, replayed = create_sale(
+                data, clean_idempotency_key(data.get(IDEMPOTENCY_FIELD))
+            )
+            result.update(
+                status='success', sale_id=sale_id, replayed=replayed
+            )
+        except Exception as e:
+            if is_lock_error(e):
+                raise
+            status, message = sale_error(e)
+            result.update(status='error', code=status, message=message)
+        if isinstance(data, dict) and data.get(IDEMPOTENCY_FIELD):
+            result[IDEMPOTENCY_FIELD] = data[IDEMPOTENCY_FIELD]
+        results.append(result)
+    return results
+
+
+@require_POST
+@login_required
+def sale_batch_sync(request):
+    """
+    Creates many sales from one request.
+
+    The body is JSON lines: one ``SaleCreateView`` payload per line, each
+    with its own ``idempotency_key`` so a batch can be resent safely.
+    Sales are committed in chunks of ``SALE_BATCH_CHUNK``; a sale that
+    fails is rolled back on its own and reported in its result.
+    """
+    try:
+        body = request.body.decode('utf-8')
+    except UnicodeDecodeError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'The batch must be UTF-8 encoded JSON lines!'
+            }, status=400)
+    lines = [line for line in body.splitlines() if line.strip()]
+    if len(lines) > SALE_BATCH_MAX_LINES:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'At most {SALE_BATCH_MAX_LINES} sales per batch!'
+            }, status=400)
+
+    results = []
+    for start in range(0, len(lines), SALE_BATCH_CHUNK):
+        results.extend(
+            _sync_sale_chunk(lines[start:start + SALE_BATCH_CHUNK], start)
+        )
+
+    succeeded = [r for r in results if r['status'] == 'success']
+    replayed = sum(1 for r in succeeded if r['replayed'])
+    return JsonResponse({
+        'status': 'success',
+        'created': len(succeeded) - replayed,
+        'replayed': replayed,
+        'failed': len(results) - len(succeeded),
+        'results': results,
+    })
+
 class SaleDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
     """
     View to delete a sale.
@@ -328,15 +290,19 @@ class SaleDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteView):
         """
         return reverse("saleslist")
 
-class PurchaseListView(LoginRequiredMixin, ListView):
+@query_budget(10)
+@method_decorator(read_from_replica, name='dispatch')
+class PurchaseListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     View to list all purchases with pagination.
     """
 
     model = Purchase
+    queryset = Purchase.objects.select_related("item", "vendor")
     template_name = "transactions/purchases_list.html"
     context_object_name = "purchases"
     paginate_by = 10
+    keyset_ordering = ('order_date', 'id')
 
 
 class PurchaseDetailView(LoginRequiredMixin, DetailView):